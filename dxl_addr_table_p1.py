@@ -173,3 +173,21 @@ DXL_BULK_READ = 0x92
 
 #ID
 DXL_BROADCAST_ID = 0xFE
+
+#Longest instruction packet sent at once (Length is one byte; ROBOTIS SDK limits Protocol 1.0 packets to 250 bytes)
+DXL_MAX_PACKET_SIZE = 250
+
+#=======================================================#
+#                   STATUS PACKET ERROR                 #
+#=======================================================#
+
+DXL_ERROR_INPUT_VOLTAGE = 0x01
+DXL_ERROR_ANGLE_LIMIT = 0x02
+DXL_ERROR_OVERHEATING = 0x04
+DXL_ERROR_RANGE = 0x08
+DXL_ERROR_CHECKSUM = 0x10
+DXL_ERROR_OVERLOAD = 0x20
+DXL_ERROR_INSTRUCTION = 0x40
+
+#Names of the error bits, Bit0 ... Bit6
+DXL_ERROR_NAMES = ('input_voltage', 'angle_limit', 'overheating', 'range', 'checksum', 'overload', 'instruction')
@@ -45,54 +45,60 @@ PROTOCOL 2.0
         * Normal ID: 0 ~ 252 (0x00 ~ 0xFC), total number 253
         * Broadcast ID: 254 (0xFE), Allows all Dynamixel motors to operate Instruction Packet
 
-    - 3. Length: Packet length, Data length of Instruction + Parameter + Checksum
-        * Length = Parameter numbers (N) + 2
+    - 4. Length: Packet length after Length2, Data length of Instruction + Parameter + CRC (Length1: Low, Length2: High)
+        * Length = Parameter numbers (N) + 3
 
-    - 4. Instruction: Command for controlling Dynamixels
+    - 5. Instruction: Command for controlling Dynamixels
             Command         Value   Description                                         No. of Parameters
         1.  Ping            0x01    No action and controller gets Status Packet         0
-        2.  Read            0x02    Read Dynamixel data                                 2
+        2.  Read            0x02    Read Dynamixel data                                 4
         3.  Write           0x03    Write Dynamixel data                                > 2
         4.  Reg Write       0x04    Similar to WRTE_DATA, Waiting and acting            > 2
                                     when ACTION command received
         5.  Action          0x05    Command to act the ACTION registered in REG WRITE   0
-        6.  Factory Reset   0x06    Factory Reset                                       0
+        6.  Factory Reset   0x06    Factory Reset                                       1
         7.  Reboot          0x08    Rebooting instruction                               0
-        8.  Sync Write      0x83    Simultaneously, control several dynamixels          > 4
-        9.  Bulk Read       0x92    Simultaneously, read data of dynamixels(only for MX)> 4
-
-    - 5. Parameters: If INSTRUCTION needs additional parameters, the INSTRUCTION use this one. (No. of Parameters)
-    - 6. Instruction Checksum: Check whether packet is broken during transmission
-        Instruction Checksum = ~( ID + Length + Instruction + Parameter1 + Parameter N)
-        ( ~: Not Bit Operator )
-        * If the result of ( ... ) is larger than 255 (0xFF), the checksum only use lower byte
-        EXAMPLE:
-            ID=1(0x01), Length=5(0x05), Instruction=3(0x03), Parameter1=12(0x0C), Parameter2=100(0x64), Parameter3=170(0xAA)
-            Checksum=~(ID+Length+Instruction+Param1+Param2+Param3)=~(0x01+0x05+0x03+0x0C+0x64+0xAA)=~(0x123)
-            Lower byte is 0x23 -> Not Operator -> 0xDC
-            Therefore, Instruction Packet = 0x01 0x05 0x03 0x0C 0x64 0xAA 0xDC
+        8.  Clear           0x10    Reset multi-turn revolution information             5
+        9.  Status          0x55    Instruction field of the Status Packet              -
+        10. Sync Read       0x82    Read the same address of several dynamixels         > 4
+        11. Sync Write      0x83    Simultaneously, control several dynamixels          > 4
+        12. Fast Sync Read  0x8A    Sync Read answered in one Status Packet             > 4
+        13. Bulk Read       0x92    Read different addresses of several dynamixels      > 5
+        14. Bulk Write      0x93    Write different addresses of several dynamixels     > 5
+        15. Fast Bulk Read  0x9A    Bulk Read answered in one Status Packet             > 5
+
+    - 6. Parameters: If INSTRUCTION needs additional parameters, the INSTRUCTION use this one. (No. of Parameters)
+        Addresses and lengths are 2 bytes (Low, High) in Protocol 2.0
+
+    - 7. CRC: CRC-16 (IBM/ANSI, polynomial 0x8005, initial value 0) from Header 1 to ParamN, CRC_L first
+
+    - 8. Byte Stuffing: The header pattern 0xFF 0xFF 0xFD must not appear from Instruction to ParamN.
+        0xFF 0xFF 0xFD is sent as 0xFF 0xFF 0xFD 0xFD, Length counts the stuffed bytes,
+        and the CRC is calculated over the stuffed packet.
 
 3. Status Packet (Return Packet) : Dynamixel returns the result to Main Controller. The returned data is Status Packet.
     - Status Packet Structure
-        Header 1    Header 2    ID  Length  Error   Param1  ...     ParamN  Checksum
-        0xFF        0xFF        ID  Length  Error   Param1  ...     ParamN  CHKSUM
-
-    - 3. Length: Length = Parameter Number (N) + 2
-
-    - 4. Instruction: Command for controlling Dynamixels
-            Command             Value   Description
-        1.  0                   Bit7    -
-        2.  Instruction Error   Bit6    Set 1, When transmitted undefined instruction
-                                        / when transmitted ACTION command without REF_WRITE
-        3.  Overload Error      Bit5    Set 1, When cannot control current load with current torque
-        4.  Checksum Error      Bit4    Set 1, when checksum is not right in transmitted instruction packet
-        5.  Range Error         Bit3    Set 1, when over the limit of range
-        6.  Overheating Error   Bit2    Set 1, when internal temperature of Dynamixel is over the limit of range
-        7.  Angle Limit Error   Bit1    Set 1, when Writing the range of goal position over the limit of CW and CCW Angle
-        8.  Input Voltage Error Bit0    Set 1, when operating voltage is over the limit which set in Control table
-
-    - EXAMPLE : 0xFF 0xFF 0x01 0x02 0x24 0xD8
-    Dynamixel ID 01, 0x24 - (binary) -> 00100100 -> bit 5 & bit 2 -> Overload and overheating error
+        Header 1    Header 2    Header3     Reserved    ID  Length1 Length2  Instruction  Error   Param1  ...  ParamN  CRC1   CRC2
+        0xFF        0xFF        0xFD        0x00        ID  Length1 Length2  0x55         Error   Param1  ...  ParamN  CRC_L  CRC_H
+
+    - Length: Length = Parameter Number (N) + 4
+
+    - Error: Bit7 is the Alert flag (Hardware Error Status should be read), Bit6 ~ Bit0 is the error number
+            Error               Value   Description
+        1.  Result Fail         0x01    Failed to process the sent Instruction Packet
+        2.  Instruction Error   0x02    Undefined Instruction / ACTION without REG_WRITE
+        3.  CRC Error           0x03    CRC of the sent packet does not match
+        4.  Data Range Error    0x04    Data to be written is out of the range of the address
+        5.  Data Length Error   0x05    Data shorter than the data length of the address
+        6.  Data Limit Error    0x06    Data to be written is out of the limit
+        7.  Access Error        0x07    Write to a read only / read from a write only address, or Torque Enable locked
+
+    - EXAMPLE : 0xFF 0xFF 0xFD 0x00 0x01 0x07 0x00 0x55 0x00 0x06 0x04 0x26 0x65 0x5D
+    Dynamixel ID 01, no error, Model Number 0x0406 (XM430-W210), Firmware Version 0x26
+
+4. Fast Sync Read / Fast Bulk Read Status Packet: one Status Packet (ID 0xFE) carries the data of all dynamixels
+        0xFF 0xFF 0xFD 0x00 0xFE Length1 Length2 0x55 [Error1 ID1 Data1 CRC1] [Error2 ID2 Data2 CRC2] ... [ErrorN IDN DataN CRC]
+    - Every dynamixel appends Error, ID, Data and a CRC of the packet so far; the CRC of the last one closes the packet.
 
 """
 
@@ -159,5 +165,102 @@ DXL_GOAL_TORQUE_L = 71          #Lowest byte of goal torque value
 DXL_GOAL_TORQUE_H = 72          #Highest byte of goal torque value
 DXL_GOAL_ACCELERATION = 73      #Goal Acceleration
 
+#=======================================================#
+#                   INSTRUCTION PACKET                  #
+#=======================================================#
+
+DXL_PING = 0x01
+DXL_READ_DATA = 0x02
+DXL_WRITE_DATA = 0x03
+DXL_REG_WRITE = 0x04
+DXL_ACTION = 0x05
+DXL_RESET = 0x06
+DXL_REBOOT = 0x08
+DXL_CLEAR = 0x10
+DXL_STATUS = 0x55
+DXL_SYNC_READ = 0x82
+DXL_SYNC_WRITE = 0x83
+DXL_FAST_SYNC_READ = 0x8A
+DXL_BULK_READ = 0x92
+DXL_BULK_WRITE = 0x93
+DXL_FAST_BULK_READ = 0x9A
+
+#ID
+DXL_BROADCAST_ID = 0xFE
+
+#=======================================================#
+#           X SERIES CONTROL TABLE (XH430, XM430)       #
+#=======================================================#
+# The DXL_ addresses above are the MX (Protocol 1.0) table. X series motors have their own table,
+# multi byte registers are given by their first (lowest) address, see dxl_register_map_p2 for the widths
+
+#EEPROM
+X_MODEL_NUMBER = 0              #Model Number (2)
+X_MODEL_INFORMATION = 2         #Model Information (4)
+X_FIRMWARE_VERSION = 6          #Firmware Version
+X_ID = 7                        #ID of Dynamixel
+X_BAUD_RATE = 8                 #Baud Rate, see dxl_discovery.BAUDRATES_P2
+X_RETURN_DELAY_TIME = 9         #Return Delay Time, 2 us per unit
+X_DRIVE_MODE = 10               #Drive Mode
+X_OPERATING_MODE = 11           #Operating Mode (current, velocity, position, extended position, PWM ...)
+X_SECONDARY_ID = 12             #Secondary (Shadow) ID
+X_PROTOCOL_TYPE = 13            #Protocol Type
+X_HOMING_OFFSET = 20            #Homing Offset (4)
+X_MOVING_THRESHOLD = 24         #Moving Threshold (4)
+X_TEMPERATURE_LIMIT = 31        #Temperature Limit
+X_MAX_VOLTAGE_LIMIT = 32        #Max Voltage Limit (2)
+X_MIN_VOLTAGE_LIMIT = 34        #Min Voltage Limit (2)
+X_PWM_LIMIT = 36                #PWM Limit (2)
+X_CURRENT_LIMIT = 38            #Current Limit (2), not on XL430
+X_VELOCITY_LIMIT = 44           #Velocity Limit (4)
+X_MAX_POSITION_LIMIT = 48       #Max Position Limit (4)
+X_MIN_POSITION_LIMIT = 52       #Min Position Limit (4)
+X_SHUTDOWN = 63                 #Shutdown, error bits which turn the torque off
+
+#RAM
+X_TORQUE_ENABLE = 64            #Torque On/Off, EEPROM and Indirect Address are locked while it is on
+X_LED = 65                      #LED On/Off
+X_STATUS_RETURN_LEVEL = 68      #Status Return Level
+X_REGISTERED_INSTRUCTION = 69   #Means if Instruction is registered
+X_HARDWARE_ERROR_STATUS = 70    #Hardware Error Status
+X_VELOCITY_I_GAIN = 76          #Velocity I Gain (2)
+X_VELOCITY_P_GAIN = 78          #Velocity P Gain (2)
+X_POSITION_D_GAIN = 80          #Position D Gain (2)
+X_POSITION_I_GAIN = 82          #Position I Gain (2)
+X_POSITION_P_GAIN = 84          #Position P Gain (2)
+X_FEEDFORWARD_2ND_GAIN = 88     #Feedforward 2nd Gain (2)
+X_FEEDFORWARD_1ST_GAIN = 90     #Feedforward 1st Gain (2)
+X_BUS_WATCHDOG = 98             #Bus Watchdog
+X_GOAL_PWM = 100                #Goal PWM (2)
+X_GOAL_CURRENT = 102            #Goal Current (2), not on XL430
+X_GOAL_VELOCITY = 104           #Goal Velocity (4)
+X_PROFILE_ACCELERATION = 108    #Profile Acceleration (4)
+X_PROFILE_VELOCITY = 112        #Profile Velocity (4)
+X_GOAL_POSITION = 116           #Goal Position (4)
+X_REALTIME_TICK = 120           #Realtime Tick (2)
+X_MOVING = 122                  #Means if there is any movement
+X_MOVING_STATUS = 123           #Moving Status
+X_PRESENT_PWM = 124             #Present PWM (2)
+X_PRESENT_CURRENT = 126         #Present Current (2), Present Load on XL430
+X_PRESENT_VELOCITY = 128        #Present Velocity (4)
+X_PRESENT_POSITION = 132        #Present Position (4)
+X_VELOCITY_TRAJECTORY = 136     #Velocity Trajectory (4)
+X_POSITION_TRAJECTORY = 140     #Position Trajectory (4)
+X_PRESENT_INPUT_VOLTAGE = 144   #Present Input Voltage (2)
+X_PRESENT_TEMPERATURE = 146     #Present Temperature
 
+#Indirect Address n (2 bytes each) holds the address whose byte appears at Indirect Data n
+X_INDIRECT_ADDRESS_1 = 168      #Indirect Address 1 ~ 28: 168 ~ 222
+X_INDIRECT_DATA_1 = 224         #Indirect Data 1 ~ 28: 224 ~ 251
+X_INDIRECT_ADDRESS_29 = 578     #Indirect Address 29 ~ 56: 578 ~ 632
+X_INDIRECT_DATA_29 = 634        #Indirect Data 29 ~ 56: 634 ~ 661
+X_INDIRECT_SLOTS = 28           #Slots per Indirect Address / Data region
 
+#Model Number
+XL430_W250 = 1060
+XM430_W210 = 1030
+XM430_W350 = 1020
+XH430_W210 = 1010
+XH430_W350 = 1000
+XH430_V210 = 1050
+XH430_V350 = 1040
@@ -0,0 +1,272 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+asyncio client for Protocol 1.0
+
+    The serial port is opened non-blocking and registered with the event loop (loop.add_reader), so received
+    bytes are fed into the StatusParser as soon as they arrive, without a thread per call.
+
+    Every call encodes its instruction packet right away and puts it into one request queue. A single worker
+    task owns the half-duplex bus: it sends the next packet as soon as the previous transaction is finished,
+    waits for the expected Status Packet(s), and resolves the caller's future. Packets are written with
+    non-blocking writes as well (loop.add_writer when the output buffer is full), the loop never blocks on the
+    port.
+
+    EX)
+        async with AsyncDXLPacketGenP1('/dev/ttyUSB0', 1000000) as dxl:
+            status = await dxl.read_data(1, DXL_PRESENT_POSITION_L, 2)
+            positions = await dxl.bulk_read(DXL_PRESENT_POSITION_L, 2, [1, 2, 3])
+
+    Timing
+        - timeout: time to wait for the Status Packet(s) once the packet is sent (default 4 ms, plus the
+          transmission time of the expected replies). A missing reply gives None, as in DXLPacketGenP1.
+        - deadline: optional absolute loop.time() per request. A request still queued at its deadline is
+          not sent anymore and raises asyncio.TimeoutError, and its reply is not waited for past the deadline.
+
+    Failures
+        An error of the port (ex) the adapter was unplugged) stops the worker: the request on the bus and every
+        queued one raise it, and later calls raise RuntimeError.
+
+
+"""
+
+import os
+import asyncio
+import serial
+from dxl_addr_table_p1 import *
+from dxl_packet_generator_p1 import PacketTemplateCache, bulk_read_params, split_sync_write
+from dxl_status_parser_p1 import StatusParser
+
+
+class AsyncDXLPacketGenP1(object):
+    def __init__(self, port, baudrate, timeout=0.004):
+        self.timeout = timeout
+        self.templates = PacketTemplateCache()
+        self.parser = StatusParser()
+
+        #Setup serial node, non-blocking reads: the event loop tells when bytes are available
+        self.ser = serial.Serial(
+            port,
+            baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=0
+        )
+        self.fd = self.ser.fileno()
+
+        self.loop = None
+        self.queue = None
+        self.worker = None
+        #Transaction on the bus: [expected [(motor_id, length), ...], next index, results, waiter future]
+        self._pending = None
+        #Future of the request on the bus
+        self._current = None
+        #Error which stopped the worker, see __fail
+        self.failure = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """
+        Register the serial port with the running event loop and start the bus worker
+        """
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.ser.reset_input_buffer()
+        self.loop.add_reader(self.fd, self.__on_readable)
+        self.worker = self.loop.create_task(self.__run())
+
+    async def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+            self.loop.remove_reader(self.fd)
+        if self.queue is not None:
+            while not self.queue.empty():
+                future = self.queue.get_nowait()[4]
+                if not future.done():
+                    future.cancel()
+        if self.ser:
+            self.ser.close()
+
+    def __on_readable(self):
+        try:
+            received = os.read(self.fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self.__fail(exc)
+            return
+        if not received:
+            return
+        pending = self._pending
+        if pending is None:
+            # Nothing is expected, a late reply of a timed out transaction
+            return
+        parser = self.parser
+        parser.feed(received)
+        status = parser.next_packet()
+        while status is not None:
+            expected, order, results, waiter = pending
+            for idx in range(order, len(expected)):
+                if expected[idx][0] == status.motor_id:
+                    results[status.motor_id] = status
+                    pending[1] = order = idx + 1
+                    break
+            if order == len(expected) and not waiter.done():
+                waiter.set_result(None)
+                return
+            status = parser.next_packet()
+
+    async def __run(self):
+        try:
+            await self.__serve()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.__fail(exc)
+
+    async def __serve(self):
+        loop = self.loop
+        queue = self.queue
+        while True:
+            packet, expected, single, deadline, future = await queue.get()
+            if future.done():
+                continue
+            now = loop.time()
+            if deadline is not None and now >= deadline:
+                future.set_exception(asyncio.TimeoutError())
+                continue
+            self._current = future
+
+            # 1. Write packet, the parser only sees bytes received from now on
+            self.parser.reset()
+            await self.__write(packet)
+            if not expected:
+                future.set_result(None)
+                continue
+
+            # 2. Wait for the status packets until the reply timeout or the request deadline
+            reply_bytes = sum([length + 6 for motor_id, length in expected])
+            timeout = self.timeout + (len(packet) + reply_bytes) * 10.0 / self.ser.baudrate
+            if deadline is not None:
+                timeout = min(timeout, deadline - now)
+            results = dict.fromkeys([motor_id for motor_id, length in expected])
+            waiter = loop.create_future()
+            self._pending = [expected, 0, results, waiter]
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._pending = None
+
+            # 3. Resolve the request: one StatusPacket (or None), or the dictionary of a bulk read
+            if not future.done():
+                future.set_result(results[expected[0][0]] if single else results)
+
+    async def __write(self, packet):
+        # The port is non-blocking: wait for room in the output buffer on the loop instead of in write()
+        loop = self.loop
+        fd = self.fd
+        view = memoryview(packet)
+        while view:
+            try:
+                written = os.write(fd, view)
+            except BlockingIOError:
+                written = 0
+            view = view[written:]
+            if view:
+                writable = loop.create_future()
+                loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(fd)
+
+    def __fail(self, exc):
+        """
+        Stop on an error of the port: the request on the bus and the queued ones raise exc, new ones are refused
+        """
+        if self.failure is not None:
+            return
+        self.failure = exc
+        self.loop.remove_reader(self.fd)
+        futures = [self._current]
+        if self._pending is not None:
+            futures.append(self._pending[3])
+        while not self.queue.empty():
+            futures.append(self.queue.get_nowait()[4])
+        for future in futures:
+            if future is not None and not future.done():
+                future.set_exception(exc)
+
+    def __submit(self, packet, expected, deadline, single=True):
+        """
+        Queue one transaction
+
+        :param packet: Instruction packet, copied since template buffers are reused
+        :param expected: [(motor_id, data length), ...] of the Status Packets to wait for, empty for no reply
+        :param deadline: Absolute loop.time() to give up, or None
+        :return: future of the StatusPacket (single) or of the dictionary {motor_id: StatusPacket}
+        """
+        if self.failure is not None:
+            raise RuntimeError('The bus worker stopped: %s' % self.failure)
+        future = self.loop.create_future()
+        self.queue.put_nowait((bytes(packet), expected, single, deadline, future))
+        return future
+
+    def __reply(self, motor_id, param_length=0):
+        # A broadcast instruction has no status packet
+        return [] if motor_id == DXL_BROADCAST_ID else [(motor_id, param_length)]
+
+    def ping(self, motor_id, deadline=None):
+        return self.__submit(self.templates.packet(motor_id, DXL_PING), self.__reply(motor_id), deadline)
+
+    def read_data(self, motor_id, paramN, paramLen, deadline=None):
+        packet = self.templates.packet(motor_id, DXL_READ_DATA, paramN, (paramLen, ))
+        return self.__submit(packet, self.__reply(motor_id, paramLen), deadline)
+
+    def write_data(self, motor_id, paramN, paramData, deadline=None):
+        packet = self.templates.packet(motor_id, DXL_WRITE_DATA, paramN, paramData)
+        return self.__submit(packet, self.__reply(motor_id), deadline)
+
+    def reg_write(self, motor_id, paramN, paramData, deadline=None):
+        packet = self.templates.packet(motor_id, DXL_REG_WRITE, paramN, paramData)
+        return self.__submit(packet, self.__reply(motor_id), deadline)
+
+    def action(self, motor_id, deadline=None):
+        return self.__submit(self.templates.packet(motor_id, DXL_ACTION), self.__reply(motor_id), deadline)
+
+    def reboot(self, motor_id, deadline=None):
+        return self.__submit(self.templates.packet(motor_id, DXL_REBOOT), self.__reply(motor_id), deadline)
+
+    def sync_write(self, control_address, total_data, deadline=None):
+        """
+        Same arguments as DXLPacketGenP1.sync_write, resolves to None once the packet(s) are sent
+
+        Dynamixels which do not fit in one packet of DXL_MAX_PACKET_SIZE go out in more Sync Write packets,
+        back to back in one request.
+        """
+        packets = split_sync_write(self.templates, control_address, total_data)[0]
+        return self.__submit(packets, [], deadline)
+
+    def bulk_read(self, read_address, address_length, motor_list, deadline=None):
+        """
+        Same arguments as DXLPacketGenP1.bulk_read, resolves to {motor_id: StatusPacket or None}
+        """
+        param_data, expected = bulk_read_params(read_address, address_length, motor_list)
+        packet = self.templates.packet(DXL_BROADCAST_ID, DXL_BULK_READ, 0x00, param_data)
+        return self.__submit(packet, expected, deadline, single=False)
@@ -0,0 +1,541 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Benchmarks for the Dynamixel packet path
+
+    python dxl_benchmark.py                         # all suites, table on stdout
+    python dxl_benchmark.py --json results.json     # also write machine readable results
+    python dxl_benchmark.py --compare base.json     # ratio against the results of another commit
+    python dxl_benchmark.py --suite encode --quick  # one suite, fewer iterations
+    python dxl_benchmark.py --suite capture --capture session.dxlcap   # decode and replay a recorded session
+
+Suites
+    - encode: packet encode / status decode per instruction
+        ns/op: mean wall time per packet (time.perf_counter_ns, best of several repeats)
+        alloc_bytes/op: transient bytes allocated while building one packet (tracemalloc peak)
+    - roundtrip: ping / read_data latency against the virtual bus (dxl_simulator_p1) on a pty,
+      with byte timing and return delay time modelled; mean / p50 / p99 in microseconds, from the raw samples
+    - transport: read_data round trips with TRANSPORT_SAFE and TRANSPORT_LOW_LATENCY, port operations per
+      transaction and latency from DXLPacketGenP1.transport_statistics()
+    - sync_write: host time to encode and write one Sync Write, bytes on the wire and the resulting
+      packet rate, as the motor count and the simulated baud rate grow (list: sync_write, array:
+      sync_write_array, trajectory: ticks of a dxl_trajectory.Trajectory encoded ahead of time)
+    - instrumentation: cost of dxl_instrumentation per transaction (ns/op of one record, with and without a
+      callback) and read_data round trips against the virtual bus with the instrumentation off and on
+    - capture: cost of dxl_capture per frame, read_data round trips with the capture off and on, and a
+      captured session (recorded on the virtual bus, or the file given with --capture) decoded by the
+      StatusParser alone (ns per Status Packet, MB/s) and replayed through the driver as fast as possible
+
+Every result is one record {suite, name, params, metrics}; --compare matches records by suite, name and params.
+
+
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+from dxl_addr_table_p1 import *
+from dxl_packet_generator_p1 import checksum_generator, packet_generator, PacketTemplateCache, bulk_read_params
+from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY
+from dxl_simulator_p1 import VirtualDXLBus, status_packet
+from dxl_status_parser_p1 import StatusParser, StatusPacket
+from dxl_instrumentation import Instrumentation
+from dxl_capture import Capture, CaptureLog, ReplayBus, replay, decode, DIR_RX
+import dxl_addr_table_p2
+import dxl_packet_generator_p2
+
+
+def time_ns_per_op(fn, number=100000, repeat=5):
+    """
+    Best mean time of fn() over repeat runs of number calls, in nanoseconds
+    """
+    best = None
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            for _ in range(number):
+                fn()
+            elapsed = (time.perf_counter_ns() - start) / number
+            if best is None or elapsed < best:
+                best = elapsed
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
+
+
+def alloc_bytes_per_op(fn, number=1000):
+    """
+    Peak transient memory of a single fn() call, averaged over number calls, in bytes
+    """
+    fn()  # warm up caches and templates
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(number):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / number
+
+
+def legacy_encode_cases():
+    """
+    Packet encoding with checksum_generator and packet_generator, one fresh list and bytearray per call
+    """
+    def ping():
+        checksum = checksum_generator(1, 2, DXL_PING, 0, (0, ))
+        return packet_generator(1, 2, DXL_PING, 0, 0, checksum)
+
+    def read_data():
+        checksum = checksum_generator(1, 4, DXL_READ_DATA, DXL_PRESENT_POSITION_L, (2, ))
+        return packet_generator(1, 4, DXL_READ_DATA, DXL_PRESENT_POSITION_L, (2, ), checksum)
+
+    def write_data():
+        data = (0x00, 0x08)
+        checksum = checksum_generator(1, len(data) + 3, DXL_WRITE_DATA, DXL_GOAL_POSITION_L, data)
+        packet = [0xFF, 0xFF, 1, len(data) + 3, DXL_WRITE_DATA, DXL_GOAL_POSITION_L]
+        packet.extend(data)
+        packet.append(checksum)
+        return bytearray(packet)
+
+    return [('ping', ping), ('read_data', read_data), ('write_data', write_data)]
+
+
+def template_encode_cases():
+    """
+    Packet encoding with PacketTemplateCache, data bytes and checksum patched in a preallocated buffer
+    """
+    cache = PacketTemplateCache()
+    data = (0x00, 0x08)
+    sync_data = [2]
+    for motor_id in range(1, 11):
+        sync_data.extend((motor_id, 0x00, 0x08))
+    bulk_data = bulk_read_params(DXL_PRESENT_POSITION_L, 2, range(1, 11))[0]
+
+    def ping():
+        return cache.packet(1, DXL_PING)
+
+    def read_data():
+        return cache.packet(1, DXL_READ_DATA, DXL_PRESENT_POSITION_L, (2, ))
+
+    def write_data():
+        return cache.packet(1, DXL_WRITE_DATA, DXL_GOAL_POSITION_L, data)
+
+    def reg_write():
+        return cache.packet(1, DXL_REG_WRITE, DXL_GOAL_POSITION_L, data)
+
+    def action():
+        return cache.packet(DXL_BROADCAST_ID, DXL_ACTION)
+
+    def sync_write_10():
+        return cache.packet(DXL_BROADCAST_ID, DXL_SYNC_WRITE, DXL_GOAL_POSITION_L, sync_data)
+
+    def bulk_read_10():
+        return cache.packet(DXL_BROADCAST_ID, DXL_BULK_READ, 0x00, bulk_data)
+
+    return [('ping', ping), ('read_data', read_data), ('write_data', write_data), ('reg_write', reg_write),
+            ('action', action), ('sync_write_10', sync_write_10), ('bulk_read_10', bulk_read_10)]
+
+
+def decode_cases():
+    """
+    Status Packet decoding with StatusParser: no parameters, 2 bytes, 8 bytes, and 10 back to back packets
+    """
+    parser = StatusParser()
+    ack = bytes(status_packet(1, 0))
+    word = bytes(status_packet(1, 0, b'\x00\x08'))
+    block = bytes(status_packet(1, 0, bytes(range(8))))
+    bulk = b''.join([bytes(status_packet(motor_id, 0, b'\x00\x08')) for motor_id in range(1, 11)])
+
+    def decode(data):
+        def case():
+            parser.feed(data)
+            return parser.next_packet()
+        return case
+
+    def decode_bulk_10():
+        parser.feed(bulk)
+        packets = []
+        status = parser.next_packet()
+        while status is not None:
+            packets.append(status)
+            status = parser.next_packet()
+        return packets
+
+    return [('status_ack', decode(ack)), ('status_2', decode(word)), ('status_8', decode(block)),
+            ('status_bulk_10', decode_bulk_10)]
+
+
+def protocol_cases():
+    """
+    Protocol 1.0 against Protocol 2.0: encode a 4 byte Read instruction, decode its 4 byte Status Packet
+    """
+    p1_cache = PacketTemplateCache()
+    p1_status = bytes((0xFF, 0xFF, 0x01, 0x06, 0x00, 0x00, 0x08, 0x10, 0x00))
+    p1_status += bytes((255 - (sum(p1_status[2:]) & 0xFF), ))
+    p1_parser = StatusParser()
+
+    p2 = dxl_packet_generator_p2
+    p2_status = bytearray((0xFF, 0xFF, 0xFD, 0x00, 0x01, 0x08, 0x00, p2.DXL_STATUS, 0x00, 0x00, 0x08, 0x10, 0x00))
+    crc = p2.crc16(p2_status)
+    p2_status = bytes(p2_status + bytes((crc & 0xFF, crc >> 8)))
+    p2_parser = p2.StatusParserP2()
+    p2_params = p2.address_params(dxl_addr_table_p2.DXL_PRESENT_POSITION_L, 4)
+
+    def p1_encode():
+        return p1_cache.packet(1, DXL_READ_DATA, DXL_PRESENT_POSITION_L, (4, ))
+
+    def p1_decode():
+        p1_parser.feed(p1_status)
+        return p1_parser.next_packet()
+
+    def p2_encode():
+        return p2.packet_generator(1, dxl_addr_table_p2.DXL_READ_DATA, p2_params)
+
+    def p2_decode():
+        p2_parser.feed(p2_status)
+        return p2_parser.next_packet()
+
+    return [('p1', 'encode_read', p1_encode), ('p1', 'decode_status', p1_decode),
+            ('p2', 'encode_read', p2_encode), ('p2', 'decode_status', p2_decode)]
+
+
+def record(suite, name, params, **metrics):
+    return {'suite': suite, 'name': name, 'params': params, 'metrics': metrics}
+
+
+def run_encode_benchmark(quick=False):
+    number = 10000 if quick else 100000
+    results = []
+    groups = [('legacy', legacy_encode_cases()), ('template', template_encode_cases()), ('decode', decode_cases())]
+    groups += [(path, [(name, fn)]) for path, name, fn in protocol_cases()]
+    for path, cases in groups:
+        for name, fn in cases:
+            results.append(record('encode', name, {'path': path},
+                                  ns_per_op=time_ns_per_op(fn, number=number),
+                                  alloc_bytes_per_op=alloc_bytes_per_op(fn, number=number // 100)))
+    return results
+
+
+def percentile(samples, percent):
+    """
+    Percentile of sorted samples, linear between the closest ranks
+    """
+    position = (len(samples) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+
+def latency_metrics(fn, number):
+    """
+    Latency of number calls of fn(), percentiles from the raw samples (not from histogram buckets)
+    """
+    samples = [0.0] * number
+    timeouts = 0
+    for idx in range(number):
+        start = time.perf_counter()
+        if fn() is None:
+            timeouts += 1
+        samples[idx] = time.perf_counter() - start
+    samples.sort()
+    return {'mean_us': sum(samples) / number * 1e6, 'p50_us': percentile(samples, 50) * 1e6,
+            'p99_us': percentile(samples, 99) * 1e6, 'max_us': samples[-1] * 1e6, 'timeouts': timeouts}
+
+
+def run_roundtrip_benchmark(quick=False, baudrates=(57600, 1000000), return_delay=0):
+    """
+    Round trip latency of ping and read_data against the virtual bus
+    """
+    number = 100 if quick else 1000
+    results = []
+    for baudrate in baudrates:
+        with VirtualDXLBus([1], baudrate=baudrate) as bus:
+            bus.motor(1).table[DXL_RETURN_DELAY_TIME] = return_delay
+            dxl = DXLPacketGenP1(bus.port, baudrate)
+            try:
+                params = {'baudrate': baudrate, 'return_delay': return_delay}
+                results.append(record('roundtrip', 'ping', params,
+                                      **latency_metrics(lambda: dxl.ping(1), number)))
+                results.append(record('roundtrip', 'read_data_2', params,
+                                      **latency_metrics(lambda: dxl.read_data(1, DXL_PRESENT_POSITION_L, 2), number)))
+                results.append(record('roundtrip', 'read_data_8', params,
+                                      **latency_metrics(lambda: dxl.read_data(1, DXL_PRESENT_POSITION_L, 8), number)))
+            finally:
+                dxl.close()
+    return results
+
+
+def run_sync_write_benchmark(quick=False, motor_counts=(1, 10, 50, 100, 200), baudrates=(57600, 1000000, 3000000)):
+    """
+    Sync Write of Goal Position and Moving Speed: host cost per call and the packet rate the bus allows
+
+        wire_us: time on the wire at the given baud rate (10 bits per byte)
+        max_rate_hz: 1 / (host time + wire time), the highest command rate of a loop doing only this write
+    """
+    number = 100 if quick else 1000
+    results = []
+    with VirtualDXLBus([], timing=False) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000)
+        try:
+            for n_motors in motor_counts:
+                total_data = tuple([(motor_id, 0x00, 0x08, 0x80, 0x00) for motor_id in range(n_motors)])
+
+                def list_path():
+                    dxl.sync_write(DXL_GOAL_POSITION_L, total_data)
+
+                start = time.perf_counter()
+                for _ in range(number):
+                    list_path()
+                host_list = (time.perf_counter() - start) / number
+
+                host_array = None
+                host_trajectory = None
+                # Larger sets go out in several packets of (DXL_MAX_PACKET_SIZE - 8) / (L + 1) motors
+                per_packet = (DXL_MAX_PACKET_SIZE - 8) // 5
+                wire_bytes = 8 * -(-n_motors // per_packet) + 5 * n_motors
+                try:
+                    import numpy as np
+                    ids = np.arange(n_motors)
+                    goal = np.full(n_motors, 0x0800, dtype=np.uint16)
+                    speed = np.full(n_motors, 0x0080, dtype=np.uint16)
+                    start = time.perf_counter()
+                    for _ in range(number):
+                        dxl.sync_write_array(DXL_GOAL_POSITION_L, ids, goal, speed)
+                    host_array = (time.perf_counter() - start) / number
+                    # Whole motion encoded ahead of time, one write per tick
+                    from dxl_trajectory import Trajectory
+                    trajectory = Trajectory(DXL_GOAL_POSITION_L, ids, [np.tile(goal, (number, 1)),
+                                                                       np.tile(speed, (number, 1))], 1000)
+                    start = time.perf_counter()
+                    for tick in range(number):
+                        dxl.sync_write_packets(trajectory.buffer[tick].data)
+                    host_trajectory = (time.perf_counter() - start) / number
+                except ImportError:
+                    pass
+
+                for baudrate in baudrates:
+                    wire = wire_bytes * 10.0 / baudrate
+                    for path, host in (('list', host_list), ('array', host_array), ('trajectory', host_trajectory)):
+                        if host is None:
+                            continue
+                        results.append(record('sync_write', path, {'motors': n_motors, 'baudrate': baudrate},
+                                              host_us=host * 1e6, wire_bytes=wire_bytes, wire_us=wire * 1e6,
+                                              max_rate_hz=1.0 / (host + wire)))
+        finally:
+            dxl.close()
+    return results
+
+
+def run_transport_benchmark(quick=False, baudrate=1000000):
+    """
+    Same read_data round trip with both transport profiles of DXLPacketGenP1
+    """
+    number = 100 if quick else 1000
+    results = []
+    with VirtualDXLBus([1], baudrate=baudrate) as bus:
+        bus.motor(1).table[DXL_RETURN_DELAY_TIME] = 0
+        for transport in (TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY):
+            dxl = DXLPacketGenP1(bus.port, baudrate, transport=transport)
+            try:
+                metrics = latency_metrics(lambda: dxl.read_data(1, DXL_PRESENT_POSITION_L, 2), number)
+                stats = dxl.transport_statistics()
+                results.append(record('transport', 'read_data_2', {'transport': transport, 'baudrate': baudrate},
+                                      syscalls_per_transaction=stats['syscalls_per_transaction'],
+                                      errors=stats['errors'], **metrics))
+            finally:
+                dxl.close()
+    return results
+
+
+def run_instrumentation_benchmark(quick=False, baudrate=1000000):
+    """
+    Overhead of the per instruction statistics: one record, and a read_data round trip with and without them
+    """
+    number = 10000 if quick else 100000
+    results = []
+    replies = (StatusPacket(1, 0x00, bytes(2)), )
+    for callbacks in (0, 1):
+        instrumentation = Instrumentation()
+        if callbacks:
+            instrumentation.subscribe(lambda event: None)
+        fn = lambda: instrumentation.record(DXL_READ_DATA, 1, 2e-6, 1e-5, 1e-4, 8, replies, True)
+        results.append(record('instrumentation', 'record', {'callbacks': callbacks},
+                              ns_per_op=time_ns_per_op(fn, number=number),
+                              alloc_bytes_per_op=alloc_bytes_per_op(fn, number=number // 100)))
+
+    number = 200 if quick else 2000
+    with VirtualDXLBus([1], baudrate=baudrate) as bus:
+        bus.motor(1).table[DXL_RETURN_DELAY_TIME] = 0
+        for enabled in (False, True):
+            dxl = DXLPacketGenP1(bus.port, baudrate, transport=TRANSPORT_LOW_LATENCY,
+                                 instrumentation=Instrumentation() if enabled else None)
+            try:
+                results.append(record('instrumentation', 'read_data_2', {'enabled': enabled, 'baudrate': baudrate},
+                                      **latency_metrics(lambda: dxl.read_data(1, DXL_PRESENT_POSITION_L, 2), number)))
+            finally:
+                dxl.close()
+    return results
+
+
+def capture_session(path, baudrate, cycles, motor_ids=tuple(range(1, 7))):
+    """
+    Record a control loop like session on the virtual bus: goals with sync_write, feedback with bulk_read
+    """
+    with VirtualDXLBus(motor_ids, baudrate=baudrate, timing=False) as bus:
+        with Capture(path, baudrate=baudrate) as capture:
+            dxl = DXLPacketGenP1(bus.port, baudrate, transport=TRANSPORT_LOW_LATENCY, capture=capture)
+            try:
+                for cycle in range(cycles):
+                    goals = tuple([(motor_id, cycle & 0xFF, 0x08) for motor_id in motor_ids])
+                    dxl.sync_write(DXL_GOAL_POSITION_L, goals)
+                    dxl.bulk_read(DXL_PRESENT_POSITION_L, 8, list(motor_ids))
+                    dxl.read_data(motor_ids[0], DXL_PRESENT_TEMPERATURE, 1)
+            finally:
+                dxl.close()
+
+
+def run_capture_benchmark(quick=False, baudrate=1000000, path=None):
+    """
+    Overhead of the traffic capture, and decode / replay throughput of a captured session
+    """
+    number = 10000 if quick else 100000
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        capture = Capture(os.path.join(directory, 'record.dxlcap'))
+        data = status_packet(1, 0x00, bytes(2))
+        results.append(record('capture', 'record', {'bytes': len(data)},
+                              ns_per_op=time_ns_per_op(lambda: capture.rx(data), number=number)))
+        capture.close()
+
+        number = 200 if quick else 2000
+        with VirtualDXLBus([1], baudrate=baudrate) as bus:
+            bus.motor(1).table[DXL_RETURN_DELAY_TIME] = 0
+            for enabled in (False, True):
+                capture = Capture(os.path.join(directory, 'read.dxlcap'), baudrate) if enabled else None
+                dxl = DXLPacketGenP1(bus.port, baudrate, transport=TRANSPORT_LOW_LATENCY, capture=capture)
+                try:
+                    results.append(record('capture', 'read_data_2', {'enabled': enabled, 'baudrate': baudrate},
+                                          **latency_metrics(lambda: dxl.read_data(1, DXL_PRESENT_POSITION_L, 2),
+                                                            number)))
+                finally:
+                    dxl.close()
+                    if capture is not None:
+                        capture.close()
+
+        session = 'recorded' if path is not None else 'virtual'
+        if path is None:
+            path = os.path.join(directory, 'session.dxlcap')
+            capture_session(path, baudrate, 100 if quick else 1000)
+        log = CaptureLog(path)
+        packets = decode(log)
+        rx_bytes = log.bytes(DIR_RX)
+        ns = time_ns_per_op(lambda: decode(log), number=1, repeat=5 if quick else 20)
+        results.append(record('capture', 'decode', {'session': session},
+                              ns_per_packet=ns / packets if packets else None,
+                              mb_per_s=rx_bytes / ns * 1e3, packets=packets))
+        with ReplayBus(log) as bus:
+            dxl = DXLPacketGenP1(bus.port, log.baudrate or baudrate, transport=TRANSPORT_LOW_LATENCY)
+            try:
+                stats = replay(dxl, bus)
+            finally:
+                dxl.close()
+        results.append(record('capture', 'replay', {'session': session},
+                              transactions_per_s=stats['transactions_per_s'], timeouts=stats['timeouts'],
+                              mismatches=stats['mismatches']))
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return results
+
+
+SUITES = {
+    'encode': run_encode_benchmark,
+    'roundtrip': run_roundtrip_benchmark,
+    'transport': run_transport_benchmark,
+    'sync_write': run_sync_write_benchmark,
+    'instrumentation': run_instrumentation_benchmark,
+    'capture': run_capture_benchmark,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record_key(result):
+    return (result['suite'], result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def format_value(value):
+    return '%.1f' % value if isinstance(value, float) else str(value)
+
+
+def print_results(results, baseline=None):
+    base = dict([(record_key(result), result) for result in (baseline or [])])
+    for result in results:
+        params = ' '.join(['%s=%s' % item for item in sorted(result['params'].items())])
+        metrics = []
+        for key, value in result['metrics'].items():
+            text = '%s=%s' % (key, format_value(value))
+            old = base.get(record_key(result))
+            if old is not None and isinstance(value, (int, float)) and old['metrics'].get(key):
+                text += ' (x%.2f)' % (value / float(old['metrics'][key]))
+            metrics.append(text)
+        print('%-10s %-16s %-32s %s' % (result['suite'], result['name'], params, '  '.join(metrics)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Dynamixel packet path benchmarks')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES), help='suite to run, default all')
+    parser.add_argument('--quick', action='store_true', help='fewer iterations')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results file of another commit, prints the ratio new / old')
+    parser.add_argument('--capture', help='capture log (dxl_capture) decoded and replayed by the capture suite')
+    args = parser.parse_args(argv)
+
+    results = []
+    for suite in args.suite or ['encode', 'roundtrip', 'transport', 'sync_write', 'instrumentation', 'capture']:
+        if suite == 'capture' and args.capture:
+            results.extend(SUITES[suite](quick=args.quick, path=args.capture))
+        else:
+            results.extend(SUITES[suite](quick=args.quick))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.json:
+        document = {
+            'meta': {'commit': git_commit(), 'python': sys.version.split()[0], 'platform': platform.platform(),
+                     'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'quick': args.quick},
+            'results': results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(document, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Several Dynamixel buses driven in parallel
+
+    Each bus is one DXLPacketGenP1 (one USB-RS485 adapter) with its own lock and its own I/O thread.
+    A fan-out call splits its work by bus, runs every bus at the same time and gathers the results,
+    so one cycle takes as long as the slowest bus instead of the sum of all buses.
+    pyserial releases the GIL while it waits for the port, so the threads really overlap on the wire.
+
+    EX) 4 adapters, joints mapped to buses by ID
+        pool = DXLBusPool.open({'arm_l': ('/dev/ttyUSB0', 1000000), 'arm_r': ('/dev/ttyUSB1', 1000000), ...},
+                               joints={1: 'arm_l', 2: 'arm_l', 11: 'arm_r', ...})
+        feedback = pool.cycle(DXL_GOAL_POSITION_L, goal_data, DXL_PRESENT_POSITION_L, 2, motor_ids)
+
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dxl_packet_generator_p1 import DXLPacketGenP1
+
+
+class DXLBusPool(object):
+    """
+    :param buses: Dictionary {bus name: DXLPacketGenP1}
+    :param joints: Dictionary {motor_id: bus name}, used to split sync_write / bulk_read by bus
+    """
+
+    def __init__(self, buses, joints=None):
+        self.buses = dict(buses)
+        self.joints = dict(joints or {})
+        self.executors = dict([(name, ThreadPoolExecutor(max_workers=1, thread_name_prefix='dxl-%s' % name))
+                               for name in self.buses])
+
+    @classmethod
+    def open(cls, ports, joints=None):
+        """
+        :param ports: Dictionary {bus name: (port, baudrate)}
+
+        If one port cannot be opened, the ports opened before it are closed again.
+        """
+        buses = {}
+        try:
+            for name, (port, baudrate) in ports.items():
+                buses[name] = DXLPacketGenP1(port, baudrate)
+        except BaseException:
+            for dxl in buses.values():
+                dxl.close()
+            raise
+        return cls(buses, joints)
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        for dxl in self.buses.values():
+            dxl.close()
+
+    def bus_of(self, motor_id):
+        try:
+            return self.joints[motor_id]
+        except KeyError:
+            raise KeyError('Motor ID %d is not mapped to a bus' % motor_id)
+
+    def submit(self, bus, method, *args):
+        """
+        Run one DXLPacketGenP1 method on the I/O thread of a bus
+
+        :return: concurrent.futures.Future
+        """
+        return self.executors[bus].submit(getattr(self.buses[bus], method), *args)
+
+    def run(self, plans):
+        """
+        Run a list of calls on each bus, all buses at the same time, the calls of one bus one after another
+
+        :param plans: Dictionary {bus name: [(method name, args), ...]}
+        :return: Dictionary {bus name: [result, ...]}
+        """
+        futures = dict([(bus, self.executors[bus].submit(self.__run_plan, self.buses[bus], calls))
+                        for bus, calls in plans.items()])
+        return dict([(bus, future.result()) for bus, future in futures.items()])
+
+    @staticmethod
+    def __run_plan(dxl, calls):
+        return [getattr(dxl, method)(*args) for method, args in calls]
+
+    def split_data(self, total_data):
+        """
+        Split sync_write data ((motor_id, data...), ...) by bus
+        """
+        per_bus = {}
+        for motor in total_data:
+            per_bus.setdefault(self.bus_of(motor[0]), []).append(motor)
+        return per_bus
+
+    def split_motors(self, motor_list):
+        """
+        Split a bulk_read motor list (IDs or (motor_id, address, length) tuples) by bus
+        """
+        per_bus = {}
+        for motor in motor_list:
+            motor_id = motor if isinstance(motor, int) else motor[0]
+            per_bus.setdefault(self.bus_of(motor_id), []).append(motor)
+        return per_bus
+
+    def sync_write(self, control_address, total_data):
+        """
+        sync_write on every bus which has motors in total_data
+        """
+        self.run(dict([(bus, [('sync_write', (control_address, tuple(data)))])
+                       for bus, data in self.split_data(total_data).items()]))
+
+    def bulk_read(self, read_address, address_length, motor_list):
+        """
+        bulk_read on every bus which has motors in motor_list
+
+        :return: Dictionary {motor_id: StatusPacket or None} of all buses
+        """
+        results = self.run(dict([(bus, [('bulk_read', (read_address, address_length, motors))])
+                                 for bus, motors in self.split_motors(motor_list).items()]))
+        merged = {}
+        for bus_results in results.values():
+            merged.update(bus_results[0])
+        return merged
+
+    def cycle(self, control_address, total_data, read_address, address_length, motor_list):
+        """
+        One control cycle: sync_write of these joints and bulk_read of those joints, every bus in parallel.
+        On each bus the write goes first, then the read.
+
+        :return: Dictionary {motor_id: StatusPacket or None} of all buses
+        """
+        plans = {}
+        for bus, data in self.split_data(total_data).items():
+            plans.setdefault(bus, []).append(('sync_write', (control_address, tuple(data))))
+        for bus, motors in self.split_motors(motor_list).items():
+            plans.setdefault(bus, []).append(('bulk_read', (read_address, address_length, motors)))
+
+        merged = {}
+        for bus, bus_results in self.run(plans).items():
+            for result in bus_results:
+                if result is not None:
+                    merged.update(result)
+        return merged
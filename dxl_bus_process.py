@@ -0,0 +1,580 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Bus driver in its own process, with joint state and goals in shared memory
+
+    The DXLPacketGenP1 and its control loop run in a dedicated process, so garbage collection, the GIL and
+    the load of the application (planner, GUI, logging) do not reach the bus timing. The processes only
+    share one memory mapped file, ex) on /dev/shm: no pipes, no pickling, no Python objects per cycle.
+
+        server process      every cycle: Sync Write of the newest goals (when they changed), Bulk Read of the
+                            feedback block, publish the state
+        clients             read the latest state, write goals; each one is a copy of one NumPy record
+
+    Channels (one writer each: the server for the state, one client for the goals)
+        Every channel has two record slots and a sequence number. The writer fills the slot of sequence + 1
+        while the readers copy the slot of the current sequence, then publishes sequence + 1. Nobody waits
+        for a lock: a reader whose copy saw the sequence move copies the newest slot again (torn_reads).
+
+    File layout (little endian)
+        0       header: magic 'DXLBUS1', version, sizes, sequences, server status and loop counters
+        128     schema: JSON {motor_ids, rate, feedback, command}
+        2048    message: JSON loop statistics after a stop, or the error which stopped the server
+        4096    state slots [2], then goal slots [2]
+
+    State record: t (time.monotonic() of the read), cycle, goal_seq (goals written so far), valid uint8[N]
+    (1 where the motor answered), and one column of N raw values per feedback register.
+    Goal record: t, mask uint8[N] (motors to write) and one column per command register.
+
+    EX) server, in the main process
+        if __name__ == '__main__':
+            with BusServer('/dev/ttyUSB0', 1000000, [1, 2, 3], rate=1000, cpus=[3]) as server:
+                client = server.client()
+                seq, state = client.read_state()
+                client.write_goals(GOAL_POSITION=state['PRESENT_POSITION'] + 100)
+
+        client, in any other process
+        client = BusClient('/dev/shm/dxl_bus')
+        seq, state = client.wait_state(seq)     # next cycle
+        position = register('PRESENT_POSITION').to_si(state['PRESENT_POSITION'])
+
+
+"""
+
+import gc
+import os
+import json
+import time
+import multiprocessing
+import numpy as np
+from int_byte_table import RegisterBlock, FEEDBACK_BLOCK, COMMAND_BLOCK
+
+MAGIC = b'DXLBUS1'
+VERSION = 1
+SCHEMA_OFFSET = 128
+MESSAGE_OFFSET = 2048
+DATA_OFFSET = 4096
+
+STATUS_STARTING = 0
+STATUS_RUNNING = 1
+STATUS_STOPPED = 2
+STATUS_FAILED = 3
+
+# Bulk Reads of the command registers before the server starts, see BusLoop.initial_goals
+INITIAL_READS = 3
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('n_motors', '<u4'),
+    ('schema_size', '<u4'),
+    ('message_size', '<u4'),
+    ('state_size', '<u4'),
+    ('goal_size', '<u4'),
+    ('state_seq', '<u8'),
+    ('goal_seq', '<u8'),
+    ('status', '<u4'),
+    ('stop', '<u4'),
+    ('pid', '<u4'),
+    ('pad', '<u4'),
+    ('cycles', '<u8'),
+    ('overruns', '<u8'),
+    ('skipped', '<u8'),
+    ('lost', '<u8'),
+], align=True)
+
+
+def state_dtype(block, n_motors):
+    """
+    State record: read time, cycle, goals written so far, answer mask and one column of N raw values per register
+    """
+    fields = [('t', '<f8'), ('cycle', '<u8'), ('goal_seq', '<u8'), ('valid', 'u1', (n_motors, ))]
+    for reg in block.registers:
+        fields.append((reg.name, '<' + ('i' if reg.signed else 'u') + str(reg.size), (n_motors, )))
+    return np.dtype(fields)
+
+
+def goal_dtype(block, n_motors):
+    """
+    Goal record: write time, motors to write and one column of N raw values per register
+    """
+    fields = [('t', '<f8'), ('mask', 'u1', (n_motors, ))]
+    for reg in block.registers:
+        fields.append((reg.name, '<' + ('i' if reg.signed else 'u') + str(reg.size), (n_motors, )))
+    return np.dtype(fields)
+
+
+class SharedBus(object):
+    """
+    Mapping of a bus file: header, schema and the record slots of both channels
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = np.memmap(path, dtype=np.uint8, mode='r+')
+        self.header = self.file[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        if bytes(self.header['magic'][0]) != MAGIC:
+            raise ValueError('%s is not a bus file' % path)
+        if int(self.header['version'][0]) != VERSION:
+            raise ValueError('Unsupported bus file version %d' % int(self.header['version'][0]))
+        schema_size = int(self.header['schema_size'][0])
+        self.schema = json.loads(bytes(self.file[SCHEMA_OFFSET:SCHEMA_OFFSET + schema_size]).decode())
+        self.motor_ids = self.schema['motor_ids']
+        self.rate = self.schema['rate']
+        self.feedback = RegisterBlock(self.schema['feedback'])
+        self.command = RegisterBlock(self.schema['command'])
+        self.state_dtype = state_dtype(self.feedback, len(self.motor_ids))
+        self.goal_dtype = goal_dtype(self.command, len(self.motor_ids))
+        if (self.state_dtype.itemsize != int(self.header['state_size'][0])
+                or self.goal_dtype.itemsize != int(self.header['goal_size'][0])):
+            raise ValueError('Bus record layout does not match its schema')
+
+        goal_offset = DATA_OFFSET + 2 * self.state_dtype.itemsize
+        self.states = self.file[DATA_OFFSET:goal_offset].view(self.state_dtype)
+        self.goals = self.file[goal_offset:goal_offset + 2 * self.goal_dtype.itemsize].view(self.goal_dtype)
+
+        # One element views of the header fields, read and written without going through the record
+        self.state_seq = self.header['state_seq']
+        self.goal_seq = self.header['goal_seq']
+        self.status = self.header['status']
+        self.stop_request = self.header['stop']
+        self.torn_reads = 0
+
+    @staticmethod
+    def create(path, motor_ids, rate, feedback, command):
+        schema = json.dumps({
+            'motor_ids': list(motor_ids),
+            'rate': rate,
+            'feedback': list(feedback.names),
+            'command': list(command.names),
+        }).encode()
+        if SCHEMA_OFFSET + len(schema) > MESSAGE_OFFSET:
+            raise ValueError('Bus schema does not fit in the file header')
+        states = state_dtype(feedback, len(motor_ids))
+        goals = goal_dtype(command, len(motor_ids))
+
+        with open(path, 'wb') as f:
+            f.truncate(DATA_OFFSET + 2 * (states.itemsize + goals.itemsize))
+        file = np.memmap(path, dtype=np.uint8, mode='r+')
+        header = file[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        file[SCHEMA_OFFSET:SCHEMA_OFFSET + len(schema)] = np.frombuffer(schema, dtype=np.uint8)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['n_motors'] = len(motor_ids)
+        header['schema_size'] = len(schema)
+        header['state_size'] = states.itemsize
+        header['goal_size'] = goals.itemsize
+        file.flush()
+        del header, file
+
+    def read(self, seq_view, slots, out):
+        """
+        Copy the newest published slot of a channel into out
+
+        :return: Sequence number of the copy, 0 when nothing was published yet
+        """
+        while True:
+            seq = int(seq_view[0])
+            if seq == 0:
+                return 0
+            np.copyto(out, slots[seq & 1, ...])
+            # The writer fills the other slot until it publishes seq + 1, then this one
+            if int(seq_view[0]) == seq:
+                return seq
+            self.torn_reads += 1
+
+    @staticmethod
+    def publish(seq_view, slots, record):
+        """
+        Write the next slot of a channel, then its sequence number (single writer)
+        """
+        seq = int(seq_view[0]) + 1
+        np.copyto(slots[seq & 1, ...], record)
+        seq_view[0] = seq
+        return seq
+
+    @property
+    def message(self):
+        size = int(self.header['message_size'][0])
+        return bytes(self.file[MESSAGE_OFFSET:MESSAGE_OFFSET + size]).decode() if size else ''
+
+    @message.setter
+    def message(self, text):
+        data = text.encode()[:DATA_OFFSET - MESSAGE_OFFSET]
+        self.file[MESSAGE_OFFSET:MESSAGE_OFFSET + len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.header['message_size'] = len(data)
+
+    def close(self):
+        del self.states, self.goals, self.state_seq, self.goal_seq, self.status, self.stop_request
+        del self.header, self.file
+
+
+class BusLoop(object):
+    """
+    ControlLoop step of the server process: goals out, feedback in, state published
+    """
+
+    def __init__(self, shared, dxl):
+        self.shared = shared
+        self.dxl = dxl
+        self.loop = None
+        feedback = shared.feedback
+        command = shared.command
+        if sum([reg.size for reg in command.registers]) != command.length:
+            raise ValueError('The command registers must be contiguous, they are written with one Sync Write')
+        self.ids = np.asarray(shared.motor_ids, dtype=np.uint8)
+        self.columns = dict([(motor_id, idx) for idx, motor_id in enumerate(shared.motor_ids)])
+        self.state = np.zeros((), dtype=shared.state_dtype)
+        self.goal = np.zeros((), dtype=shared.goal_dtype)
+        self.applied = 0
+
+        # Scratch buffer of one sample in block layout, decoded into the columns with one record view
+        self.scratch = bytearray(feedback.length * len(self.ids))
+        self.scratch_records = np.frombuffer(self.scratch, dtype=feedback.dtype)
+        self.header = shared.header
+        self.cycles = self.header['cycles']
+        self.overruns = self.header['overruns']
+        self.skipped = self.header['skipped']
+        self.lost = self.header['lost']
+
+    def initial_goals(self, reads=INITIAL_READS):
+        """
+        Publish the present command registers as the first goals (mask 0: nothing to write)
+
+        The motors which do not answer are read again, up to reads Bulk Reads in all. The server does not
+        start without the command registers of every motor: a later write_goals of some registers would
+        write zeros to the others (ex) MOVING_SPEED and TORQUE_LIMIT with GOAL_POSITION).
+        """
+        command = self.shared.command
+        data = bytearray(command.length * len(self.ids))
+        missing = list(self.shared.motor_ids)
+        for _ in range(reads):
+            result = self.dxl.bulk_read(command.address, command.length, missing)
+            for motor_id, status in result.items():
+                if status is not None and len(status.params) == command.length:
+                    idx = self.columns[motor_id]
+                    data[idx * command.length:(idx + 1) * command.length] = status.params
+                    missing.remove(motor_id)
+            if not missing:
+                break
+        else:
+            raise RuntimeError('No command registers from motors %s' % missing)
+        records = command.records(bytes(data))
+        for name in command.names:
+            self.goal[name] = records[name]
+        self.goal['t'] = time.monotonic()
+        self.applied = SharedBus.publish(self.shared.goal_seq, self.shared.goals, self.goal)
+
+    def __call__(self, cycle, t):
+        shared = self.shared
+        if shared.stop_request[0]:
+            self.loop.stop()
+            return
+
+        # 1. Goals, only when a client published new ones
+        if int(shared.goal_seq[0]) != self.applied:
+            self.applied = shared.read(shared.goal_seq, shared.goals, self.goal)
+            mask = self.goal['mask'].astype(bool)
+            if mask.any():
+                goal = self.goal
+                self.dxl.sync_write_array(shared.command.address, self.ids[mask],
+                                          *[goal[name][mask] for name in shared.command.names])
+
+        # 2. Feedback
+        feedback = shared.feedback
+        length = feedback.length
+        result = self.dxl.bulk_read(feedback.address, length, shared.motor_ids)
+
+        # 3. State
+        state = self.state
+        valid = state['valid']
+        scratch = self.scratch
+        lost = 0
+        for motor_id, status in result.items():
+            idx = self.columns[motor_id]
+            if status is None or len(status.params) != length:
+                valid[idx] = 0
+                lost += 1
+                continue
+            valid[idx] = 1
+            scratch[idx * length:(idx + 1) * length] = status.params
+        scratch_records = self.scratch_records
+        for name in feedback.names:
+            state[name] = scratch_records[name]
+        state['t'] = time.monotonic()
+        state['cycle'] = cycle
+        state['goal_seq'] = self.applied
+        SharedBus.publish(shared.state_seq, shared.states, state)
+
+        # Counters of the loop so far
+        loop = self.loop
+        self.cycles[0] = loop.cycles + 1
+        self.overruns[0] = loop.overruns
+        self.skipped[0] = loop.skipped
+        if lost:
+            self.lost[0] += lost
+
+
+def serve(path, port, baudrate, dxl_kwargs, loop_kwargs, cpus=None, realtime_priority=None, disable_gc=True):
+    """
+    Entry point of the server process, runs until the stop flag of the bus file is set
+    """
+    from dxl_packet_generator_p1 import DXLPacketGenP1
+    from dxl_control_loop import ControlLoop
+
+    shared = SharedBus(path)
+    shared.header['pid'] = os.getpid()
+    dxl = None
+    try:
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)
+        if realtime_priority is not None:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime_priority))
+        dxl = DXLPacketGenP1(port, baudrate, **dxl_kwargs)
+        step = BusLoop(shared, dxl)
+        step.initial_goals()
+        loop = ControlLoop(shared.rate, step, **loop_kwargs)
+        step.loop = loop
+
+        # Everything allocated so far lives as long as the process, the loop itself makes no reference cycles
+        if disable_gc:
+            gc.collect()
+            gc.freeze()
+            gc.disable()
+        shared.status[0] = STATUS_RUNNING
+        loop.run()
+
+        statistics = loop.statistics()
+        statistics['lost'] = int(shared.header['lost'][0])
+        shared.message = json.dumps(statistics)
+        shared.status[0] = STATUS_STOPPED
+    except BaseException as error:
+        shared.message = '%s: %s' % (type(error).__name__, error)
+        shared.status[0] = STATUS_FAILED
+        raise
+    finally:
+        if dxl is not None:
+            dxl.close()
+        shared.close()
+
+
+class BusClient(object):
+    """
+    Access to the state and goals of a running BusServer, from any process
+
+    :param path: Bus file of the server
+    :param timeout: Seconds to wait for the server to run
+
+    Only one client per bus should write goals: the goal channel has a single writer.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        self.shared = SharedBus(path)
+        self.motor_ids = self.shared.motor_ids
+        self.columns = dict([(motor_id, idx) for idx, motor_id in enumerate(self.motor_ids)])
+        self.feedback = self.shared.feedback
+        self.command = self.shared.command
+        self.state = np.zeros((), dtype=self.shared.state_dtype)
+        self.goal = np.zeros((), dtype=self.shared.goal_dtype)
+        # Sequence of the goals which last asked for each motor, see write_goals
+        self.mask_seq = np.zeros(len(self.motor_ids), dtype=np.uint64)
+
+        deadline = time.monotonic() + timeout
+        status = self.shared.status
+        # Running, with a first state to read
+        while int(status[0]) == STATUS_STARTING or (int(status[0]) == STATUS_RUNNING and not self.shared.state_seq[0]):
+            if time.monotonic() > deadline:
+                raise RuntimeError('The bus server did not start within %.1f s' % timeout)
+            time.sleep(0.001)
+        if int(self.shared.status[0]) == STATUS_FAILED:
+            raise RuntimeError('The bus server failed: %s' % self.shared.message)
+        # The goals last published (by the server at start, or by the previous client) are the base of new ones
+        self.shared.read(self.shared.goal_seq, self.shared.goals, self.goal)
+
+    @property
+    def running(self):
+        return int(self.shared.status[0]) == STATUS_RUNNING
+
+    @property
+    def torn_reads(self):
+        return self.shared.torn_reads
+
+    def read_state(self, out=None):
+        """
+        Copy of the latest state
+
+        :param out: Record to copy into (np.zeros((), client.shared.state_dtype)), the client's own by default
+        :return: (sequence, record); out is overwritten by the next call
+        """
+        out = self.state if out is None else out
+        return self.shared.read(self.shared.state_seq, self.shared.states, out), out
+
+    def wait_state(self, seq, timeout=None, poll=0.0001):
+        """
+        Wait for a state newer than seq, ex) the sequence of the previous read_state
+
+        :return: (sequence, record), or (seq, None) after the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        state_seq = self.shared.state_seq
+        while int(state_seq[0]) <= seq:
+            if deadline is not None and time.monotonic() > deadline:
+                return seq, None
+            if not self.running:
+                raise RuntimeError('The bus server is not running')
+            time.sleep(poll)
+        return self.read_state()
+
+    def applied_goals(self):
+        """
+        :return: Sequence of the last goals written by the server, the goal_seq of the latest state
+        """
+        state_seq = self.shared.state_seq
+        states = self.shared.states
+        while True:
+            seq = int(state_seq[0])
+            applied = int(states[seq & 1]['goal_seq'])
+            if int(state_seq[0]) == seq:
+                return applied
+
+    def write_goals(self, motor_ids=None, **raw):
+        """
+        Publish goals, written by the server at the start of its next cycle
+
+        :param motor_ids: Motors to write, all of them by default; the values are in this order
+        :param raw: Raw values per command register, ex) GOAL_POSITION=positions, MOVING_SPEED=speeds
+        :return: Sequence of the goals, compare with the goal_seq of the state to know they were written
+
+        The whole command block is written for each motor, registers not given keep their last goal.
+        The server only sees the latest goals: the motors of earlier goals it has not written yet stay in
+        the mask, so several calls within one cycle all reach the bus.
+        """
+        goal = self.goal
+        mask = goal['mask']
+        seq = int(self.shared.goal_seq[0]) + 1
+        mask[:] = self.mask_seq > self.applied_goals()
+        if motor_ids is None:
+            columns = slice(None)
+        else:
+            columns = [self.columns[motor_id] for motor_id in motor_ids]
+        mask[columns] = 1
+        self.mask_seq[columns] = seq
+        for name, values in raw.items():
+            if name not in self.command.names:
+                raise ValueError('%s is not a command register of this bus' % name)
+            values = np.asarray(values)
+            goal[name][columns] = np.rint(values) if values.dtype.kind == 'f' else values
+        goal['t'] = time.monotonic()
+        return SharedBus.publish(self.shared.goal_seq, self.shared.goals, goal)
+
+    def statistics(self):
+        header = self.shared.header
+        return {
+            'cycles': int(header['cycles'][0]),
+            'overruns': int(header['overruns'][0]),
+            'skipped': int(header['skipped'][0]),
+            'lost': int(header['lost'][0]),
+            'torn_reads': self.shared.torn_reads,
+        }
+
+    def close(self):
+        self.shared.close()
+
+
+class BusServer(object):
+    """
+    Start and stop the server process of one bus
+
+    :param port, baudrate: Serial port of the bus
+    :param motor_ids: Motors in column order
+    :param rate: Cycles per second
+    :param path: Bus file to create (overwritten), /dev/shm/dxl_bus_<pid> by default; removed on close
+    :param feedback: RegisterBlock read every cycle
+    :param command: RegisterBlock written with new goals, its registers must be contiguous
+    :param dxl_kwargs: DXLPacketGenP1 arguments, ex) {'transport': TRANSPORT_LOW_LATENCY}; must be picklable
+    :param loop_kwargs: ControlLoop arguments, ex) {'spin_threshold': 0.0005}
+    :param cpus: CPUs the server process is pinned to, ex) [3] for a core isolated with isolcpus
+    :param realtime_priority: SCHED_FIFO priority of the server process (needs CAP_SYS_NICE), None to keep the default
+    :param disable_gc: Freeze and disable the garbage collector of the server once its loop is set up
+    :param start_method: multiprocessing start method, 'spawn' by default: the parent may run threads
+                         (ex) a simulator or a BusWorker) which must not be forked
+
+    With 'spawn' the main module is imported again by the server process, so scripts start the server
+    under if __name__ == '__main__'.
+    """
+
+    def __init__(self, port, baudrate, motor_ids, rate=1000, path=None, feedback=FEEDBACK_BLOCK,
+                 command=COMMAND_BLOCK, dxl_kwargs=None, loop_kwargs=None, cpus=None, realtime_priority=None,
+                 disable_gc=True, start_method='spawn', timeout=10.0):
+        self.path = path if path is not None else '/dev/shm/dxl_bus_%d' % os.getpid()
+        self.motor_ids = list(motor_ids)
+        SharedBus.create(self.path, self.motor_ids, rate, feedback, command)
+        self.process = multiprocessing.get_context(start_method).Process(
+            target=serve, name='dxl-bus-server',
+            args=(self.path, port, baudrate, dict(dxl_kwargs or {}), dict(loop_kwargs or {}), cpus,
+                  realtime_priority, disable_gc))
+        self.process.daemon = True
+        self.shared = SharedBus(self.path)
+        self.timeout = timeout
+        self.clients = []
+        self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        self.process.start()
+        deadline = time.monotonic() + self.timeout
+        while int(self.shared.status[0]) == STATUS_STARTING:
+            if not self.process.is_alive():
+                break
+            if time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError('The bus server did not start within %.1f s' % self.timeout)
+            time.sleep(0.001)
+        if int(self.shared.status[0]) != STATUS_RUNNING:
+            message = self.shared.message or 'exit code %s' % self.process.exitcode
+            self.close()
+            raise RuntimeError('The bus server failed: %s' % message)
+
+    def client(self):
+        """
+        BusClient of this bus in the current process
+        """
+        client = BusClient(self.path, self.timeout)
+        self.clients.append(client)
+        return client
+
+    def stop(self):
+        """
+        Stop the loop after its current cycle and wait for the process
+
+        :return: Loop statistics of the server (see ControlLoop.statistics), with 'lost': motors not read
+        """
+        if self.shared is None:
+            return None
+        if self.process.pid is not None and self.process.is_alive():
+            self.shared.stop_request[0] = 1
+            self.process.join(self.timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        if int(self.shared.status[0]) == STATUS_STOPPED:
+            return json.loads(self.shared.message)
+        return None
+
+    def close(self):
+        statistics = self.stop()
+        for client in self.clients:
+            client.close()
+        del self.clients[:]
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+            os.remove(self.path)
+        return statistics
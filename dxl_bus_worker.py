@@ -0,0 +1,222 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Single owner I/O thread for one Dynamixel bus, with a priority queue
+
+    One thread owns the DXLPacketGenP1 and runs its transactions one after another. Clients never touch
+    the serial port: they submit a call and get a concurrent.futures.Future for its result.
+
+        PRIORITY_REALTIME       control loop traffic (goal positions, feedback reads)
+        PRIORITY_NORMAL         everything else that should go out soon
+        PRIORITY_BACKGROUND     diagnostics (temperature polls, LED writes), only in the slack of a cycle
+
+    The next call is always the oldest one of the highest priority class. A bus transaction cannot be
+    interrupted, so a background call is only started when it ends before the next reserved real-time slot:
+    the control loop announces its next cycle with reserve(t), and a background call whose expected duration
+    (mean of its earlier runs) does not fit before t - guard waits for the next gap.
+
+    EX)
+        worker = BusWorker(DXLPacketGenP1('/dev/ttyUSB0', 1000000))
+        # control loop, every cycle
+        worker.reserve(next_deadline)
+        feedback = worker.submit('bulk_read', DXL_PRESENT_POSITION_L, 2, ids, priority=PRIORITY_REALTIME).result()
+        # anywhere else
+        worker.submit('read_data', 3, DXL_PRESENT_TEMPERATURE, 1, priority=PRIORITY_BACKGROUND)
+
+    Statistics per class (Histogram, seconds): wait (submit to start), service (start to end),
+    and the queue depth seen by each submit; deferred: background calls which had to wait for a gap.
+
+
+"""
+
+import time
+import heapq
+import threading
+from concurrent.futures import Future
+from dxl_stats import Histogram
+
+PRIORITY_REALTIME = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = ('realtime', 'normal', 'background')
+
+# Queue depth buckets
+DEPTH_EDGES = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class BusWorker(object):
+    """
+    :param dxl: DXLPacketGenP1 (or any object whose methods are submitted by name)
+    :param guard: Seconds kept free before a reserved real-time slot
+    :param default_duration: Expected duration of a call which has not run yet
+    """
+
+    def __init__(self, dxl, guard=0.0002, default_duration=0.001, clock=time.monotonic):
+        self.dxl = dxl
+        self.guard = guard
+        self.default_duration = default_duration
+        self.clock = clock
+
+        self.queue = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.reserved = None
+        self.running = True
+
+        self.durations = {}
+        self.wait_time = [Histogram() for _ in PRIORITY_NAMES]
+        self.service_time = [Histogram() for _ in PRIORITY_NAMES]
+        self.depth = [Histogram(DEPTH_EDGES) for _ in PRIORITY_NAMES]
+        self.pending = [0] * len(PRIORITY_NAMES)
+        self.deferred = 0
+        # Sequence of the last deferred call, each call is counted once however often it waits
+        self.last_deferred = None
+
+        self.thread = threading.Thread(target=self.__run, name='dxl-bus-worker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Queue one call of a DXLPacketGenP1 method
+
+        :param method: Method name, ex) 'read_data', or a callable taking the DXLPacketGenP1 as first argument
+        :param priority: PRIORITY_REALTIME, PRIORITY_NORMAL (default) or PRIORITY_BACKGROUND
+        :return: concurrent.futures.Future of the result
+        """
+        priority = kwargs.pop('priority', PRIORITY_NORMAL)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments: %s' % ', '.join(kwargs))
+        if priority not in (PRIORITY_REALTIME, PRIORITY_NORMAL, PRIORITY_BACKGROUND):
+            raise ValueError('priority must be PRIORITY_REALTIME, PRIORITY_NORMAL or PRIORITY_BACKGROUND')
+        future = Future()
+        with self.condition:
+            if not self.running:
+                raise RuntimeError('The bus worker is closed')
+            self.depth[priority].record(self.pending[priority])
+            self.pending[priority] += 1
+            heapq.heappush(self.queue, (priority, self.sequence, method, args, future, self.clock()))
+            self.sequence += 1
+            self.condition.notify()
+        return future
+
+    def call(self, method, *args, **kwargs):
+        """
+        submit() and wait for the result
+        """
+        return self.submit(method, *args, **kwargs).result()
+
+    def reserve(self, start):
+        """
+        Announce the next real-time slot (clock time); background calls must end before start - guard
+        """
+        with self.condition:
+            self.reserved = start
+            self.condition.notify()
+
+    def release(self):
+        """
+        No real-time slot ahead, background calls may run at any time
+        """
+        self.reserve(None)
+
+    def expected_duration(self, method):
+        return self.durations.get(self.__key(method), self.default_duration)
+
+    @staticmethod
+    def __key(method):
+        return method if isinstance(method, str) else getattr(method, '__name__', method)
+
+    def __next(self):
+        """
+        Pop the next call to run, waiting while the queue is empty or only holds background calls without slack
+        """
+        queue = self.queue
+        while self.running:
+            if queue:
+                priority, sequence, method, args, future, submitted = queue[0]
+                if priority != PRIORITY_BACKGROUND or self.reserved is None:
+                    return heapq.heappop(queue)
+                now = self.clock()
+                if self.reserved - self.guard - now >= self.expected_duration(method):
+                    return heapq.heappop(queue)
+                if self.reserved + self.guard <= now:
+                    # The slot has passed without a new reservation
+                    self.reserved = None
+                    continue
+                if sequence != self.last_deferred:
+                    self.deferred += 1
+                    self.last_deferred = sequence
+                # Until the slot has passed, the control loop reserves another one, or a higher priority call comes in
+                self.condition.wait(self.reserved + self.guard - now)
+            else:
+                self.condition.wait()
+        return None
+
+    def __run(self):
+        dxl = self.dxl
+        clock = self.clock
+        while True:
+            with self.condition:
+                item = self.__next()
+                if item is None:
+                    return
+                priority, sequence, method, args, future, submitted = item
+                self.pending[priority] -= 1
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            start = clock()
+            self.wait_time[priority].record(start - submitted)
+            try:
+                if isinstance(method, str):
+                    result = getattr(dxl, method)(*args)
+                else:
+                    result = method(dxl, *args)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+            duration = clock() - start
+            self.service_time[priority].record(duration)
+            key = self.__key(method)
+            # Running mean, weighted to the recent calls
+            previous = self.durations.get(key)
+            self.durations[key] = duration if previous is None else previous + 0.2 * (duration - previous)
+
+    def close(self):
+        """
+        Stop after the running call, calls still in the queue are cancelled
+        """
+        with self.condition:
+            self.running = False
+            for item in self.queue:
+                item[4].cancel()
+            del self.queue[:]
+            self.condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def statistics(self):
+        """
+        Snapshot of the queue statistics as a dictionary, per priority class
+        """
+        with self.condition:
+            classes = {}
+            for priority, name in enumerate(PRIORITY_NAMES):
+                classes[name] = {
+                    'queued': self.pending[priority],
+                    'depth': self.depth[priority].snapshot(),
+                    'wait': self.wait_time[priority].snapshot(),
+                    'service': self.service_time[priority].snapshot(),
+                }
+            return {'classes': classes, 'deferred': self.deferred, 'reserved': self.reserved}
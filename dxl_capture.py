@@ -0,0 +1,442 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Capture of the serial traffic of a Protocol 1.0 bus, and its replay
+
+    With DXLPacketGenP1(..., capture=Capture(path)) every instruction packet written to the port and every
+    chunk read from it (as it came from read(), noise and late replies included) goes into a binary log:
+
+        header      magic 'DXLCAP1', version, baud rate, wall clock time of the start (time.time())
+        frame       t (uint64, ns since the start, time.monotonic_ns), direction (uint8, DIR_TX / DIR_RX,
+                    plus CONTINUED when the next frame holds the rest of the same write or read),
+                    length (uint16), then the bytes
+
+    A frame costs one struct pack and two writes into the buffer of the file, nothing is flushed per frame.
+    A write or read longer than MAX_FRAME bytes is split into CONTINUED frames, CaptureLog joins them again.
+
+    Replay
+        ReplayBus answers on a pseudo-terminal, like dxl_simulator_p1.VirtualDXLBus, with the bytes of the
+        log: each instruction packet it gets is checked against the next TX frame of the log, and the RX
+        frames which followed that TX frame are sent back, right away or at their recorded delays (realtime).
+        replay() turns every TX frame of the log back into the DXLPacketGenP1 call which wrote it, so the
+        driver encodes, writes, waits and parses exactly as in the recorded session. A TX frame without a
+        complete instruction packet (ex) the cut end of a log) is not replayed, both count it as empty.
+        Realtime waits sleep (dxl_simulator_p1.wait), a frame can go out a scheduler tick late on a busy host.
+        decode() only feeds the RX frames to a StatusParser, for the throughput of the parser alone.
+
+    EX)
+        with Capture('session.dxlcap', baudrate=1000000) as capture:
+            dxl = DXLPacketGenP1('/dev/ttyUSB0', 1000000, capture=capture)
+            ...
+
+        log = CaptureLog('session.dxlcap')
+        with ReplayBus(log, realtime=False) as bus:
+            dxl = DXLPacketGenP1(bus.port, log.baudrate, transport=TRANSPORT_LOW_LATENCY)
+            print(replay(dxl, bus))     # transactions per second, TX mismatches, timeouts
+
+
+"""
+
+import os
+import tty
+import time
+import struct
+import select
+import threading
+from dxl_addr_table_p1 import *
+from dxl_status_parser_p1 import StatusParser
+from dxl_simulator_p1 import wait
+
+MAGIC = b'DXLCAP1'
+VERSION = 1
+
+DIR_TX = 0
+DIR_RX = 1
+DIRECTION_NAMES = ('TX', 'RX')
+# Flag of the direction byte: the next frame continues this one
+CONTINUED = 0x80
+
+# magic, version, baud rate, wall clock time of the start
+HEADER = struct.Struct('<8sIId')
+# t (ns since the start), direction, length
+FRAME = struct.Struct('<QBH')
+MAX_FRAME = 0xFFFF
+
+# TX frames of the log the replay looks ahead to find the packet it got
+RESYNC_WINDOW = 16
+
+
+class Capture(object):
+    """
+    Writer of a capture log
+
+    :param path: File to create (overwritten)
+    :param baudrate: Baud rate of the bus, kept in the header for the replay
+    :param buffer_size: Buffer of the file; frames reach the disk when it is full, on flush() and on close()
+    :param clock: Time source in ns, monotonic
+
+    One Capture per driver: frames are written from the thread holding the port lock of the driver.
+    """
+
+    def __init__(self, path, baudrate=0, buffer_size=1 << 16, clock=time.monotonic_ns):
+        self.path = path
+        self.clock = clock
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.file.write(HEADER.pack(MAGIC, VERSION, baudrate, time.time()))
+        self.start = clock()
+        self.frames = 0
+        self.bytes = 0
+        self.write = self.file.write
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, direction, data):
+        length = len(data)
+        if length > MAX_FRAME:
+            for idx in range(0, length, MAX_FRAME):
+                more = idx + MAX_FRAME < length
+                self.record(direction | CONTINUED if more else direction, data[idx:idx + MAX_FRAME])
+            return
+        self.write(FRAME.pack(self.clock() - self.start, direction, length))
+        self.write(data)
+        self.frames += 1
+        self.bytes += length
+
+    def tx(self, data):
+        self.record(DIR_TX, data)
+
+    def rx(self, data):
+        self.record(DIR_RX, data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class Frame(object):
+    """
+    One write or read of a captured session
+
+    t: seconds since the start of the capture
+    """
+    __slots__ = ('t', 'direction', 'data')
+
+    def __init__(self, t, direction, data):
+        self.t = t
+        self.direction = direction
+        self.data = data
+
+    def __repr__(self):
+        return 'Frame(%.6f, %s, %s)' % (self.t, DIRECTION_NAMES[self.direction], self.data.hex())
+
+
+class CaptureLog(object):
+    """
+    A capture log read into memory
+
+    frames: all frames in recording order
+    transactions: [(TX frame, [RX frames until the next TX frame]), ...]
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError('%s is not a capture log' % path)
+        magic, version, self.baudrate, self.wall_time = HEADER.unpack_from(data)
+        if magic.rstrip(b'\x00') != MAGIC:
+            raise ValueError('%s is not a capture log' % path)
+        if version != VERSION:
+            raise ValueError('Unsupported capture log version %d' % version)
+
+        self.frames = []
+        # Parts of a write or read split into CONTINUED frames, and the time of the first one
+        parts = []
+        first = 0
+        offset = HEADER.size
+        while offset + FRAME.size <= len(data):
+            t, direction, length = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            if offset + length > len(data):
+                # The end of a log whose writer did not close it
+                break
+            chunk = data[offset:offset + length]
+            offset += length
+            if direction & CONTINUED:
+                first = t if not parts else first
+                parts.append(chunk)
+                continue
+            if parts:
+                parts.append(chunk)
+                t, chunk = first, b''.join(parts)
+                parts = []
+            self.frames.append(Frame(t * 1e-9, direction, chunk))
+
+        self.transactions = []
+        for frame in self.frames:
+            if frame.direction == DIR_TX:
+                self.transactions.append((frame, []))
+            elif self.transactions:
+                self.transactions[-1][1].append(frame)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        return self.frames[-1].t - self.frames[0].t if self.frames else 0.0
+
+    def bytes(self, direction):
+        return sum([len(frame.data) for frame in self.frames if frame.direction == direction])
+
+
+def split_packets(data):
+    """
+    Instruction packets of a byte string, ex) a TX frame holding several Sync Write packets
+
+    :return: (list of complete packets, bytes left after the last one)
+    """
+    packets = []
+    data = bytes(data)
+    while True:
+        idx = data.find(b'\xff\xff')
+        if idx < 0:
+            return packets, data[-1:] if data.endswith(b'\xff') else b''
+        data = data[idx:]
+        if len(data) < 4:
+            return packets, data
+        if data[2] == 0xFF:
+            data = data[1:]
+            continue
+        end = data[3] + 4
+        if len(data) < end:
+            return packets, data
+        packets.append(data[:end])
+        data = data[end:]
+
+
+def packet_call(packet):
+    """
+    DXLPacketGenP1 call which writes a given instruction packet
+
+    :return: (method name, arguments), or None for a packet no single call writes
+    """
+    motor_id, instruction = packet[2], packet[4]
+    params = packet[5:-1]
+    if instruction == DXL_PING:
+        return 'ping', (motor_id, )
+    if instruction == DXL_READ_DATA and len(params) == 2:
+        return 'read_data', (motor_id, params[0], params[1])
+    if instruction == DXL_WRITE_DATA and params:
+        return 'write_data', (motor_id, params[0], bytes(params[1:]))
+    if instruction == DXL_REG_WRITE and params:
+        return 'reg_write', (motor_id, params[0], bytes(params[1:]))
+    if instruction == DXL_ACTION:
+        return 'action', (motor_id, )
+    if instruction == DXL_RESET:
+        return 'factory_reset', (motor_id, )
+    if instruction == DXL_REBOOT:
+        return 'reboot', (motor_id, )
+    if instruction == DXL_SYNC_WRITE and len(params) >= 2:
+        length = params[1] + 1
+        total_data = tuple([tuple(params[idx:idx + length]) for idx in range(2, len(params), length)])
+        return 'sync_write', (params[0], total_data)
+    if instruction == DXL_BULK_READ and len(params) >= 1:
+        motor_list = [(params[idx + 1], params[idx + 2], params[idx]) for idx in range(1, len(params) - 2, 3)]
+        return 'bulk_read', (None, None, motor_list)
+    return None
+
+
+class ReplayBus(object):
+    """
+    Pseudo-terminal which answers with the RX frames of a capture log
+
+    :param log: CaptureLog, or the path of a capture log
+    :param realtime: Send each RX frame at its recorded delay after its TX frame, right away otherwise
+
+    replayed: TX frames of the log done so far (the empty ones left out)
+    empty: TX frames without a complete instruction packet, not replayed
+    mismatches: TX frames whose packets differed from the log (answered with the RX frames of the log anyway)
+    skipped: TX frames of the log which never came, ex) a packet cut by the output buffer reset of
+             TRANSPORT_SAFE; the replay finds its place again with the next packet matching the log
+    """
+
+    def __init__(self, log, realtime=False):
+        self.log = log if isinstance(log, CaptureLog) else CaptureLog(log)
+        self.realtime = realtime
+        self.replayed = 0
+        self.mismatches = 0
+        self.skipped = 0
+        self.empty = 0
+
+        # Expected packets and the answer of every TX frame, prepared before the replay starts
+        self.expected = []
+        for tx, rx in self.log.transactions:
+            packets = split_packets(tx.data)[0]
+            if not packets:
+                # Nothing to wait for, its RX frames are noise which no call would read
+                self.empty += 1
+                continue
+            answer = [(frame.t - tx.t, frame.data) for frame in rx]
+            self.expected.append((packets, answer, b''.join([frame.data for frame in rx])))
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.running = False
+        self.thread = None
+        self._buffer = b''
+        self._packets = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name='dxl-replay')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __run(self):
+        while self.running:
+            ready = select.select([self.master], [], [], 0.05)[0]
+            if not ready:
+                continue
+            try:
+                received = os.read(self.master, 4096)
+            except OSError:
+                break
+            packets, self._buffer = split_packets(self._buffer + received)
+            self._packets.extend(packets)
+            # A TX frame is complete once as many packets as in the log came in
+            while self.replayed < len(self.expected):
+                expected, answer, joined = self.expected[self.replayed]
+                if len(self._packets) < len(expected):
+                    break
+                arrival = time.monotonic()
+                if self._packets[:len(expected)] != expected:
+                    index = self.__find(self._packets[0])
+                    if index is None:
+                        self.mismatches += 1
+                    else:
+                        self.skipped += index - self.replayed
+                        self.replayed = index
+                        expected, answer, joined = self.expected[index]
+                        if len(self._packets) < len(expected):
+                            break
+                del self._packets[:len(expected)]
+                self.replayed += 1
+                if not self.realtime:
+                    if joined:
+                        os.write(self.master, joined)
+                    continue
+                for delay, data in answer:
+                    wait(arrival + delay - time.monotonic())
+                    os.write(self.master, data)
+
+    def __find(self, packet):
+        """
+        Index of the next TX frame of the log starting with packet, within RESYNC_WINDOW
+        """
+        end = min(self.replayed + 1 + RESYNC_WINDOW, len(self.expected))
+        for index in range(self.replayed + 1, end):
+            expected = self.expected[index][0]
+            if expected and expected[0] == packet:
+                return index
+        return None
+
+
+def replay(dxl, bus, realtime=None):
+    """
+    Make every call of the captured session again, on a driver connected to bus
+
+    :param dxl: DXLPacketGenP1 on bus.port, without retry policy (the retries are in the log as TX frames)
+    :param bus: ReplayBus
+    :param realtime: Start every call at its recorded time, bus.realtime by default
+    :return: Dictionary of the replay: transactions, calls per method, raw (packets written as they are),
+             timeouts (Status Packets which did not come), TX mismatches, skipped and empty TX frames
+             (see ReplayBus), elapsed time and transactions per second
+    """
+    realtime = bus.realtime if realtime is None else realtime
+    transactions = bus.log.transactions
+    calls = {}
+    raw = 0
+    timeouts = 0
+    first = transactions[0][0].t if transactions else 0.0
+    start = time.monotonic()
+    for tx, rx in transactions:
+        packets = split_packets(tx.data)[0]
+        if not packets:
+            continue
+        if realtime:
+            wait(start + tx.t - first - time.monotonic())
+        call = packet_call(packets[0]) if len(packets) == 1 else None
+        if call is None:
+            # Several packets of one write (precomputed Sync Write), or an instruction the driver does not build
+            dxl.sync_write_packets(tx.data)
+            raw += 1
+            continue
+        method, args = call
+        calls[method] = calls.get(method, 0) + 1
+        result = getattr(dxl, method)(*args)
+        if isinstance(result, dict):
+            timeouts += list(result.values()).count(None)
+        elif result is None and rx:
+            timeouts += 1
+    elapsed = time.monotonic() - start
+    replayed = len(transactions) - bus.empty
+    return {
+        'transactions': replayed,
+        'calls': calls,
+        'raw': raw,
+        'timeouts': timeouts,
+        'mismatches': bus.mismatches,
+        'skipped': bus.skipped,
+        'empty': bus.empty,
+        'elapsed': elapsed,
+        'transactions_per_s': replayed / elapsed if elapsed > 0 else None,
+    }
+
+
+def decode(log, parser=None):
+    """
+    Parse the RX frames of a capture log, transaction by transaction, as the driver does
+
+    :return: Number of Status Packets parsed
+    """
+    parser = StatusParser() if parser is None else parser
+    packets = 0
+    for tx, rx in log.transactions:
+        parser.reset()
+        for frame in rx:
+            parser.feed(frame.data)
+            while parser.next_packet() is not None:
+                packets += 1
+    return packets
@@ -0,0 +1,190 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Fixed rate control loop on absolute deadlines
+
+    Cycle k starts at start + k * period (time.monotonic), not "period after the previous cycle ended",
+    so the time spent in the cycle and in sleep() does not add up into drift.
+
+    Waiting is hybrid: time.sleep() until spin_threshold before the deadline, then busy wait for the rest.
+    sleep() alone wakes up late by tens to hundreds of microseconds, which is a large part of a 1 ms period.
+
+    Overrun: a cycle that ends after the next deadline
+        - OVERRUN_SKIP: the missed deadlines are dropped, the loop continues on the next deadline in the future
+        - OVERRUN_CATCH_UP: the missed cycles run right away, back to back, until the loop is on time again
+          (the loop falls at most max_catch_up cycles behind, older deadlines are skipped)
+
+    EX) 1 kHz: goal positions with sync_write, present position with bulk_read
+        plan = CyclePlan(dxl, command=lambda cycle, t: (DXL_GOAL_POSITION_L, goal_data(t)),
+                         feedback=(DXL_PRESENT_POSITION_L, 2, motor_ids))
+        loop = ControlLoop(1000, plan)
+        loop.run(duration=10.0)
+        print(loop.statistics())
+
+
+"""
+
+import time
+from dxl_stats import Histogram
+
+OVERRUN_SKIP = 'skip'
+OVERRUN_CATCH_UP = 'catch_up'
+
+
+class CyclePlan(object):
+    """
+    Per cycle plan of a command write and a feedback read on one DXLPacketGenP1
+
+    :param dxl: DXLPacketGenP1
+    :param command: callable(cycle, t) -> (control_address, total_data) for sync_write, or None to skip the write
+    :param feedback: (read_address, address_length, motor_list) for bulk_read,
+                     or (motor_id, address, length) for read_data when there is a single motor
+    :param on_feedback: optional callable(cycle, t, result) with the result of the read
+    """
+
+    def __init__(self, dxl, command=None, feedback=None, on_feedback=None):
+        self.dxl = dxl
+        self.command = command
+        self.feedback = feedback
+        self.on_feedback = on_feedback
+        self.result = None
+
+    def __call__(self, cycle, t):
+        if self.command is not None:
+            command = self.command(cycle, t)
+            if command is not None:
+                self.dxl.sync_write(*command)
+        if self.feedback is not None:
+            if isinstance(self.feedback[2], int):
+                self.result = self.dxl.read_data(*self.feedback)
+            else:
+                self.result = self.dxl.bulk_read(*self.feedback)
+            if self.on_feedback is not None:
+                self.on_feedback(cycle, t, self.result)
+
+
+class ControlLoop(object):
+    """
+    Run step(cycle, t) at a fixed rate
+
+    :param rate: Cycles per second, ex) 500 or 1000
+    :param step: callable(cycle, t), cycle is the index of the deadline since start, t its deadline
+    :param overrun: OVERRUN_SKIP or OVERRUN_CATCH_UP
+    :param spin_threshold: Seconds before a deadline where sleeping stops and busy waiting begins
+    :param max_catch_up: Most cycles the loop may fall behind with OVERRUN_CATCH_UP
+
+    overruns counts the cycles that made the loop late; skipped counts the deadlines that were dropped.
+
+    Statistics (Histogram, seconds)
+        cycle_time: time spent in step()
+        period: time between the starts of two consecutive cycles
+        jitter: how late a cycle started after its deadline
+    """
+
+    def __init__(self, rate, step, overrun=OVERRUN_SKIP, spin_threshold=0.0002, max_catch_up=10,
+                 clock=time.monotonic):
+        if overrun not in (OVERRUN_SKIP, OVERRUN_CATCH_UP):
+            raise ValueError('overrun must be OVERRUN_SKIP or OVERRUN_CATCH_UP')
+        self.period = 1.0 / rate
+        self.step = step
+        self.overrun = overrun
+        self.spin_threshold = spin_threshold
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.running = False
+
+        self.cycle_time = Histogram()
+        self.period_time = Histogram()
+        self.jitter = Histogram()
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+
+    def stop(self):
+        """
+        Stop the loop after the current cycle, can be called from step() or another thread
+        """
+        self.running = False
+
+    def wait_until(self, deadline):
+        clock = self.clock
+        remaining = deadline - clock()
+        if remaining > self.spin_threshold:
+            time.sleep(remaining - self.spin_threshold)
+        while clock() < deadline:
+            pass
+
+    def run(self, cycles=None, duration=None):
+        """
+        Run until stop(), or until the given number of cycles or seconds have passed
+
+        :return: number of cycles run
+        """
+        clock = self.clock
+        period = self.period
+        step = self.step
+        cycle_time = self.cycle_time
+        jitter = self.jitter
+        period_time = self.period_time
+
+        start = clock()
+        end = start + duration if duration is not None else None
+        cycle = 0
+        previous_start = None
+        run_cycles = 0
+        behind = False
+        self.running = True
+        while self.running:
+            deadline = start + cycle * period
+            if end is not None and deadline >= end:
+                break
+            if cycles is not None and run_cycles >= cycles:
+                break
+
+            self.wait_until(deadline)
+            cycle_start = clock()
+            step(cycle, deadline)
+            cycle_end = clock()
+
+            # Statistics
+            cycle_time.record(cycle_end - cycle_start)
+            jitter.record(cycle_start - deadline)
+            if previous_start is not None:
+                period_time.record(cycle_start - previous_start)
+            previous_start = cycle_start
+            run_cycles += 1
+            self.cycles += 1
+
+            # Next deadline and overrun handling
+            cycle += 1
+            late = cycle_end - (start + cycle * period)
+            if late > 0:
+                # Catch up cycles that are still late belong to the same overrun
+                if not behind:
+                    self.overruns += 1
+                missed = int(late / period) + 1
+                if self.overrun == OVERRUN_CATCH_UP:
+                    missed = max(0, missed - self.max_catch_up)
+                    behind = True
+                self.skipped += missed
+                cycle += missed
+            else:
+                behind = False
+        self.running = False
+        return run_cycles
+
+    def statistics(self):
+        """
+        Snapshot of the loop statistics as a dictionary
+        """
+        return {
+            'rate': 1.0 / self.period,
+            'cycles': self.cycles,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'cycle_time': self.cycle_time.snapshot(),
+            'period': self.period_time.snapshot(),
+            'jitter': self.jitter.snapshot(),
+        }
@@ -0,0 +1,293 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Control Table shadow for Protocol 1.0
+
+    A copy of each motor's Control Table (dxl_addr_table_p1 layout, 74 bytes) is kept on the host,
+    so values which cannot change behind our back do not cost a bus transaction:
+
+        - EEPROM (Model Number ... Resolution Divider): fetched once, then answered from the shadow
+        - RAM written by us (gains, Goal Position, Moving Speed, ...): the shadow holds the last value
+          written, a read after a write needs no transaction
+        - Measured values (Present Position ... Moving, Consuming Current) always go to the bus
+        - Torque Enable, LED and Torque Limit always go to the bus too, and a write of them is always sent:
+          the motor clears them itself on an alarm shutdown (Overload, Overheating, ...)
+
+    Writes are staged with set() and sent with flush(). Only the bytes that differ from the shadow
+    are marked dirty, and each contiguous dirty range goes out as one WRITE, so writing the same goal
+    twice costs nothing and changing one byte of a block sends one byte. A byte staged back to the value
+    the motor holds is not dirty anymore.
+
+    Invalidation
+        - reboot(): RAM is back to its power on values, the RAM part of the shadow is dropped
+        - factory_reset(): the whole shadow of the motor is dropped
+        - a write to the ID or the Baud Rate: the motor is not reachable under its old address anymore,
+          its shadow is dropped (flush() sends this range after the other dirty ranges of the motor)
+
+    EX)
+        shadow = ControlTableShadow(DXLPacketGenP1('/dev/ttyUSB0', 1000000))
+        model = shadow.read(1, DXL_MODEL_NUMBER_L, 2)       # bus once, then from the shadow
+        shadow.set(1, DXL_GOAL_POSITION_L, (0x00, 0x08))
+        shadow.set(1, DXL_MOVING_SPEED_L, (0x80, 0x00))
+        shadow.flush()                                      # one WRITE of 4 bytes at address 30
+
+
+"""
+
+from dxl_addr_table_p1 import *
+from dxl_status_parser_p1 import StatusPacket
+
+CONTROL_TABLE_SIZE = 74
+EEPROM_SIZE = DXL_TORQUE_ENABLE
+
+# Values measured by the motor
+MEASURED = frozenset(list(range(DXL_PRESENT_POSITION_L, DXL_MOVING + 1)) + [DXL_CURRENT_L, DXL_CURRENT_H])
+# Values the motor changes itself on an alarm shutdown
+SHUTDOWN_CHANGED = frozenset([DXL_TORQUE_ENABLE, DXL_LED, DXL_TORQUE_LIMIT_L, DXL_TORQUE_LIMIT_H])
+# Never answered from the shadow
+VOLATILE = MEASURED.union(SHUTDOWN_CHANGED)
+# Read only values and reserved addresses, never part of a WRITE
+READ_ONLY = frozenset([DXL_MODEL_NUMBER_L, DXL_MODEL_NUMBER_H, DXL_FIRMWARE_VERSION, 19, 23, 29, 45]
+                      + list(range(DXL_PUNCH_H + 1, DXL_CURRENT_L))).union(MEASURED)
+# Writes which change how the motor is addressed
+READDRESSING = frozenset([DXL_MOTOR_ID, DXL_BAUD_RATE])
+# Error bits of a Status Packet which mean that a WRITE was not applied
+WRITE_REJECTED = DXL_ERROR_INSTRUCTION | DXL_ERROR_CHECKSUM | DXL_ERROR_RANGE
+
+CACHEABLE = bytes([0 if address in VOLATILE else 1 for address in range(CONTROL_TABLE_SIZE)])
+WRITABLE = bytes([0 if address in READ_ONLY else 1 for address in range(CONTROL_TABLE_SIZE)])
+
+
+class MotorShadow(object):
+    """
+    Shadow of one motor's Control Table
+
+    table: staged value of the dirty bytes, known value of the others
+    known: last value read from or acknowledged by the motor
+    valid: 1 where known holds a value which can be answered from the shadow
+    dirty: 1 where table holds a staged value which is not written yet
+    """
+    __slots__ = ('table', 'known', 'valid', 'dirty')
+
+    def __init__(self):
+        self.table = bytearray(CONTROL_TABLE_SIZE)
+        self.known = bytearray(CONTROL_TABLE_SIZE)
+        self.valid = bytearray(CONTROL_TABLE_SIZE)
+        self.dirty = bytearray(CONTROL_TABLE_SIZE)
+
+    def cached(self, address, length):
+        """
+        True if every byte of the range can be answered from the shadow
+        """
+        end = address + length
+        return end <= CONTROL_TABLE_SIZE and all(self.valid[address:end]) and not any(self.dirty[address:end])
+
+    def store(self, address, data):
+        """
+        Values read from or acknowledged by the motor
+        """
+        end = address + len(data)
+        self.table[address:end] = data
+        self.known[address:end] = data
+        self.valid[address:end] = CACHEABLE[address:end]
+        self.dirty[address:end] = bytes(len(data))
+
+    def update(self, address, data):
+        """
+        Values read from the motor, the staged bytes stay dirty
+        """
+        dirty = self.dirty
+        for offset, value in enumerate(data):
+            idx = address + offset
+            self.known[idx] = value
+            self.valid[idx] = CACHEABLE[idx]
+            if not dirty[idx]:
+                self.table[idx] = value
+
+    def stage(self, address, data):
+        """
+        Mark the bytes which differ from the known value dirty, and the ones set back to it clean
+
+        :return: number of bytes which became dirty
+        """
+        table = self.table
+        known = self.known
+        valid = self.valid
+        dirty = self.dirty
+        changed = 0
+        for offset, value in enumerate(data):
+            idx = address + offset
+            table[idx] = value
+            if valid[idx] and known[idx] == value:
+                dirty[idx] = 0
+            elif not dirty[idx]:
+                dirty[idx] = 1
+                changed += 1
+        return changed
+
+    def dirty_ranges(self):
+        """
+        :return: [(address, length), ...] of the contiguous dirty ranges
+        """
+        ranges = []
+        dirty = self.dirty
+        address = 0
+        while address < CONTROL_TABLE_SIZE:
+            if dirty[address]:
+                end = address + 1
+                while end < CONTROL_TABLE_SIZE and dirty[end]:
+                    end += 1
+                ranges.append((address, end - address))
+                address = end
+            else:
+                address += 1
+        return ranges
+
+    def invalidate(self, start=0, end=CONTROL_TABLE_SIZE):
+        size = end - start
+        self.valid[start:end] = bytes(size)
+        self.dirty[start:end] = bytes(size)
+
+
+class ControlTableShadow(object):
+    """
+    Read / write through a Control Table shadow on top of a DXLPacketGenP1
+
+    :param dxl: DXLPacketGenP1 (or anything with its read_data / write_data / reboot / factory_reset)
+
+    Statistics
+        hits: reads answered from the shadow
+        misses: reads which went to the bus
+        writes: WRITE transactions sent by flush()
+        bytes_skipped: staged bytes which were equal to the shadow and not sent
+    """
+
+    def __init__(self, dxl):
+        self.dxl = dxl
+        self.motors = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.bytes_skipped = 0
+
+    def motor(self, motor_id):
+        shadow = self.motors.get(motor_id)
+        if shadow is None:
+            shadow = self.motors[motor_id] = MotorShadow()
+        return shadow
+
+    def read(self, motor_id, address, length):
+        """
+        Same as DXLPacketGenP1.read_data, answered from the shadow when possible
+
+        :return: StatusPacket (error 0 when answered from the shadow), or None on timeout
+        """
+        shadow = self.motor(motor_id)
+        if shadow.cached(address, length):
+            self.hits += 1
+            return StatusPacket(motor_id, 0, bytes(shadow.table[address:address + length]))
+
+        self.misses += 1
+        status = self.dxl.read_data(motor_id, address, length)
+        if status is not None and len(status.params) == length:
+            # Staged values are newer than what the motor holds
+            if any(shadow.dirty[address:address + length]):
+                shadow.update(address, status.params)
+            else:
+                shadow.store(address, status.params)
+        return status
+
+    def value(self, motor_id, address, length=1):
+        """
+        Little endian integer of a register, from the shadow or the bus
+
+        :return: int, or None on timeout
+        """
+        status = self.read(motor_id, address, length)
+        if status is None:
+            return None
+        return int.from_bytes(status.params, 'little')
+
+    def set(self, motor_id, address, data):
+        """
+        Stage a write, sent by the next flush()
+
+        :param data: Data bytes from address on, like paramData of write_data
+        :return: number of bytes which changed
+        """
+        if address + len(data) > CONTROL_TABLE_SIZE:
+            raise ValueError('Write of %d bytes at address %d is outside the Control Table' % (len(data), address))
+        changed = self.motor(motor_id).stage(address, data)
+        self.bytes_skipped += len(data) - changed
+        return changed
+
+    def flush(self, motor_id=None):
+        """
+        Write the dirty ranges of one motor, or of every motor
+
+        A range stays dirty if its WRITE was not acknowledged, the next flush() tries again.
+
+        :return: number of WRITE transactions sent
+        """
+        motor_ids = list(self.motors) if motor_id is None else [motor_id]
+        sent = 0
+        for motor_id in motor_ids:
+            shadow = self.motors.get(motor_id)
+            if shadow is None:
+                continue
+            # The motor is not reachable under its old address after a write to the ID or the Baud Rate
+            ranges = sorted(shadow.dirty_ranges(),
+                            key=lambda item: bool(READDRESSING.intersection(range(item[0], item[0] + item[1]))))
+            for address, length in ranges:
+                data = bytes(shadow.table[address:address + length])
+                status = self.dxl.write_data(motor_id, address, data)
+                sent += 1
+                if READDRESSING.intersection(range(address, address + length)):
+                    # The Status Packet may come from the new ID already, the shadow is dropped either way
+                    del self.motors[motor_id]
+                    break
+                if self.__acknowledged(shadow, status):
+                    shadow.store(address, data)
+        self.writes += sent
+        return sent
+
+    def write(self, motor_id, address, data):
+        """
+        Stage and flush right away, no transaction if the data equals the shadow
+
+        :return: True if the motor holds the data
+        """
+        self.set(motor_id, address, data)
+        self.flush(motor_id)
+        shadow = self.motors.get(motor_id)
+        return shadow is None or not any(shadow.dirty[address:address + len(data)])
+
+    @staticmethod
+    def __acknowledged(shadow, status):
+        if status is None:
+            # Status Return Level 0 or 1: a WRITE has no Status Packet, no reply is the normal case
+            return bool(shadow.valid[DXL_STATUS_RETURN_LEVEL]) and shadow.known[DXL_STATUS_RETURN_LEVEL] < 2
+        return not status.error & WRITE_REJECTED
+
+    def invalidate(self, motor_id=None):
+        """
+        Drop the shadow of one motor, or of every motor, ex) after the motors were power cycled
+        """
+        if motor_id is None:
+            self.motors.clear()
+        else:
+            self.motors.pop(motor_id, None)
+
+    def reboot(self, motor_id):
+        status = self.dxl.reboot(motor_id)
+        shadow = self.motors.get(motor_id)
+        if shadow is not None:
+            shadow.invalidate(EEPROM_SIZE)
+        return status
+
+    def factory_reset(self, motor_id):
+        status = self.dxl.factory_reset(motor_id)
+        self.invalidate(motor_id)
+        return status
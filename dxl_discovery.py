@@ -0,0 +1,156 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Bus discovery: which Dynamixels are on which adapter, at which baud rate
+
+    Protocol 1.0: every ID is pinged, with the reply timeout of DXLPacketGenP1 derived from the baud rate
+        (a missing ID costs the transmission time of ping and reply plus the reply margin, not 4 ms),
+        on an adapter set to low latency (latency timer 1 ms). Nothing else is on the wire during a scan:
+        the reply margin is one byte time plus the latency timer, without the USB frame of the driver default,
+        then Model Number and Firmware Version are read from the motors that answered.
+    Protocol 2.0: one broadcast ping per baud rate, every motor answers with its Model Number and
+        Firmware Version.
+
+    Adapters are scanned in parallel, one thread per port (pyserial releases the GIL while it waits);
+    the baud rates of one port are tried one after another.
+
+    EX)
+        inventory = discover(['/dev/ttyUSB0', '/dev/ttyUSB1'], BAUDRATES_P1.values(), stop_at_first=True)
+        for motor in inventory:
+            print(motor)
+
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Baud rates of the Baud Rate register (value: bps)
+BAUDRATES_P1 = {1: 1000000, 3: 500000, 4: 400000, 7: 250000, 9: 200000, 16: 115200, 34: 57600, 103: 19200,
+                207: 9600, 250: 2250000, 251: 2500000, 252: 3000000}
+BAUDRATES_P2 = {0: 9600, 1: 57600, 2: 115200, 3: 1000000, 4: 2000000, 5: 3000000, 6: 4000000, 7: 4500000}
+
+# Most used first, a scan which stops early finds them sooner
+COMMON_BAUDRATES = (1000000, 57600, 115200, 3000000, 2000000, 4000000, 4500000, 2250000, 2500000,
+                    500000, 400000, 250000, 200000, 19200, 9600)
+
+# Protocol 1.0: 0 ~ 253, Protocol 2.0: 0 ~ 252 (253 is reserved there and does not answer)
+ALL_IDS = range(0, 254)
+
+
+class DiscoveredMotor(object):
+    """
+    One Dynamixel found by a scan
+    """
+    __slots__ = ('port', 'protocol', 'baudrate', 'motor_id', 'model_number', 'firmware_version')
+
+    def __init__(self, port, protocol, baudrate, motor_id, model_number=None, firmware_version=None):
+        self.port = port
+        self.protocol = protocol
+        self.baudrate = baudrate
+        self.motor_id = motor_id
+        self.model_number = model_number
+        self.firmware_version = firmware_version
+
+    def __repr__(self):
+        return 'DiscoveredMotor(port=%r, protocol=%d, baudrate=%d, motor_id=%d, model_number=%s, firmware_version=%s)' \
+               % (self.port, self.protocol, self.baudrate, self.motor_id, self.model_number, self.firmware_version)
+
+    def as_dict(self):
+        return dict([(name, getattr(self, name)) for name in self.__slots__])
+
+
+def scan_p1(port, baudrate, ids=ALL_IDS, reply_margin=None, sysfs_root=None):
+    """
+    Ping every ID at one baud rate with Protocol 1.0
+
+    :param reply_margin: Seconds added to each reply timeout, one byte time plus the latency timer by default
+    :param sysfs_root: Root of sysfs for the latency timer of the adapter, see dxl_usb_serial
+    :return: [DiscoveredMotor, ...] in ID order
+    """
+    from dxl_addr_table_p1 import DXL_MODEL_NUMBER_L, DXL_FIRMWARE_VERSION
+    from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_LOW_LATENCY
+    from dxl_usb_serial import SYSFS_ROOT, get_latency_timer
+
+    found = []
+    sysfs_root = sysfs_root or SYSFS_ROOT
+    dxl = DXLPacketGenP1(port, baudrate, transport=TRANSPORT_LOW_LATENCY, latency_timer=1, low_latency_mode=True,
+                         sysfs_root=sysfs_root, reply_margin=reply_margin)
+    if reply_margin is None:
+        dxl.reply_margin = 10.0 / baudrate + (get_latency_timer(port, sysfs_root) or 0) * 0.001
+    try:
+        answered = [motor_id for motor_id in ids if dxl.ping(motor_id) is not None]
+        for motor_id in answered:
+            # Once more on a timeout, the motor is known to be there
+            for _ in range(2):
+                status = dxl.read_data(motor_id, DXL_MODEL_NUMBER_L, DXL_FIRMWARE_VERSION - DXL_MODEL_NUMBER_L + 1)
+                if status is not None:
+                    break
+            if status is not None and len(status.params) == 3:
+                model_number = status.params[0] | (status.params[1] << 8)
+                found.append(DiscoveredMotor(port, 1, baudrate, motor_id, model_number, status.params[2]))
+            else:
+                found.append(DiscoveredMotor(port, 1, baudrate, motor_id))
+    finally:
+        # The adapter is left as it was found
+        dxl.close()
+    return found
+
+
+def scan_p2(port, baudrate, ids=ALL_IDS, timeout=None):
+    """
+    Broadcast ping at one baud rate with Protocol 2.0
+
+    :return: [DiscoveredMotor, ...] in ID order
+    """
+    from dxl_packet_generator_p2 import DXLPacketGenP2
+
+    found = []
+    wanted = set(ids)
+    dxl = DXLPacketGenP2(port, baudrate)
+    try:
+        for motor_id, status in sorted(dxl.broadcast_ping(timeout).items()):
+            if motor_id not in wanted:
+                continue
+            if len(status.params) == 3:
+                model_number = status.params[0] | (status.params[1] << 8)
+                found.append(DiscoveredMotor(port, 2, baudrate, motor_id, model_number, status.params[2]))
+            else:
+                found.append(DiscoveredMotor(port, 2, baudrate, motor_id))
+    finally:
+        dxl.close()
+    return found
+
+
+def scan_port(port, baudrates=COMMON_BAUDRATES, protocol=1, ids=ALL_IDS, stop_at_first=False, **kwargs):
+    """
+    Scan one adapter at several baud rates
+
+    :param stop_at_first: Stop after the first baud rate with motors (all motors of a bus share one rate)
+    :return: [DiscoveredMotor, ...]
+    """
+    scan = scan_p1 if protocol == 1 else scan_p2
+    found = []
+    for baudrate in baudrates:
+        motors = scan(port, baudrate, ids, **kwargs)
+        found.extend(motors)
+        if motors and stop_at_first:
+            break
+    return found
+
+
+def discover(ports, baudrates=COMMON_BAUDRATES, protocol=1, ids=ALL_IDS, stop_at_first=False, **kwargs):
+    """
+    Scan several adapters in parallel
+
+    :param ports: Serial ports, ex) ['/dev/ttyUSB0', '/dev/ttyUSB1']
+    :param kwargs: reply_margin and sysfs_root for Protocol 1.0, timeout (broadcast ping) for Protocol 2.0
+    :return: [DiscoveredMotor, ...] sorted by port, baud rate and ID
+    """
+    ids = list(ids)
+    with ThreadPoolExecutor(max_workers=max(len(ports), 1), thread_name_prefix='dxl-discovery') as executor:
+        futures = [executor.submit(scan_port, port, baudrates, protocol, ids, stop_at_first, **kwargs)
+                   for port in ports]
+        found = [motor for future in futures for motor in future.result()]
+    return sorted(found, key=lambda motor: (motor.port, motor.baudrate, motor.motor_id))
@@ -0,0 +1,197 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Per instruction statistics of a Protocol 1.0 bus
+
+    DXLPacketGenP1 hands every finished transaction to its Instrumentation (when one is set):
+
+        encode      packet generation, from the start of the instruction method to the write
+        write       write of the instruction packet (including the buffer resets of TRANSPORT_SAFE)
+        wait        end of the write to the last Status Packet, or to the reply timeout
+        tx_bytes    instruction packet bytes, rx_bytes: Status Packet bytes received
+        timeouts    Status Packets which did not come
+        failures    transactions with a timeout, a broken packet or noise on the line
+        retries     tries repeated by the retry policy (see dxl_retry), each one is also a transaction
+        errors      Status Packets with each error bit set (Bit0 Input Voltage ... Bit6 Instruction)
+
+    Times go into fixed bucket histograms (dxl_stats.Histogram): one record costs a few integer updates and
+    creates no container or event, only the int and float objects of the updated counters (about 70 bytes,
+    freed right away, see the instrumentation suite of dxl_benchmark), so the instrumentation can stay enabled
+    in production. Callbacks get a TransactionEvent per transaction; the event is only built when a callback
+    is subscribed.
+
+    EX)
+        instrumentation = Instrumentation()
+        dxl = DXLPacketGenP1('/dev/ttyUSB0', 1000000, instrumentation=instrumentation)
+        instrumentation.subscribe(lambda event: event.timeouts and print(event))
+        ...
+        print(instrumentation.snapshot()['READ']['wait']['p99'])
+
+
+"""
+
+from dxl_addr_table_p1 import *
+from dxl_stats import Histogram, DEFAULT_EDGES
+
+INSTRUCTION_NAMES = {
+    DXL_PING: 'PING',
+    DXL_READ_DATA: 'READ',
+    DXL_WRITE_DATA: 'WRITE',
+    DXL_REG_WRITE: 'REG_WRITE',
+    DXL_ACTION: 'ACTION',
+    DXL_RESET: 'RESET',
+    DXL_REBOOT: 'REBOOT',
+    DXL_SYNC_WRITE: 'SYNC_WRITE',
+    DXL_BULK_READ: 'BULK_READ',
+}
+
+
+class TransactionEvent(object):
+    """
+    One finished transaction, as passed to the callbacks
+
+    motor_id: ID of the instruction packet (DXL_BROADCAST_ID for SYNC_WRITE and BULK_READ)
+    error: OR of the error bytes of the received Status Packets
+    """
+    __slots__ = ('instruction', 'name', 'motor_id', 'encode', 'write', 'wait', 'tx_bytes', 'rx_bytes',
+                 'timeouts', 'ok', 'error')
+
+    def __init__(self, instruction, motor_id, encode, write, wait, tx_bytes, rx_bytes, timeouts, ok, error):
+        self.instruction = instruction
+        self.name = INSTRUCTION_NAMES.get(instruction, str(instruction))
+        self.motor_id = motor_id
+        self.encode = encode
+        self.write = write
+        self.wait = wait
+        self.tx_bytes = tx_bytes
+        self.rx_bytes = rx_bytes
+        self.timeouts = timeouts
+        self.ok = ok
+        self.error = error
+
+    def __repr__(self):
+        return 'TransactionEvent(%s, motor_id=%d, encode=%.1fus, write=%.1fus, wait=%.1fus, tx=%d, rx=%d, ' \
+               'timeouts=%d, ok=%s, error=0x%02X)' \
+               % (self.name, self.motor_id, self.encode * 1e6, self.write * 1e6, self.wait * 1e6, self.tx_bytes,
+                  self.rx_bytes, self.timeouts, self.ok, self.error)
+
+
+class InstructionStats(object):
+    """
+    Histograms and counters of one instruction
+    """
+
+    def __init__(self, edges=DEFAULT_EDGES):
+        self.encode = Histogram(edges)
+        self.write = Histogram(edges)
+        self.wait = Histogram(edges)
+        self.reset()
+
+    def reset(self):
+        self.encode.reset()
+        self.write.reset()
+        self.wait.reset()
+        self.count = 0
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.retries = 0
+        self.errors = [0] * len(DXL_ERROR_NAMES)
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'encode': self.encode.snapshot(),
+            'write': self.write.snapshot(),
+            'wait': self.wait.snapshot(),
+            'tx_bytes': self.tx_bytes,
+            'rx_bytes': self.rx_bytes,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'retries': self.retries,
+            'errors': dict(zip(DXL_ERROR_NAMES, self.errors)),
+        }
+
+
+class Instrumentation(object):
+    """
+    Statistics per instruction, keyed by instruction code
+
+    :param edges: Bucket edges of the time histograms in seconds, see dxl_stats
+    """
+
+    def __init__(self, edges=DEFAULT_EDGES):
+        self.edges = tuple(edges)
+        self.instructions = {}
+        self.callbacks = []
+
+    def subscribe(self, callback):
+        """
+        Call callback(TransactionEvent) after every transaction; it runs on the bus thread, inside the port lock
+        """
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.remove(callback)
+
+    def stats(self, instruction):
+        stats = self.instructions.get(instruction)
+        if stats is None:
+            stats = self.instructions[instruction] = InstructionStats(self.edges)
+        return stats
+
+    def record(self, instruction, motor_id, encode, write, wait, tx_bytes, replies, ok):
+        """
+        Record one transaction
+
+        :param replies: Expected Status Packets, None for each one which did not come
+        :param ok: False after a timeout, a broken packet or noise on the line
+        """
+        stats = self.instructions.get(instruction)
+        if stats is None:
+            stats = self.stats(instruction)
+        stats.count += 1
+        stats.encode.record(encode)
+        stats.write.record(write)
+        stats.wait.record(wait)
+        stats.tx_bytes += tx_bytes
+        rx_bytes = 0
+        timeouts = 0
+        error = 0
+        for status in replies:
+            if status is None:
+                timeouts += 1
+                continue
+            rx_bytes += len(status.params) + 6
+            if status.error:
+                error |= status.error
+                errors = stats.errors
+                for bit in range(len(errors)):
+                    if status.error >> bit & 1:
+                        errors[bit] += 1
+        stats.rx_bytes += rx_bytes
+        stats.timeouts += timeouts
+        if not ok:
+            stats.failures += 1
+        if self.callbacks:
+            event = TransactionEvent(instruction, motor_id, encode, write, wait, tx_bytes, rx_bytes, timeouts, ok,
+                                     error)
+            for callback in self.callbacks:
+                callback(event)
+
+    def record_retry(self, instruction):
+        self.stats(instruction).retries += 1
+
+    def snapshot(self):
+        """
+        Plain dictionary {instruction name: statistics} of the instructions seen so far, for logging or JSON
+        """
+        return dict([(INSTRUCTION_NAMES.get(instruction, str(instruction)), stats.snapshot())
+                     for instruction, stats in sorted(self.instructions.items())])
+
+    def reset(self):
+        for stats in self.instructions.values():
+            stats.reset()
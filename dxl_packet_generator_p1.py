@@ -5,16 +5,72 @@ __email__ = "jinparksj@gmail.com"
 
 Packet generator for Protocol 1.0
 
+    Transport profiles
+        - TRANSPORT_SAFE (default): before every packet the output and input buffers are cleared and the
+          port is drained, then the Status Packet is read through pyserial. Four extra port operations per
+          transaction, but nothing left over from an earlier transaction can get in the way.
+        - TRANSPORT_LOW_LATENCY: the packet goes out with one write() on the file descriptor and the reply is
+          collected with select() / read() until the expected length is there, or until the transmission time
+          of packet and reply plus the timeout has passed. The buffers are cleared only after an error.
+          With latency_timer (ms) and low_latency_mode the USB-serial adapter is set up too, see dxl_usb_serial.
+
+        dxl = DXLPacketGenP1('/dev/ttyUSB0', 1000000, transport=TRANSPORT_LOW_LATENCY, latency_timer=1,
+                             low_latency_mode=True)
+        print(dxl.transport_statistics())
+
+    Reply timeouts
+        Each transaction waits only as long as its Status Packet can take:
+            instruction packet on the wire + Return Delay Time of the motor + Status Packet on the wire + reply_margin
+        (10 bits per byte at the port's baud rate), plus what is left of a preceding packet without reply
+        (SYNC_WRITE, broadcast) still going out. reply_margin covers the USB-serial adapter:
+        by default one USB frame (1 ms), plus the latency timer of the adapter when it has one (FTDI). Adapters
+        without one (CP210x, CH340) still deliver the reply with the next USB frame at the earliest. A host with
+        scheduling stalls (VM, loaded machine) passes a larger reply_margin.
+        After a timeout the input buffer is cleared before the next packet. A reply which still comes later is
+        dropped by the parser unless it has the ID and length of the expected one.
+        No read at all when no Status Packet will come: broadcast instructions, and instructions the motor's
+        Status Return Level does not answer (0: PING only, 1: PING and READ).
+        Return Delay Time and Status Return Level are tracked from the writes made through the driver, and
+        can be set with configure_motor() or read back from the motor with refresh_reply_settings().
+
+    Instrumentation
+        With instrumentation=Instrumentation() every transaction is recorded per instruction: encode, write
+        and reply wait times, bytes on the wire, timeouts and the error bits of the Status Packets,
+        see dxl_instrumentation.
+
+    Retries
+        With retry_policy=RetryPolicy(...) a lost transaction (timeout, broken packet, Checksum Error of the
+        motor) of an idempotent instruction is tried again within its retry budget and deadline; Bulk Read
+        only reads the motors again whose Status Packets were lost. See dxl_retry.
+
+    Capture
+        With capture=Capture(path) every instruction packet written and every chunk read from the port goes
+        into a timestamped binary log, which dxl_capture.ReplayBus can play back to a driver. See dxl_capture.
+
 
 """
 
+import os
 import time
+import select
+import termios
 import threading
 import serial
 from dxl_addr_table_p1 import *
-import math
+from dxl_status_parser_p1 import StatusParser
+from dxl_control_table_p1 import WRITE_REJECTED
+from dxl_stats import Histogram
+from dxl_usb_serial import SYSFS_ROOT, get_latency_timer, set_latency_timer, set_low_latency_mode
+
+TRANSPORT_SAFE = 'safe'
+TRANSPORT_LOW_LATENCY = 'low_latency'
+
+# Factory defaults: Return Delay Time 250 (2 us per unit), Status Return Level 2 (all instructions answered)
+DEFAULT_RETURN_DELAY = 250 * 2e-6
+DEFAULT_STATUS_RETURN_LEVEL = 2
+USB_FRAME = 0.001
+REPLY_MARGIN = USB_FRAME
 
-lock = threading.lock()
 
 def checksum_generator(motor_id, length, instruction, param_n, byte_size):
     """
@@ -43,9 +99,168 @@ def packet_generator(motor_id, length, instruction, param_n, byte_size, checksum
     raw_packet = bytearray(packet)
     return raw_packet
 
+def bulk_read_params(read_address, address_length, motor_list):
+    """
+    Bulk Read parameters: (Data Length, ID, Start Address) for each Dynamixel
+
+    :param read_address: Default start address
+    :param address_length: Default data length
+    :param motor_list: Motor IDs, or (motor_id, address, length) tuples
+    :return: (flat parameter list, [(motor_id, length), ...] in reply order)
+    """
+    param_data = []
+    expected = []
+    for motor in motor_list:
+        if isinstance(motor, int):
+            motor_id, address, length = motor, read_address, address_length
+        else:
+            motor_id, address, length = motor
+        param_data.extend((length, motor_id, address))
+        expected.append((motor_id, length))
+    return param_data, expected
+
+
+def sync_write_capacity(length):
+    """
+    Number of Dynamixels one Sync Write packet of DXL_MAX_PACKET_SIZE carries, with length data bytes each
+
+    8 = Header (2) + ID + Length + Instruction + Control Address + Data Length + Checksum
+    """
+    return (DXL_MAX_PACKET_SIZE - 8) // (length + 1)
+
+
+def split_sync_write(templates, control_address, total_data):
+    """
+    Sync Write packets of total_data, split when the Dynamixels do not fit in one packet of DXL_MAX_PACKET_SIZE
+
+    :param templates: PacketTemplateCache
+    :param total_data: ((motor_id_1, data), (motor_id_2, data)), see DXLPacketGenP1.sync_write
+    :return: (packets back to back, number of packets); one packet is the template buffer, reused by the
+             next packet of the same size
+    """
+    # Parameters: Data Length (L), then ID and L data bytes per Dynamixel
+    len_param_data = len(total_data[0]) - 1  # total_data[0][1:] means for param_data length per Dynamixel
+    per_packet = sync_write_capacity(len_param_data)
+    if not per_packet:
+        raise ValueError('Sync Write of %d bytes per Dynamixel does not fit in one packet' % len_param_data)
+    packets = None
+    starts = range(0, len(total_data), per_packet)
+    for idx in starts:
+        param_data = [len_param_data]
+        param_data.extend([int(round(param)) for motors in total_data[idx:idx + per_packet] for param in motors])
+        # Length = 4 + N * (L + 1) and the checksum are handled by the template
+        packet = templates.packet(DXL_BROADCAST_ID, DXL_SYNC_WRITE, control_address, param_data)
+        if per_packet < len(total_data):
+            packets = packet[:] if packets is None else packets + packet
+    return (packet if packets is None else packets), len(starts)
+
+class PacketTemplateCache(object):
+    """
+    Preallocated instruction packets, keyed by (motor_id, instruction, address, data length).
+
+    The header, ID, Length, Instruction and start address of a packet never change between two calls
+    with the same key, so they are written once into a bytearray together with their partial checksum sum.
+    Each call only patches the data bytes and the checksum in place and hands back the same buffer.
+
+        Header 1    Header 2    ID  Length  Instruction     Param1(Address)     Param2 ... ParamN   Checksum
+        0xFF        0xFF        ID  N + 3   Instruction     Address             Data   ... Data     CHKSUM
+
+    Instructions without parameters (Ping, Action, Factory Reset, Reboot) use address None:
+        0xFF        0xFF        ID  0x02    Instruction     CHKSUM
+
+    IMPORTANT: The returned bytearray is reused by the next call with the same key.
+    Write it out before encoding the next packet, and copy it (bytes(packet)) if it has to be kept.
+
+    The cache is bounded: once max_size templates are stored, the oldest one is evicted (first in, first out).
+    A hit costs one dict lookup; the working set of a control loop (motors x instructions) is far below max_size.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.misses = 0
+        self.evictions = 0
+        self._templates = {}
+
+    def __len__(self):
+        return len(self._templates)
+
+    def clear(self):
+        self._templates.clear()
+
+    def packet(self, motor_id, instruction, address=None, data=()):
+        """
+        Return the instruction packet for the given fields, reusing a cached template when possible.
+
+        :param motor_id: Dynamixel ID or DXL_BROADCAST_ID
+        :param instruction: DXL_PING, DXL_READ_DATA, DXL_WRITE_DATA, ...
+        :param address: Param1 (start address of the Control Table), None for instructions without parameters
+        :param data: Param2 ... ParamN, sequence of integers in 0 ~ 255
+        :return: bytearray, owned by the cache
+        """
+        n_data = len(data)
+        template = self._templates.get((motor_id, instruction, address, n_data))
+        if template is None:
+            template = self.__insert(motor_id, instruction, address, n_data)
+
+        buf, inv_base_sum = template
+        # Checksum = ~(base + data) & 0xFF = (~base - data) & 0xFF, only the data sum is added per call
+        if n_data == 1:
+            value = data[0]
+            buf[6] = value
+            buf[7] = (inv_base_sum - value) & 0xFF
+        elif n_data == 2:
+            low, high = data
+            buf[6] = low
+            buf[7] = high
+            buf[8] = (inv_base_sum - low - high) & 0xFF
+        elif n_data:
+            buf[6:6 + n_data] = data
+            buf[-1] = (inv_base_sum - sum(data)) & 0xFF
+        return buf
+
+    def __insert(self, motor_id, instruction, address, n_data):
+        templates = self._templates
+        if len(templates) >= self.max_size:
+            del templates[next(iter(templates))]
+            self.evictions += 1
+        self.misses += 1
+        template = self.__build(motor_id, instruction, address, n_data)
+        templates[(motor_id, instruction, address, n_data)] = template
+        return template
+
+    @staticmethod
+    def __build(motor_id, instruction, address, n_data):
+        if address is None:
+            length = 2
+            buf = bytearray((0xFF, 0xFF, motor_id, length, instruction, 0))
+            base_sum = motor_id + length + instruction
+        else:
+            length = n_data + 3
+            buf = bytearray(7 + n_data)
+            buf[0:6] = (0xFF, 0xFF, motor_id, length, instruction, address)
+            base_sum = motor_id + length + instruction + address
+        # The checksum byte is final for packets without data, and overwritten on every call otherwise
+        buf[-1] = 255 - (base_sum & 0xFF)
+        return buf, 255 - base_sum
+
 class DXLPacketGenP1(object):
-    def __init__(self, port, baudrate):
+    def __init__(self, port, baudrate, template_cache_size=256, transport=TRANSPORT_SAFE, latency_timer=None,
+                 low_latency_mode=False, sysfs_root=SYSFS_ROOT, reply_margin=None, instrumentation=None,
+                 retry_policy=None, capture=None):
         TIMEOUT = 0.004
+        if transport not in (TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY):
+            raise ValueError('transport must be TRANSPORT_SAFE or TRANSPORT_LOW_LATENCY')
+        self.transport = transport
+
+        #One transaction at a time on this port: packet generation, write and read of the status
+        self.lock = threading.Lock()
+
+        #Preallocated instruction packets, see PacketTemplateCache
+        self.templates = PacketTemplateCache(template_cache_size)
+        #Receive buffer and Status Packet parser, see StatusParser
+        self.parser = StatusParser()
+        #Preallocated NumPy Sync Write packets, see sync_write_array
+        self.sync_write_encoders = {}
 
         #Setup serial node
         #Protocol: 8 bit, 1 stop bit, none parity, asynchronous serial communication
@@ -57,35 +272,398 @@ class DXLPacketGenP1(object):
             stopbits=serial.STOPBITS_ONE,
             timeout=TIMEOUT
         )
+        self.fd = self.ser.fileno()
+
+        #USB-serial adapter settings, see dxl_usb_serial; the latency timer is restored by close()
+        self.port = port
+        self.sysfs_root = sysfs_root
+        self.previous_latency_timer = None
+        if latency_timer is not None:
+            self.previous_latency_timer = set_latency_timer(port, latency_timer, sysfs_root)
+        self.low_latency_mode = set_low_latency_mode(self.ser) if low_latency_mode else False
+
+        #Reply timeouts, see reply_timeout
+        if reply_margin is None:
+            reply_margin = REPLY_MARGIN + (get_latency_timer(port, sysfs_root) or 0) * 0.001
+        self.reply_margin = reply_margin
+        self.serial_timeout = TIMEOUT
+        self.return_delay = {}
+        self.status_return_level = {}
+        self.default_return_delay = DEFAULT_RETURN_DELAY
+        self.default_status_return_level = DEFAULT_STATUS_RETURN_LEVEL
+
+        #Transport statistics, see transport_statistics
+        self.transaction_time = Histogram()
+        self.transaction_start = 0.0
+        self.transaction_bytes = 0
+        self.transaction_timeout = 0.0
+        self.backlog = 0.0
+        self.bus_free_at = 0.0
+        self.resync = True
+        self.parser_errors = 0
+        self.reset_transport_statistics()
+
+        #Per instruction statistics, see dxl_instrumentation (None: off)
+        self.instrumentation = instrumentation
+        self.transaction_instruction = None
+        self.transaction_id = None
+        self.encode_time = 0.0
+        self.write_end = 0.0
+
+        #Retries of lost transactions, see dxl_retry (None: every transaction is tried once)
+        self.retry_policy = retry_policy
+
+        #Log of the bytes written and read, see dxl_capture (None: off)
+        self.capture = capture
 
     def __del__(self):
-        self.close()
+        # Also runs for a driver whose __init__ failed, and at interpreter exit
+        try:
+            self.close()
+        except Exception:
+            pass
 
 
     def close(self):
         """
-        Close the serial port once done
+        Close the serial port once done, and give the adapter back its previous latency timer
+        """
+        ser = getattr(self, 'ser', None)
+        if ser and ser.is_open:
+            try:
+                ser.reset_input_buffer() # Flush input buffer, discarding all its contents.
+                ser.reset_output_buffer() # Clear output buffer, aborting the current output
+                # and discarding all that is in the buffer.
+            except (OSError, termios.error, serial.SerialException):
+                # The adapter is gone (ex) unplugged), only the file descriptor is left to close
+                pass
+            ser.close()
+        previous = getattr(self, 'previous_latency_timer', None)
+        if previous is not None:
+            self.previous_latency_timer = None
+            set_latency_timer(self.port, previous, self.sysfs_root)
+
+    def __transaction(self, motor_id, instruction, address=None, data=(), param_length=0):
+        """
+        Packet generation, write and read of the Status Packet, repeated as the retry policy allows
+
+        The port lock is released between two tries. The duration of a retry includes the backlog of
+        packets without reply still going out.
+
+        :return: StatusPacket, or None on timeout or when the motor does not answer this instruction
+        """
+        policy = self.retry_policy
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            with self.lock:
+                encode_start = time.perf_counter()
+                packet = self.templates.packet(motor_id, instruction, address, data)
+                reply = self.reply_expected(motor_id, instruction)
+                self.__write_packet(packet, instruction, encode_start, reply)
+                status = self.__read_packet(motor_id, param_length) if reply else None
+            if policy is None or not reply:
+                return status
+            now = time.perf_counter()
+            duration = self.__wait_before(now) + self.reply_timeout(motor_id, param_length, len(packet))
+            if not policy.retry(instruction, status, attempt, now - start, duration):
+                policy.finished(instruction, not policy.retryable(status), attempt)
+                return status
+            attempt += 1
+            if self.instrumentation is not None:
+                self.instrumentation.record_retry(instruction)
+
+    def __wait_before(self, now):
+        """
+        Time before the next packet can go out: the backlog of packets without reply
+        """
+        return max(0.0, self.bus_free_at - now)
+
+    def __write_packet(self, packet, instruction, encode_start, reply=True):
+        """
+        Start a transaction
+
+        TRANSPORT_SAFE: output and input buffers are cleared and the port is drained before every packet.
+        TRANSPORT_LOW_LATENCY: the packet is written with one write(); the buffers are only cleared
+        after an error of the previous transaction (timeout, broken or unexpected packet).
+
+        :param instruction: Instruction of the packet, for the instrumentation
+        :param encode_start: perf_counter() before the packet generation
+        :param reply: False for a packet without Status Packet, the transaction ends with the write
+        """
+        now = time.perf_counter()
+        self.transaction_instruction = instruction
+        self.transaction_id = packet[2]
+        self.encode_time = now - encode_start
+        self.transaction_start = now
+        self.transaction_bytes = len(packet)
+        # A packet without reply may still be on the wire, this packet goes out after it
+        self.backlog = max(0.0, self.bus_free_at - now)
+        if not reply:
+            self.bus_free_at = now + self.backlog + len(packet) * 10.0 / self.ser.baudrate
+        self.transactions += 1
+        if self.capture is not None:
+            self.capture.tx(packet)
+        if self.transport == TRANSPORT_LOW_LATENCY:
+            if self.resync:
+                self.ser.reset_input_buffer()
+                self.parser.reset()
+                self.resets += 1
+                self.syscalls += 1
+            self.__write_fd(packet)
+        else:
+            self.ser.reset_output_buffer()
+            self.ser.reset_input_buffer()
+            self.parser.reset() # Bytes left from a previous transaction are not an answer to this packet
+            self.ser.flush() # Flush of file like objects. In this case, wait until all data is written.
+            self.ser.write(packet)
+            self.syscalls += 4
+        self.resync = False
+        self.write_end = time.perf_counter()
+        if not reply:
+            self.__end_transaction(True, ())
+
+    def __write_fd(self, packet):
+        # pyserial opens the port non-blocking: a long packet may need more than one write()
+        fd = self.fd
+        view = memoryview(packet)
+        while view:
+            self.syscalls += 1
+            try:
+                written = os.write(fd, view)
+            except BlockingIOError:
+                written = 0
+            if written < len(view):
+                self.syscalls += 1
+                select.select([], [fd], [], self.serial_timeout)
+            view = view[written:]
+
+    def __end_transaction(self, ok, replies):
+        """
+        :param replies: Expected Status Packets, None for each one which did not come
+        """
+        end = time.perf_counter()
+        self.transaction_time.record(end - self.transaction_start)
+        if not ok:
+            self.errors += 1
+            self.resync = True
+        if self.instrumentation is not None:
+            self.instrumentation.record(self.transaction_instruction, self.transaction_id, self.encode_time,
+                                        self.write_end - self.transaction_start, end - self.write_end,
+                                        self.transaction_bytes, replies, ok)
+
+    def __read_packet(self, motor_id, param_length=0):
+        """
+        Read the Status Packet of motor_id
+
+        The whole expected packet (6 + param_length bytes) is requested with one read. If noise or a stale
+        packet is in the way, only the bytes still missing for the pending packet are read afterwards.
+
+        :param motor_id: ID of the Dynamixel which should answer
+        :param param_length: Number of expected parameters (data bytes) in the Status Packet
+        :return: StatusPacket, or None on timeout
+        """
+        timeout = self.transaction_timeout = self.reply_timeout(motor_id, param_length) + self.backlog
+        if self.transport == TRANSPORT_LOW_LATENCY:
+            status = self.__read_fd(motor_id, param_length + 6, timeout)
+        else:
+            status = self.__read_serial(motor_id, param_length + 6, timeout)
+        self.__end_transaction(status is not None and not self.__parser_errors(), (status, ))
+        return status
+
+    def __read_serial(self, motor_id, size, timeout):
+        parser = self.parser
+        deadline = time.monotonic() + timeout
+        self.__set_serial_timeout(timeout)
+        while True:
+            received = self.ser.read(size)
+            self.syscalls += 1
+            if not received:
+                return None
+            if self.capture is not None:
+                self.capture.rx(received)
+            parser.feed(received)
+            status = parser.next_packet()
+            while status is not None:
+                if status.motor_id == motor_id:
+                    return status
+                status = parser.next_packet()
+            if time.monotonic() > deadline:
+                return None
+            size = parser.needed
+
+    def __read_fd(self, motor_id, size, timeout):
+        """
+        Wait for the Status Packet with select() and read what is there with read(), until the reply timeout
+        """
+        parser = self.parser
+        fd = self.fd
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.syscalls += 2
+            if not select.select([fd], [], [], remaining)[0]:
+                return None
+            received = os.read(fd, max(size, parser.needed))
+            if self.capture is not None:
+                self.capture.rx(received)
+            parser.feed(received)
+            status = parser.next_packet()
+            while status is not None:
+                if status.motor_id == motor_id:
+                    return status
+                # Late reply of a previous transaction
+                self.resync = True
+                status = parser.next_packet()
+            size = parser.needed
+
+    def __split_bulk(self, expected, result, order):
         """
-        if self.ser:
-            self.ser.reset_input_buffer() # Flush input buffer, discarding all its contents.
-            self.ser.reset_output_buffer() # Clear output buffer, aborting the current output
-            # and discarding all that is in the buffer.
-            self.ser.close()
+        Assign the parsed Status Packets to the expected motors, in reply order
 
-    def __write_packet(self, packet):
-        self.ser.reset_output_buffer()
-        self.ser.reset_input_buffer()
-        self.ser.flush() # Flush of file like objects. In this case, wait until all data is written.
-        self.ser.write(packet)
+        A packet of an expected ID with another number of parameters (a late reply of an earlier read) is
+        not the answer and is skipped.
+
+        :return: index of the next expected motor
+        """
+        status = self.parser.next_packet()
+        while status is not None:
+            for idx in range(order, len(expected)):
+                if expected[idx][0] == status.motor_id and len(status.params) == expected[idx][1]:
+                    result[status.motor_id] = status
+                    order = idx + 1
+                    break
+            status = self.parser.next_packet()
+        return order
+
+    def __read_bulk_fd(self, expected, total_length, timeout):
+        parser = self.parser
+        fd = self.fd
+        result = dict.fromkeys([motor_id for motor_id, length in expected])
+        order = 0
+        deadline = time.monotonic() + timeout
+        while order < len(expected):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.syscalls += 2
+            if not select.select([fd], [], [], remaining)[0]:
+                break
+            received = os.read(fd, total_length)
+            if self.capture is not None:
+                self.capture.rx(received)
+            parser.feed(received)
+            order = self.__split_bulk(expected, result, order)
+        return result
+
+    def __parser_errors(self):
+        errors = self.parser.dropped_bytes + self.parser.checksum_errors
+        if errors != self.parser_errors:
+            self.parser_errors = errors
+            return True
+        return False
+
+    def configure_motor(self, motor_id, return_delay_time=None, status_return_level=None):
+        """
+        Tell the driver the reply settings of a motor (raw Control Table values), DXL_BROADCAST_ID for all motors
+        """
+        if return_delay_time is not None:
+            if motor_id == DXL_BROADCAST_ID:
+                self.default_return_delay = return_delay_time * 2e-6
+                self.return_delay.clear()
+            else:
+                self.return_delay[motor_id] = return_delay_time * 2e-6
+        if status_return_level is not None:
+            if motor_id == DXL_BROADCAST_ID:
+                self.default_status_return_level = status_return_level
+                self.status_return_level.clear()
+            else:
+                self.status_return_level[motor_id] = status_return_level
+
+    def refresh_reply_settings(self, motor_id):
+        """
+        Read Return Delay Time ... Status Return Level of a motor and keep them for its reply timeouts
 
-    def __read_packet(self):
-        status_packet = []
-        status_packet.extend(self.ser.read(4)) # Number of bytes to read: 4, Read size bytes from the serial port.
-        if status_packet:
-            status_packet.extend(self.ser.read(status_packet[3]))
-            status_packet = [idx for idx in status_packet]
+        :return: True if the motor answered
+        """
+        # Until it is known, assume the slowest factory setting
+        self.return_delay[motor_id] = max(self.return_delay.get(motor_id, 0.0), DEFAULT_RETURN_DELAY)
+        self.status_return_level[motor_id] = max(self.status_return_level.get(motor_id, 1), 1)
+        length = DXL_STATUS_RETURN_LEVEL - DXL_RETURN_DELAY_TIME + 1
+        status = self.read_data(motor_id, DXL_RETURN_DELAY_TIME, length)
+        if status is None or len(status.params) != length:
+            return False
+        self.configure_motor(motor_id, status.params[0], status.params[-1])
+        return True
+
+    def __track_settings(self, motor_id, address, data):
+        # A write covering Return Delay Time or Status Return Level changes the replies of the motor
+        end = address + len(data)
+        if address <= DXL_RETURN_DELAY_TIME < end:
+            self.configure_motor(motor_id, return_delay_time=data[DXL_RETURN_DELAY_TIME - address])
+        if address <= DXL_STATUS_RETURN_LEVEL < end:
+            self.configure_motor(motor_id, status_return_level=data[DXL_STATUS_RETURN_LEVEL - address])
+
+    def reply_expected(self, motor_id, instruction):
+        """
+        True if motor_id answers the instruction with a Status Packet
+        """
+        if motor_id == DXL_BROADCAST_ID:
+            return False
+        if instruction == DXL_PING:
+            return True
+        level = self.status_return_level.get(motor_id, self.default_status_return_level)
+        if instruction in (DXL_READ_DATA, DXL_BULK_READ):
+            return level >= 1
+        return level >= 2
+
+    def reply_timeout(self, motor_id, param_length=0, packet_length=None):
+        """
+        Longest time from the start of the write to the end of the Status Packet of motor_id
+
+        :param param_length: Number of parameters in the Status Packet
+        :param packet_length: Length of the instruction packet, the last one written by default
+        """
+        if packet_length is None:
+            packet_length = self.transaction_bytes
+        byte_time = 10.0 / self.ser.baudrate
+        return (self.reply_margin + self.return_delay.get(motor_id, self.default_return_delay)
+                + (packet_length + param_length + 6) * byte_time)
+
+    def __set_serial_timeout(self, timeout):
+        # Changing the pyserial timeout reconfigures the port, it is only done when the value changes
+        timeout = round(timeout, 4)
+        if timeout != self.serial_timeout:
+            self.ser.timeout = self.serial_timeout = timeout
+            self.syscalls += 1
+
+    def transport_statistics(self):
+        """
+        Per transaction cost of the transport profile
 
-        return status_packet
+        syscalls counts the serial port operations issued by the driver (reset / drain ioctls, write, select
+        and read); a pyserial read() in TRANSPORT_SAFE may loop over more than one select() and read() inside.
+        transaction_time is the time from the start of the write to the Status Packet (or the end of the write).
+        """
+        transactions = self.transactions
+        return {
+            'transport': self.transport,
+            'transactions': transactions,
+            'syscalls': self.syscalls,
+            'syscalls_per_transaction': float(self.syscalls) / transactions if transactions else None,
+            'resets': self.resets,
+            'errors': self.errors,
+            'transaction_time': self.transaction_time.snapshot(),
+        }
+
+    def reset_transport_statistics(self):
+        self.transactions = 0
+        self.syscalls = 0
+        self.resets = 0
+        self.errors = 0
+        self.transaction_time.reset()
 
     def ping(self, motor_id):
         """
@@ -103,16 +681,10 @@ class DXLPacketGenP1(object):
         """
         # 1. Instrunction setting
         instruction = DXL_PING
-        # 2. Length
-        length = 2
-        # 3. Checksum Generation
-        checksum = checksum_generator(motor_id, length, instruction, 0, (0, ))
-        # 4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, 0, 0, checksum)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status
-        status = self.__read_packet()
+        # 2. Packet Generation, Length = 2 and the checksum are precomputed in the template
+        # 3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction)
 
         return status
 
@@ -135,16 +707,10 @@ class DXLPacketGenP1(object):
         """
         #1. Instrunction setting
         instruction = DXL_READ_DATA
-        #2. Length
-        length = 4 #Number of parameters + 2
-        #3. Checksum Generation
-        checksum = checksum_generator(motor_id, length, instruction, paramN, (paramLen, ))
-        #4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, paramN, (paramLen, ), checksum)
-        #5. Write packet
-        self.__write_packet(packet)
-        #6. Read status
-        status = self.__read_packet()
+        #2. Packet Generation, Length = 4 (Number of parameters + 2), only the checksum is patched
+        #3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction, paramN, (paramLen, ), param_length=paramLen)
 
         return status
 
@@ -167,17 +733,17 @@ class DXLPacketGenP1(object):
 
         # 1. Instrunction setting
         instruction = DXL_WRITE_DATA
-        # 2. Length
-        length = len(paramData) + 3  # Number of parameters + 2
-        # 3. Checksum Generation, bit_length should be integer and (bit_length, ) is made for being iterable
-        checksum = checksum_generator(motor_id, length, instruction, paramN, paramData)
-        # 4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, paramN, paramData, checksum)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status
-        status = self.__read_packet()
-
+        # 2. Packet Generation, Length = len(paramData) + 3, data bytes and checksum are patched in place
+        # 3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction, paramN, paramData)
+
+        # Applied unless the motor reported an Instruction, Checksum or Range error. A write which lowers the
+        # Status Return Level is not answered anymore
+        reply = self.reply_expected(motor_id, instruction)
+        if not reply or (status is None and paramN <= DXL_STATUS_RETURN_LEVEL < paramN + len(paramData)) or \
+                (status is not None and not status.error & WRITE_REJECTED):
+            self.__track_settings(motor_id, paramN, paramData)
         return status
 
     def reg_write(self, motor_id, paramN, paramData):
@@ -198,16 +764,10 @@ class DXLPacketGenP1(object):
         """
         # 1. Instrunction setting
         instruction = DXL_REG_WRITE
-        # 2. Length
-        length = len(paramData) + 3  # Number of parameters + 3
-        # 3. Checksum Generation, bit_length should be integer and (bit_length, ) is made for being iterable
-        checksum = checksum_generator(motor_id, length, instruction, paramN, paramData)
-        # 4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, paramN, paramData, checksum)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status
-        status = self.__read_packet()
+        # 2. Packet Generation, Length = len(paramData) + 3, data bytes and checksum are patched in place
+        # 3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction, paramN, paramData)
 
         return status
 
@@ -226,16 +786,10 @@ class DXLPacketGenP1(object):
         """
         # 1. Instrunction setting
         instruction = DXL_ACTION
-        # 2. Length
-        length = 2
-        # 3. Checksum Generation
-        checksum = checksum_generator(motor_id, length, instruction, 0, (0, ))
-        # 4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, 0, 0, checksum)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status
-        status = self.__read_packet()
+        # 2. Packet Generation, Length = 2 and the checksum are precomputed in the template
+        # 3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction)
 
         return status
 
@@ -254,17 +808,14 @@ class DXLPacketGenP1(object):
 
         # 1. Instrunction setting
         instruction = DXL_RESET
-        # 2. Length
-        length = 2
-        # 3. Checksum Generation
-        checksum = checksum_generator(motor_id, length, instruction, 0, (0, ))
-        # 4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, 0, 0, checksum)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status
-        status = self.__read_packet()
-
+        # 2. Packet Generation, Length = 2 and the checksum are precomputed in the template
+        # 3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction)
+
+        # Factory defaults, the motor answers as ID 1 from now on
+        self.return_delay.pop(motor_id, None)
+        self.status_return_level.pop(motor_id, None)
         return status
 
 
@@ -284,16 +835,10 @@ class DXLPacketGenP1(object):
 
         # 1. Instrunction setting
         instruction = DXL_REBOOT
-        # 2. Length
-        length = 2
-        # 3. Checksum Generation
-        checksum = checksum_generator(motor_id, length, instruction, 0, (0, ))
-        # 4. Packet Generation
-        packet = packet_generator(motor_id, length, instruction, 0, 0, checksum)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status
-        status = self.__read_packet()
+        # 2. Packet Generation, Length = 2 and the checksum are precomputed in the template
+        # 3. Write packet and read the status (without a read when the motor does not answer this instruction),
+        # repeated as the retry policy allows
+        status = self.__transaction(motor_id, instruction)
 
         return status
 
@@ -323,6 +868,9 @@ class DXLPacketGenP1(object):
         ...     ...
         Param2L+4: Second Dynamixel - Lth data byte
 
+        Length is one byte: when the packet would be longer than DXL_MAX_PACKET_SIZE, the Dynamixels are
+        split over several Sync Write packets, laid out back to back and sent with a single write.
+
         IMPORTANT: In the data byte, there are High and Low
         EX) 0x150 -> 0x50(Low)   0x01(High)
         Length of data will be longer, if the data parameter is bigger, dividing High and Low
@@ -333,64 +881,164 @@ class DXLPacketGenP1(object):
                 ((motor_id_1, data), (motor_id_2, data))
                 Note that 'data' is predefined in different function
                 (Tuple > List in speed)
+        :return: Number of Sync Write packets sent
 
         """
 
         # 1. Instrunction setting
         instruction = DXL_SYNC_WRITE
-        # 2. Length
-        param_data = [int(round(param)) for motors in total_data for param in motors]
-        """
-        for motors in total_data:
-            for param in motors:
-                list.append(param)
-        """
-        length = 4 + len(param_data) #param_data has ID and Data bytes
-        # 3. Checksum Generation, bit_length should be integer and (bit_length, ) is made for being iterable
-        len_param_data = len(total_data[0][1:])
-        byte_size = (len_param_data + sum(param_data), )
-        # Should make the size as tuple (byte_size, ) for checksum fxn
-        # total_data[0][1:] means for param_data length per Dynamixel
-        checksum = checksum_generator(DXL_BROADCAST_ID, length, instruction, control_address, byte_size)
-        # 4. Packet Generation
-        packet = packet_generator(DXL_BROADCAST_ID, length, instruction, control_address, len_param_data, checksum, param_data)
-        # 5. Write packet
-        self.__write_packet(packet)
-        # 6. Read status -> Packet function using BROADCAST_ID has no status packet
-        # that's why here is no return
-
-    def bulk_read(self, read_address, address_length, motor_list):
-        """
-
-        Protocol 1.0 - Instuction 8.
-        Bulk Read       0x92    Simultaneously, read data of dynamixels(only for MX)> 4
-
-        :param read_address:
-        :param address_length:
-        :param motor_list:
-        :return:
+        with self.lock:
+            encode_start = time.perf_counter()
+            # 2. Parameters and 3. Packet Generation, split at DXL_MAX_PACKET_SIZE
+            packets, n_packets = split_sync_write(self.templates, control_address, total_data)
+            # 4. Write packet(s), one write: a buffer reset of TRANSPORT_SAFE in between would drop a packet
+            self.__write_packet(packets, instruction, encode_start, reply=False)
+            # 5. Read status -> Packet function using BROADCAST_ID has no status packet
+            if control_address <= DXL_STATUS_RETURN_LEVEL:
+                for motors in total_data:
+                    self.__track_settings(motors[0], control_address, motors[1:])
+        return n_packets
+
+    def sync_write_array(self, control_address, motor_ids, *columns):
         """
+        Sync Write from arrays, encoded with NumPy in dxl_sync_write_np.SyncWriteEncoder
 
+        Unlike sync_write, values are not split into Low/High bytes by the caller: every column is one
+        array with a value per Dynamixel, and its dtype decides the byte width (uint16 for non integer arrays).
 
+        EX) sync_write_array(DXL_GOAL_POSITION_L, ids, goal_position, moving_speed)
+            -> Goal Position (2 bytes) and Moving Speed (2 bytes) for every ID, L = 4
 
+        The encoder is kept per (control_address, No. of Dynamixels, dtypes), so repeated calls only copy
+        the IDs and values into the preallocated packet.
 
+        :param control_address: Start address of the Control Table
+        :param motor_ids: Array of Dynamixel IDs
+        :param columns: Value arrays, one value per Dynamixel each
+        """
+        from dxl_sync_write_np import SyncWriteEncoder, column_dtype
+
+        with self.lock:
+            encode_start = time.perf_counter()
+            # 1. Encoder for this layout
+            dtypes = tuple([column_dtype(values) for values in columns])
+            key = (control_address, len(motor_ids), dtypes)
+            encoder = self.sync_write_encoders.get(key)
+            if encoder is None:
+                encoder = self.sync_write_encoders[key] = SyncWriteEncoder(control_address, motor_ids, dtypes)
+            else:
+                encoder.set_ids(motor_ids)
+            # 2. Packet Generation
+            packet = encoder.encode(*columns)
+            # 3. Write packet, there is no status packet
+            self.__write_packet(packet.data, DXL_SYNC_WRITE, encode_start, reply=False)
+            # 4. Reply settings of the motors, as sync_write
+            if control_address <= DXL_STATUS_RETURN_LEVEL:
+                for lo, hi, encoded, records in encoder.packets:
+                    params = bytes(encoded[7:-1])
+                    size = records.itemsize
+                    for idx in range(0, len(params), size):
+                        self.__track_settings(params[idx], control_address, params[idx + 1:idx + size])
+
+    def sync_write_packets(self, packets):
+        """
+        Write Sync Write packets encoded ahead of time, ex) one tick of a dxl_trajectory.Trajectory
 
+        :param packets: Bytes-like object with one or more complete Sync Write packets back to back
+        """
+        with self.lock:
+            # Nothing to encode, there is no status packet
+            self.__write_packet(packets, DXL_SYNC_WRITE, time.perf_counter(), reply=False)
 
+    def bulk_read(self, read_address, address_length, motor_list):
+        """
+        Read data of several Dynamixels using one instruction packet transmission.
+        Unlike sync_write, the address and length may be different for each Dynamixel.
 
+        Protocol 1.0 - Instuction 9.
+        Bulk Read       0x92    Simultaneously, read data of dynamixels(only for MX)> 4
 
+        Instruction: 0x92
+        Length: 3N + 3 (N: No. of Dynamixels)
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        Param1: 0x00
+        Param2: First Dynamixel - Data Length, L
+        Param3: First Dynamixel - ID
+        Param4: First Dynamixel - Start Address
+        ...     ...
+        Param3N-1: Nth Dynamixel - Data Length
+        Param3N: Nth Dynamixel - ID
+        Param3N+1: Nth Dynamixel - Start Address
+
+        Each Dynamixel answers with its own Status Packet, in the order of the instruction packet,
+        right after the previous one. All of them are read with one buffered read and split by the
+        StatusParser; a missing or broken packet only loses the data of its own motor.
+
+        :param read_address: Start address used for the motor IDs given without their own address
+        :param address_length: Data length used for the motor IDs given without their own length
+        :param motor_list: Motor IDs, or (motor_id, address, length) tuples to read a different range per motor
+        :return: Dictionary {motor_id: StatusPacket}, None for a motor whose status packet was missing or broken
+        """
+        # 1. Instrunction setting
+        instruction = DXL_BULK_READ
+        start = time.perf_counter()
+        result = self.__bulk_read(read_address, address_length, motor_list)
+
+        # 7. The motors whose Status Packet was lost are read once more, as the retry policy allows
+        policy = self.retry_policy
+        attempt = 0
+        while policy is not None:
+            lost = [motor for motor in motor_list
+                    if policy.retryable(result[motor if isinstance(motor, int) else motor[0]])
+                    and self.reply_expected(motor if isinstance(motor, int) else motor[0], instruction)]
+            if not lost:
+                policy.finished(instruction, True, attempt)
+                break
+            now = time.perf_counter()
+            # The retry reads fewer motors than the last try, its reply timeout is an upper bound
+            duration = self.__wait_before(now) + self.transaction_timeout
+            if not policy.retry(instruction, None, attempt, now - start, duration):
+                policy.finished(instruction, False, attempt)
+                break
+            attempt += 1
+            if self.instrumentation is not None:
+                self.instrumentation.record_retry(instruction)
+            result.update(self.__bulk_read(read_address, address_length, lost))
+
+        return result
+
+    def __bulk_read(self, read_address, address_length, motor_list):
+        instruction = DXL_BULK_READ
+        with self.lock:
+            encode_start = time.perf_counter()
+            # 2. Parameters: (Length, ID, Address) per Dynamixel, and expected status packets
+            param_data, expected = bulk_read_params(read_address, address_length, motor_list)
+            # 3. Packet Generation, Length = 3N + 3 and Param1 = 0x00
+            packet = self.templates.packet(DXL_BROADCAST_ID, instruction, 0x00, param_data)
+            # 4. Write packet
+            self.__write_packet(packet, instruction, encode_start)
+            # 5. Read all status packets at once. Each motor answers after the previous one and its own Return Delay
+            # Time; motors with Status Return Level 0 do not answer at all
+            answering = [(motor_id, length) for motor_id, length in expected
+                         if self.reply_expected(motor_id, instruction)]
+            total_length = sum([length + 6 for motor_id, length in answering])
+            timeout = self.reply_margin + self.backlog + (len(packet) + total_length) * 10.0 / self.ser.baudrate
+            timeout += sum([self.return_delay.get(motor_id, self.default_return_delay) for motor_id, length in answering])
+            self.transaction_timeout = timeout
+            if self.transport == TRANSPORT_LOW_LATENCY:
+                result = self.__read_bulk_fd(answering, total_length, timeout)
+            else:
+                self.__set_serial_timeout(timeout)
+                received = self.ser.read(total_length)
+                self.syscalls += 1
+                if self.capture is not None and received:
+                    self.capture.rx(received)
+                self.parser.feed(received)
+                # 6. Split status packets per Dynamixel, in reply order
+                result = dict.fromkeys([motor_id for motor_id, length in answering])
+                self.__split_bulk(answering, result, 0)
+            self.__end_transaction(None not in result.values() and not self.__parser_errors(), result.values())
+            for motor_id, length in expected:
+                result.setdefault(motor_id)
+
+        return result
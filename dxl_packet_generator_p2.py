@@ -0,0 +1,506 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Packet generator for Protocol 2.0
+
+    - Instruction Packet Structure
+        Header 1    Header 2    Header3     Reserved    ID  Length1 Length2  Instruction     Param1  ...     ParamN  CRC1   CRC2
+        0xFF        0xFF        0xFD        0x00        ID  Length1 Length2  Instruction     Param1  ...     ParamN  CRC_L  CRC_H
+
+    See dxl_addr_table_p2.py for the CRC, byte stuffing and the Fast Sync Read / Fast Bulk Read status packets.
+
+
+"""
+
+import time
+import termios
+import serial
+from dxl_addr_table_p2 import *
+from dxl_status_parser_p1 import StatusPacket, StatusParser
+
+
+def _crc_table():
+    """
+    CRC-16 lookup table, polynomial 0x8005 (x16 + x15 + x2 + 1), MSB first
+    """
+    table = []
+    for idx in range(256):
+        crc = idx << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+CRC_TABLE = _crc_table()
+
+def crc16(data, start=0, end=None, crc=0):
+    """
+    Table driven CRC-16 of data[start:end], one table lookup per byte
+    """
+    table = CRC_TABLE
+    for byte in data[start:end]:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+# CRC after the fixed header 0xFF 0xFF 0xFD 0x00, every packet continues from here
+HEADER_CRC = crc16(b'\xff\xff\xfd\x00')
+
+def stuff(params):
+    """
+    Byte stuffing: 0xFF 0xFF 0xFD -> 0xFF 0xFF 0xFD 0xFD
+    Parameters without the header pattern, which is almost always the case, are returned as they are.
+    """
+    if b'\xff\xff\xfd' in params:
+        return params.replace(b'\xff\xff\xfd', b'\xff\xff\xfd\xfd')
+    return params
+
+def unstuff(params):
+    """
+    Remove byte stuffing: 0xFF 0xFF 0xFD 0xFD -> 0xFF 0xFF 0xFD
+    """
+    if b'\xff\xff\xfd\xfd' in params:
+        return params.replace(b'\xff\xff\xfd\xfd', b'\xff\xff\xfd')
+    return params
+
+def packet_generator(motor_id, instruction, params=b''):
+    """
+    Instruction Packet with Length, byte stuffing and CRC, written into one preallocated bytearray
+
+    :param motor_id: Dynamixel ID or DXL_BROADCAST_ID
+    :param instruction: DXL_PING, DXL_READ_DATA, ...
+    :param params: Param1 ... ParamN, bytes or sequence of integers in 0 ~ 255
+    :return: bytearray
+    """
+    params = stuff(bytes(params))
+    n_params = len(params)
+    length = n_params + 3
+    packet = bytearray(n_params + 10)
+    packet[0:8] = (0xFF, 0xFF, 0xFD, 0x00, motor_id, length & 0xFF, length >> 8, instruction)
+    packet[8:8 + n_params] = params
+    crc = crc16(packet, 4, n_params + 8, HEADER_CRC)
+    packet[-2] = crc & 0xFF
+    packet[-1] = crc >> 8
+    return packet
+
+def address_params(address, length):
+    """
+    Start address and data length as Param1 ~ Param4 (Low, High)
+    """
+    return (address & 0xFF, address >> 8, length & 0xFF, length >> 8)
+
+def bulk_read_params(motor_list):
+    """
+    Bulk Read parameters: ID, Start address (Low, High), Data length (Low, High) for each Dynamixel
+    """
+    params = bytearray()
+    for motor_id, address, length in motor_list:
+        params.append(motor_id)
+        params.extend(address_params(address, length))
+    return params
+
+def split_fast_read(status, expected):
+    """
+    Split the Status Packet of a Fast Sync Read / Fast Bulk Read into one StatusPacket per Dynamixel
+
+        [Error1 ID1 Data1 CRC1] [Error2 ID2 Data2 CRC2] ... [ErrorN IDN DataN]
+
+    The CRC of the whole packet was already checked by the parser, so the intermediate CRCs are only skipped.
+
+    :param status: StatusPacket with ID DXL_BROADCAST_ID
+    :param expected: [(motor_id, data length), ...] in the order of the instruction packet
+    :return: Dictionary {motor_id: StatusPacket}, None for motors missing in the packet
+    """
+    result = dict.fromkeys([motor_id for motor_id, length in expected])
+    if status is None:
+        return result
+    segments = bytes((status.error, )) + status.params
+    end = len(segments)
+    idx = 0
+    for motor_id, length in expected:
+        if idx + length + 2 > end or segments[idx + 1] != motor_id:
+            break
+        result[motor_id] = StatusPacket(motor_id, segments[idx], segments[idx + 2:idx + 2 + length])
+        idx += length + 4
+    return result
+
+
+class StatusParserP2(StatusParser):
+    """
+    Resynchronizing Status Packet parser for Protocol 2.0
+
+    Same receive buffer as the Protocol 1.0 parser. The header is 0xFF 0xFF 0xFD 0x00, Length is 2 bytes,
+    the Instruction must be 0x55 (Status) and the CRC is checked before the parameters are unstuffed.
+    """
+
+    def __init__(self, capacity=4096):
+        StatusParser.__init__(self, capacity)
+        self.needed = 11
+
+    def reset(self):
+        StatusParser.reset(self)
+        self.needed = 11
+
+    def next_packet(self):
+        """
+        Parse the next valid Status Packet from the receive buffer
+
+        :return: StatusPacket, or None when the buffer holds no complete packet
+        """
+        buf = self.buffer
+        start = self.start
+        end = self.end
+        while True:
+            idx = buf.find(b'\xff\xff\xfd', start, end)
+            if idx < 0:
+                # Keep a trailing 0xFF or 0xFF 0xFF, it can be the beginning of the next header
+                keep = 0
+                while keep < 2 and end - keep > start and buf[end - keep - 1] == 0xFF:
+                    keep += 1
+                self.dropped_bytes += end - start - keep
+                self._release(end - keep, 11 - keep)
+                return None
+            self.dropped_bytes += idx - start
+            start = idx
+            if end - start < 9:
+                self._release(start, 11 - (end - start))
+                return None
+
+            length = buf[start + 5] | (buf[start + 6] << 8)
+            if buf[start + 3] != 0x00 or buf[start + 4] > 0xFE or buf[start + 7] != DXL_STATUS or length < 4:
+                start += 1
+                self.dropped_bytes += 1
+                continue
+            packet_end = start + length + 7
+            if packet_end > end:
+                if packet_end - start > self.capacity:
+                    start += 1
+                    self.dropped_bytes += 1
+                    continue
+                self._release(start, packet_end - end)
+                return None
+
+            if crc16(buf, start + 4, packet_end - 2, HEADER_CRC) != (buf[packet_end - 2] | (buf[packet_end - 1] << 8)):
+                self.checksum_errors += 1
+                start += 1
+                self.dropped_bytes += 1
+                continue
+
+            packet = StatusPacket(buf[start + 4], buf[start + 8], unstuff(bytes(buf[start + 9:packet_end - 2])))
+            self._release(packet_end, 11)
+            return packet
+
+
+class DXLPacketGenP2(object):
+    def __init__(self, port, baudrate):
+        TIMEOUT = 0.004
+        self.timeout = TIMEOUT
+
+        #Receive buffer and Status Packet parser, see StatusParserP2
+        self.parser = StatusParserP2()
+
+        #Setup serial node
+        #Protocol: 8 bit, 1 stop bit, none parity, asynchronous serial communication
+        self.ser = serial.Serial(
+            port,
+            baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=TIMEOUT
+        )
+
+    def __del__(self):
+        # Also runs for a driver whose __init__ failed, and at interpreter exit
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        Close the serial port once done
+        """
+        ser = getattr(self, 'ser', None)
+        if ser and ser.is_open:
+            try:
+                ser.reset_input_buffer()
+                ser.reset_output_buffer()
+            except (OSError, termios.error, serial.SerialException):
+                # The adapter is gone (ex) unplugged), only the file descriptor is left to close
+                pass
+            ser.close()
+
+    def __write_packet(self, packet):
+        self.ser.reset_output_buffer()
+        self.ser.reset_input_buffer()
+        self.parser.reset()
+        self.ser.flush()
+        self.ser.write(packet)
+
+    def __read_packet(self, motor_id, param_length=0):
+        """
+        Read the Status Packet of motor_id
+
+        :param motor_id: ID of the Dynamixel which should answer (DXL_BROADCAST_ID for Fast Sync/Bulk Read)
+        :param param_length: Number of expected parameters in the Status Packet
+        :return: StatusPacket, or None on timeout
+        """
+        parser = self.parser
+        size = param_length + 11
+        # ser.timeout, stretched by __read_fast for a long Status Packet
+        deadline = time.monotonic() + self.ser.timeout
+        while True:
+            received = self.ser.read(size)
+            if not received:
+                return None
+            parser.feed(received)
+            status = parser.next_packet()
+            while status is not None:
+                if status.motor_id == motor_id:
+                    return status
+                status = parser.next_packet()
+            if time.monotonic() > deadline:
+                return None
+            size = parser.needed
+
+    def __read_packets(self, expected):
+        """
+        Read back-to-back Status Packets of several Dynamixels (Sync Read, Bulk Read) with one buffered read
+
+        :param expected: [(motor_id, data length), ...] in reply order
+        :return: Dictionary {motor_id: StatusPacket}, None for missing or broken packets
+        """
+        total_length = sum([length + 11 for motor_id, length in expected])
+        self.ser.timeout = self.timeout + total_length * 10.0 / self.ser.baudrate
+        try:
+            self.parser.feed(self.ser.read(total_length))
+        finally:
+            self.ser.timeout = self.timeout
+
+        result = dict.fromkeys([motor_id for motor_id, length in expected])
+        order = 0
+        status = self.parser.next_packet()
+        while status is not None:
+            for idx in range(order, len(expected)):
+                if expected[idx][0] == status.motor_id:
+                    result[status.motor_id] = status
+                    order = idx + 1
+                    break
+            status = self.parser.next_packet()
+        return result
+
+    def __read_fast(self, expected):
+        """
+        Read the single Status Packet of a Fast Sync Read / Fast Bulk Read
+
+        Length = 1 + N * (L + 4): Instruction, then [Error ID Data CRC] per Dynamixel
+        """
+        param_length = sum([length + 4 for motor_id, length in expected]) - 3
+        self.ser.timeout = self.timeout + (param_length + 11) * 10.0 / self.ser.baudrate
+        try:
+            status = self.__read_packet(DXL_BROADCAST_ID, param_length)
+        finally:
+            self.ser.timeout = self.timeout
+        return split_fast_read(status, expected)
+
+    def ping(self, motor_id):
+        """
+        Protocol 2.0 - Instuction 0x01.
+        Ping            0x01    No action and controller gets Status Packet         0
+
+        Status Param1 ~ Param3: Model Number L, Model Number H, Firmware Version
+
+        :param motor_id:
+        :return: StatusPacket, or None on timeout
+        """
+        packet = packet_generator(motor_id, DXL_PING)
+        self.__write_packet(packet)
+        return self.__read_packet(motor_id, 3)
+
+    def broadcast_ping(self, timeout=None, return_delay=0.0005):
+        """
+        Ping with DXL_BROADCAST_ID: every Dynamixel on the bus answers, one after another in ID order
+
+        Status Param1 ~ Param3 of each: Model Number L, Model Number H, Firmware Version
+
+        :param timeout: Seconds to collect Status Packets, by default long enough for 253 answers
+                        (14 bytes and return_delay each)
+        :return: Dictionary {motor_id: StatusPacket}
+        """
+        if timeout is None:
+            timeout = self.timeout + 253 * (14 * 10.0 / self.ser.baudrate + return_delay)
+        packet = packet_generator(DXL_BROADCAST_ID, DXL_PING)
+        self.__write_packet(packet)
+
+        result = {}
+        parser = self.parser
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if remaining < self.ser.timeout:
+                    # The last read ends at the deadline
+                    self.ser.timeout = remaining
+                received = self.ser.read(max(self.ser.in_waiting, 14))
+                if not received:
+                    continue
+                parser.feed(received)
+                status = parser.next_packet()
+                while status is not None:
+                    result[status.motor_id] = status
+                    status = parser.next_packet()
+        finally:
+            self.ser.timeout = self.timeout
+        return result
+
+    def read_data(self, motor_id, address, length):
+        """
+        Protocol 2.0 - Instuction 0x02.
+        Read            0x02    Read Dynamixel data                                 4
+
+        Param1 ~ Param2: Start address (Low, High)
+        Param3 ~ Param4: Data length (Low, High)
+
+        :return: StatusPacket, or None on timeout
+        """
+        packet = packet_generator(motor_id, DXL_READ_DATA, address_params(address, length))
+        self.__write_packet(packet)
+        return self.__read_packet(motor_id, length)
+
+    def write_data(self, motor_id, address, data):
+        """
+        Protocol 2.0 - Instuction 0x03.
+        Write           0x03    Write Dynamixel data                                > 2
+
+        Param1 ~ Param2: Start address (Low, High)
+        Param3 ~ ParamN+2: Data
+
+        :return: StatusPacket, or None on timeout
+        """
+        packet = packet_generator(motor_id, DXL_WRITE_DATA, bytes((address & 0xFF, address >> 8)) + bytes(data))
+        self.__write_packet(packet)
+        return self.__read_packet(motor_id)
+
+    def reg_write(self, motor_id, address, data):
+        """
+        Protocol 2.0 - Instuction 0x04.
+        Reg Write       0x04    Similar to WRTE_DATA, Waiting and acting when ACTION command received
+
+        :return: StatusPacket, or None on timeout
+        """
+        packet = packet_generator(motor_id, DXL_REG_WRITE, bytes((address & 0xFF, address >> 8)) + bytes(data))
+        self.__write_packet(packet)
+        return self.__read_packet(motor_id)
+
+    def action(self, motor_id):
+        """
+        Protocol 2.0 - Instuction 0x05.
+        Action          0x05    Command to act the ACTION registered in REG WRITE   0
+
+        :return: StatusPacket, or None on timeout / broadcast
+        """
+        packet = packet_generator(motor_id, DXL_ACTION)
+        self.__write_packet(packet)
+        if motor_id == DXL_BROADCAST_ID:
+            return None
+        return self.__read_packet(motor_id)
+
+    def factory_reset(self, motor_id, option=0xFF):
+        """
+        Protocol 2.0 - Instuction 0x06.
+        Factory Reset   0x06    Factory Reset                                       1
+
+        Param1: 0xFF reset all, 0x01 reset all except ID, 0x02 reset all except ID and Baudrate
+
+        :return: StatusPacket, or None on timeout
+        """
+        packet = packet_generator(motor_id, DXL_RESET, (option, ))
+        self.__write_packet(packet)
+        return self.__read_packet(motor_id)
+
+    def reboot(self, motor_id):
+        """
+        Protocol 2.0 - Instuction 0x08.
+        Reboot          0x08    Rebooting instruction                               0
+
+        :return: StatusPacket, or None on timeout
+        """
+        packet = packet_generator(motor_id, DXL_REBOOT)
+        self.__write_packet(packet)
+        return self.__read_packet(motor_id)
+
+    def sync_read(self, address, length, motor_ids):
+        """
+        Read the same address and length of several Dynamixels; each one answers with its own Status Packet.
+
+        Protocol 2.0 - Instuction 0x82.
+        Param1 ~ Param4: Start address (Low, High), Data length (Low, High)
+        Param5 ~ : ID of each Dynamixel
+
+        :return: Dictionary {motor_id: StatusPacket}, None for missing or broken packets
+        """
+        packet = packet_generator(DXL_BROADCAST_ID, DXL_SYNC_READ, bytes(address_params(address, length)) + bytes(motor_ids))
+        self.__write_packet(packet)
+        return self.__read_packets([(motor_id, length) for motor_id in motor_ids])
+
+    def fast_sync_read(self, address, length, motor_ids):
+        """
+        Sync Read answered in one Status Packet, see dxl_addr_table_p2.py
+
+        Protocol 2.0 - Instuction 0x8A.
+        Param1 ~ Param4: Start address (Low, High), Data length (Low, High)
+        Param5 ~ : ID of each Dynamixel
+
+        :return: Dictionary {motor_id: StatusPacket}, None for motors missing in the packet
+        """
+        packet = packet_generator(DXL_BROADCAST_ID, DXL_FAST_SYNC_READ, bytes(address_params(address, length)) + bytes(motor_ids))
+        self.__write_packet(packet)
+        return self.__read_fast([(motor_id, length) for motor_id in motor_ids])
+
+    def sync_write(self, address, length, total_data):
+        """
+        Protocol 2.0 - Instuction 0x83.
+        Param1 ~ Param4: Start address (Low, High), Data length (Low, High)
+        Then ID and L data bytes for each Dynamixel
+
+        total_data: ((motor_id_1, data bytes ...), (motor_id_2, data bytes ...))
+        There is no Status Packet.
+        """
+        params = bytearray(address_params(address, length))
+        for motor in total_data:
+            params.extend(motor)
+        packet = packet_generator(DXL_BROADCAST_ID, DXL_SYNC_WRITE, params)
+        self.__write_packet(packet)
+
+    def bulk_read(self, motor_list):
+        """
+        Read a different address and length of several Dynamixels; each one answers with its own Status Packet.
+
+        Protocol 2.0 - Instuction 0x92.
+        Param: ID, Start address (Low, High), Data length (Low, High) for each Dynamixel
+
+        :param motor_list: (motor_id, address, length) tuples
+        :return: Dictionary {motor_id: StatusPacket}, None for missing or broken packets
+        """
+        packet = packet_generator(DXL_BROADCAST_ID, DXL_BULK_READ, bulk_read_params(motor_list))
+        self.__write_packet(packet)
+        return self.__read_packets([(motor_id, length) for motor_id, address, length in motor_list])
+
+    def fast_bulk_read(self, motor_list):
+        """
+        Bulk Read answered in one Status Packet, see dxl_addr_table_p2.py
+
+        Protocol 2.0 - Instuction 0x9A.
+        Param: ID, Start address (Low, High), Data length (Low, High) for each Dynamixel
+
+        :param motor_list: (motor_id, address, length) tuples
+        :return: Dictionary {motor_id: StatusPacket}, None for motors missing in the packet
+        """
+        packet = packet_generator(DXL_BROADCAST_ID, DXL_FAST_BULK_READ, bulk_read_params(motor_list))
+        self.__write_packet(packet)
+        return self.__read_fast([(motor_id, length) for motor_id, address, length in motor_list])
+
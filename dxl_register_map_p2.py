@@ -0,0 +1,297 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Register maps of Protocol 2.0 (X series) models, and Indirect Address mappings
+
+    register_map(model_number) gives the typed registers (int_byte_table.Register) of a model; the XH430 and
+    XM430 tables are the same, XL430 has Present Load instead of Present Current and no current control.
+
+    Indirect Address: Indirect Address n holds a Control Table address, and Indirect Data n reads and writes
+    the byte at that address. Pointing consecutive slots at the bytes of scattered registers makes them one
+    contiguous block, read with one short access:
+
+        Hardware Error Status (70), Present Current (126), Present Velocity (128), Present Position (132),
+        Present Input Voltage (144), Present Temperature (146)
+            one read from 70 to 146:    77 data bytes
+            one read of Indirect Data:  14 data bytes
+
+    EX)
+        mapping = IndirectMapping(register_map(XH430_W350), ['PRESENT_CURRENT', 'PRESENT_VELOCITY',
+                                  'PRESENT_POSITION', 'PRESENT_INPUT_VOLTAGE', 'PRESENT_TEMPERATURE',
+                                  'HARDWARE_ERROR_STATUS'])
+        mapping.program(dxl, motor_id)                  # once, with the torque off
+        state = mapping.read(dxl, motor_id)             # {'PRESENT_CURRENT': raw, ...}
+        states = mapping.sync_read(dxl, motor_ids)      # {motor_id: {...} or None}
+
+
+"""
+
+import math
+from dxl_addr_table_p2 import *
+from int_byte_table import Register, RegisterBlock, READ, READ_WRITE
+
+TICK = 2.0 * math.pi / 4096.0
+RPM = 0.229 * 2.0 * math.pi / 60.0
+
+MODEL_NAMES = {
+    XL430_W250: 'XL430-W250',
+    XM430_W210: 'XM430-W210',
+    XM430_W350: 'XM430-W350',
+    XH430_W210: 'XH430-W210',
+    XH430_W350: 'XH430-W350',
+    XH430_V210: 'XH430-V210',
+    XH430_V350: 'XH430-V350',
+}
+
+
+def _x_register(name, address, size=1, access=READ_WRITE, **kwargs):
+    return Register(name, address, size, access, eeprom=address < X_TORQUE_ENABLE, **kwargs)
+
+
+def _x_series(current=True):
+    """
+    Registers of the X series table; current=False for the models without current sensing (XL430)
+    """
+    registers = [
+        # EEPROM
+        _x_register('MODEL_NUMBER', X_MODEL_NUMBER, 2, READ),
+        _x_register('MODEL_INFORMATION', X_MODEL_INFORMATION, 4, READ),
+        _x_register('FIRMWARE_VERSION', X_FIRMWARE_VERSION, 1, READ),
+        _x_register('ID', X_ID),
+        _x_register('BAUD_RATE', X_BAUD_RATE),
+        _x_register('RETURN_DELAY_TIME', X_RETURN_DELAY_TIME, unit='s', scale=2e-6),
+        _x_register('DRIVE_MODE', X_DRIVE_MODE),
+        _x_register('OPERATING_MODE', X_OPERATING_MODE),
+        _x_register('SECONDARY_ID', X_SECONDARY_ID),
+        _x_register('PROTOCOL_TYPE', X_PROTOCOL_TYPE),
+        _x_register('HOMING_OFFSET', X_HOMING_OFFSET, 4, unit='rad', scale=TICK, signed=True),
+        _x_register('MOVING_THRESHOLD', X_MOVING_THRESHOLD, 4, unit='rad/s', scale=RPM),
+        _x_register('TEMPERATURE_LIMIT', X_TEMPERATURE_LIMIT, unit='degC'),
+        _x_register('MAX_VOLTAGE_LIMIT', X_MAX_VOLTAGE_LIMIT, 2, unit='V', scale=0.1),
+        _x_register('MIN_VOLTAGE_LIMIT', X_MIN_VOLTAGE_LIMIT, 2, unit='V', scale=0.1),
+        _x_register('PWM_LIMIT', X_PWM_LIMIT, 2, unit='%', scale=100.0 / 885),
+        _x_register('VELOCITY_LIMIT', X_VELOCITY_LIMIT, 4, unit='rad/s', scale=RPM),
+        _x_register('MAX_POSITION_LIMIT', X_MAX_POSITION_LIMIT, 4, unit='rad', scale=TICK, offset=2048),
+        _x_register('MIN_POSITION_LIMIT', X_MIN_POSITION_LIMIT, 4, unit='rad', scale=TICK, offset=2048),
+        _x_register('SHUTDOWN', X_SHUTDOWN),
+        # RAM
+        _x_register('TORQUE_ENABLE', X_TORQUE_ENABLE),
+        _x_register('LED', X_LED),
+        _x_register('STATUS_RETURN_LEVEL', X_STATUS_RETURN_LEVEL),
+        _x_register('REGISTERED_INSTRUCTION', X_REGISTERED_INSTRUCTION, 1, READ),
+        _x_register('HARDWARE_ERROR_STATUS', X_HARDWARE_ERROR_STATUS, 1, READ),
+        _x_register('VELOCITY_I_GAIN', X_VELOCITY_I_GAIN, 2),
+        _x_register('VELOCITY_P_GAIN', X_VELOCITY_P_GAIN, 2),
+        _x_register('POSITION_D_GAIN', X_POSITION_D_GAIN, 2),
+        _x_register('POSITION_I_GAIN', X_POSITION_I_GAIN, 2),
+        _x_register('POSITION_P_GAIN', X_POSITION_P_GAIN, 2),
+        _x_register('FEEDFORWARD_2ND_GAIN', X_FEEDFORWARD_2ND_GAIN, 2),
+        _x_register('FEEDFORWARD_1ST_GAIN', X_FEEDFORWARD_1ST_GAIN, 2),
+        _x_register('BUS_WATCHDOG', X_BUS_WATCHDOG, unit='s', scale=0.02),
+        _x_register('GOAL_PWM', X_GOAL_PWM, 2, unit='%', scale=100.0 / 885, signed=True),
+        _x_register('GOAL_VELOCITY', X_GOAL_VELOCITY, 4, unit='rad/s', scale=RPM, signed=True),
+        _x_register('PROFILE_ACCELERATION', X_PROFILE_ACCELERATION, 4),
+        _x_register('PROFILE_VELOCITY', X_PROFILE_VELOCITY, 4),
+        _x_register('GOAL_POSITION', X_GOAL_POSITION, 4, unit='rad', scale=TICK, offset=2048, signed=True),
+        _x_register('REALTIME_TICK', X_REALTIME_TICK, 2, READ, unit='s', scale=0.001),
+        _x_register('MOVING', X_MOVING, 1, READ),
+        _x_register('MOVING_STATUS', X_MOVING_STATUS, 1, READ),
+        _x_register('PRESENT_PWM', X_PRESENT_PWM, 2, READ, unit='%', scale=100.0 / 885, signed=True),
+        _x_register('PRESENT_VELOCITY', X_PRESENT_VELOCITY, 4, READ, unit='rad/s', scale=RPM, signed=True),
+        _x_register('PRESENT_POSITION', X_PRESENT_POSITION, 4, READ, unit='rad', scale=TICK, offset=2048,
+                    signed=True),
+        _x_register('VELOCITY_TRAJECTORY', X_VELOCITY_TRAJECTORY, 4, READ, unit='rad/s', scale=RPM, signed=True),
+        _x_register('POSITION_TRAJECTORY', X_POSITION_TRAJECTORY, 4, READ, unit='rad', scale=TICK, offset=2048,
+                    signed=True),
+        _x_register('PRESENT_INPUT_VOLTAGE', X_PRESENT_INPUT_VOLTAGE, 2, READ, unit='V', scale=0.1),
+        _x_register('PRESENT_TEMPERATURE', X_PRESENT_TEMPERATURE, 1, READ, unit='degC'),
+    ]
+    if current:
+        registers += [
+            _x_register('CURRENT_LIMIT', X_CURRENT_LIMIT, 2, unit='A', scale=0.00269),
+            _x_register('GOAL_CURRENT', X_GOAL_CURRENT, 2, unit='A', scale=0.00269, signed=True),
+            _x_register('PRESENT_CURRENT', X_PRESENT_CURRENT, 2, READ, unit='A', scale=0.00269, signed=True),
+        ]
+    else:
+        registers.append(_x_register('PRESENT_LOAD', X_PRESENT_CURRENT, 2, READ, unit='%', scale=0.1, signed=True))
+    return dict([(reg.name, reg) for reg in registers])
+
+
+X_SERIES = _x_series()
+XL430 = _x_series(current=False)
+
+REGISTER_MAPS = {
+    XL430_W250: XL430,
+    XM430_W210: X_SERIES,
+    XM430_W350: X_SERIES,
+    XH430_W210: X_SERIES,
+    XH430_W350: X_SERIES,
+    XH430_V210: X_SERIES,
+    XH430_V350: X_SERIES,
+}
+
+
+def register_map(model_number):
+    """
+    :param model_number: Model Number read from the motor (X_MODEL_NUMBER), ex) XH430_W350
+    :return: Dictionary {name: Register}
+    """
+    try:
+        return REGISTER_MAPS[model_number]
+    except KeyError:
+        raise ValueError('No register map for model number %d' % model_number)
+
+
+def read_model_number(dxl, motor_id):
+    """
+    :return: Model Number of the motor, or None if it did not answer
+    """
+    status = dxl.read_data(motor_id, X_MODEL_NUMBER, 2)
+    if status is None or status.error or len(status.params) != 2:
+        return None
+    return status.params[0] | (status.params[1] << 8)
+
+
+class IndirectMapping(object):
+    """
+    Registers placed back to back in the Indirect Data region
+
+    :param registers: Register map of the model, see register_map
+    :param names: Registers in the order of the block
+    :param slot: First Indirect Address slot to use (1 ~ 56); slots 1 ~ 28 and 29 ~ 56 are two regions,
+                 a mapping does not cross from one to the other
+
+    address, length: the contiguous access of the Indirect Data
+    block: int_byte_table.RegisterBlock of the Indirect Data, decodes and encodes the whole set at once
+    """
+
+    def __init__(self, registers, names, slot=1):
+        if slot < 1 or slot > 2 * X_INDIRECT_SLOTS:
+            raise ValueError('Indirect slot must be in 1 ~ %d' % (2 * X_INDIRECT_SLOTS))
+        targets = [registers[name] for name in names]
+        self.length = sum([reg.size for reg in targets])
+        first = (slot - 1) % X_INDIRECT_SLOTS
+        if first + self.length > X_INDIRECT_SLOTS:
+            raise ValueError('%d bytes do not fit in the Indirect Data region from slot %d' % (self.length, slot))
+        if slot <= X_INDIRECT_SLOTS:
+            self.address_base, self.address = X_INDIRECT_ADDRESS_1 + 2 * first, X_INDIRECT_DATA_1 + first
+        else:
+            self.address_base, self.address = X_INDIRECT_ADDRESS_29 + 2 * first, X_INDIRECT_DATA_29 + first
+        self.slot = slot
+        self.targets = targets
+        self.names = tuple(names)
+        self.writable = all([reg.writable for reg in targets])
+
+        # The same registers, at their position in the Indirect Data
+        placed = []
+        position = self.address
+        for reg in targets:
+            placed.append(Register(reg.name, position, reg.size, reg.access, reg.unit, reg.scale, reg.offset,
+                                   reg.signed, reg.direction_bit, eeprom=False))
+            position += reg.size
+        self.block = RegisterBlock(placed)
+
+    def __repr__(self):
+        return 'IndirectMapping(%s, slot=%d, address=%d, length=%d)' % (list(self.names), self.slot, self.address,
+                                                                          self.length)
+
+    def addresses(self):
+        """
+        Indirect Address values: the address of every byte of every register, in block order
+        """
+        return [reg.address + idx for reg in self.targets for idx in range(reg.size)]
+
+    def address_data(self):
+        """
+        Data bytes of one write to the Indirect Address slots, 2 bytes (Low, High) per slot
+        """
+        data = bytearray()
+        for address in self.addresses():
+            data.extend((address & 0xFF, address >> 8))
+        return bytes(data)
+
+    def program(self, dxl, motor_id):
+        """
+        Write the Indirect Address slots of a motor (Torque Enable must be 0) and read them back
+
+        :return: True if the motor holds the mapping
+        """
+        data = self.address_data()
+        status = dxl.write_data(motor_id, self.address_base, data)
+        if status is None or status.error:
+            return False
+        return self.verify(dxl, motor_id)
+
+    def verify(self, dxl, motor_id):
+        """
+        :return: True if the Indirect Address slots of the motor hold this mapping
+        """
+        data = self.address_data()
+        status = dxl.read_data(motor_id, self.address_base, len(data))
+        return status is not None and not status.error and bytes(status.params) == data
+
+    def decode(self, params):
+        """
+        :return: Dictionary {name: raw value} of one motor's Indirect Data
+        """
+        return dict(zip(self.block.names, self.block.unpack(params)))
+
+    def to_si(self, params):
+        """
+        :return: Dictionary {name: SI value} of one motor's Indirect Data
+        """
+        return self.block.decode(params)
+
+    def read(self, dxl, motor_id):
+        """
+        :return: Dictionary {name: raw value}, or None without a valid Status Packet
+        """
+        status = dxl.read_data(motor_id, self.address, self.length)
+        if status is None or len(status.params) != self.length:
+            return None
+        return self.decode(status.params)
+
+    def sync_read(self, dxl, motor_ids, fast=False):
+        """
+        Indirect Data of several motors with one Sync Read (Fast Sync Read with fast=True)
+
+        :return: Dictionary {motor_id: {name: raw value} or None}
+        """
+        read = dxl.fast_sync_read if fast else dxl.sync_read
+        result = read(self.address, self.length, motor_ids)
+        return dict([(motor_id, self.decode(status.params)
+                      if status is not None and len(status.params) == self.length else None)
+                     for motor_id, status in result.items()])
+
+    def records(self, result, motor_ids):
+        """
+        Raw values of a dxl.sync_read / dxl.fast_sync_read result of the Indirect Data as one NumPy record array,
+        motors in the given order; missing motors are zero
+
+        :return: (records, valid) with valid a bool array
+        """
+        import numpy as np
+        records = np.zeros(len(motor_ids), dtype=self.block.dtype)
+        valid = np.zeros(len(motor_ids), dtype=bool)
+        for idx, motor_id in enumerate(motor_ids):
+            status = result.get(motor_id)
+            if status is not None and len(status.params) == self.length:
+                records[idx] = np.frombuffer(status.params, dtype=self.block.dtype)[0]
+                valid[idx] = True
+        return records, valid
+
+    def pack(self, **raw):
+        """
+        Data bytes of the Indirect Data, ex) pack(GOAL_POSITION=2048, PROFILE_VELOCITY=100)
+        """
+        return self.block.pack(*[raw[name] for name in self.block.names])
+
+    def write(self, dxl, motor_id, **raw):
+        """
+        Write all registers of the mapping with one access; every one of them must be writable
+        """
+        if not self.writable:
+            raise ValueError('The mapping holds read only registers')
+        return dxl.write_data(motor_id, self.address, self.pack(**raw))
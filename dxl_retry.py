@@ -0,0 +1,104 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Retry policy for Protocol 1.0 transactions
+
+    A transaction is repeated only when repeating it cannot change the result:
+        - the instruction is idempotent: PING, READ, WRITE, REG_WRITE and BULK_READ
+          (never ACTION, RESET or REBOOT: the first packet may have arrived even if its reply did not)
+        - the Status Packet did not come (timeout, broken or noisy packet), or the motor reported a
+          Checksum Error, i.e. it did not get the instruction packet intact
+    Any other error bit (Overload, Range, ...) is an answer of the motor, another try gets the same answer.
+
+    Each instruction has a retry budget (number of extra tries) and a deadline (seconds from the start of the
+    first try). A retry is only started if its worst case duration (the reply timeout) still ends before the
+    deadline, so the tail latency of a transaction stays bounded by the deadline even on a noisy bus.
+
+    EX)
+        policy = RetryPolicy(retries=2, deadline=0.005, budgets={DXL_WRITE_DATA: 1})
+        dxl = DXLPacketGenP1('/dev/ttyUSB0', 1000000, retry_policy=policy)
+        status = dxl.read_data(1, DXL_PRESENT_POSITION_L, 2)    # tried up to 3 times within 5 ms
+        print(policy.statistics())
+
+
+"""
+
+from dxl_addr_table_p1 import *
+from dxl_instrumentation import INSTRUCTION_NAMES
+
+IDEMPOTENT = frozenset((DXL_PING, DXL_READ_DATA, DXL_WRITE_DATA, DXL_REG_WRITE, DXL_BULK_READ))
+
+# Error bits which mean the instruction packet did not arrive intact
+RETRY_ERRORS = DXL_ERROR_CHECKSUM
+
+
+class RetryPolicy(object):
+    """
+    :param retries: Extra tries per transaction, for instructions without their own budget
+    :param deadline: Seconds from the start of the first try, for instructions without their own deadline
+    :param budgets: {instruction: retries}, ex) {DXL_WRITE_DATA: 0} to never repeat writes
+    :param deadlines: {instruction: seconds}
+    """
+
+    def __init__(self, retries=2, deadline=0.01, budgets=None, deadlines=None):
+        self.retries = retries
+        self.deadline = deadline
+        self.budgets = dict(budgets or {})
+        self.deadlines = dict(deadlines or {})
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.attempts = {}
+        self.recovered = {}
+        self.exhausted = {}
+        self.expired = {}
+
+    def retryable(self, status):
+        """
+        True if the result of a try says the instruction packet or the reply was lost
+        """
+        return status is None or bool(status.error & RETRY_ERRORS)
+
+    def retry(self, instruction, status, attempt, elapsed, duration):
+        """
+        Decide whether to try once more
+
+        :param status: Result of the last try, StatusPacket or None
+        :param attempt: Number of retries made so far
+        :param elapsed: Seconds since the start of the first try
+        :param duration: Worst case duration of one more try
+        """
+        if instruction not in IDEMPOTENT or not self.retryable(status):
+            return False
+        if attempt >= self.budgets.get(instruction, self.retries):
+            self.exhausted[instruction] = self.exhausted.get(instruction, 0) + 1
+            return False
+        if elapsed + duration > self.deadlines.get(instruction, self.deadline):
+            self.expired[instruction] = self.expired.get(instruction, 0) + 1
+            return False
+        self.attempts[instruction] = self.attempts.get(instruction, 0) + 1
+        return True
+
+    def finished(self, instruction, ok, attempt):
+        """
+        Called after the last try of a transaction
+
+        :param ok: False if the last try was lost too
+        """
+        if attempt and ok:
+            self.recovered[instruction] = self.recovered.get(instruction, 0) + 1
+
+    def statistics(self):
+        """
+        Per instruction name: retries made, transactions recovered by a retry, and transactions given up
+        because the budget was used (exhausted) or the deadline did not allow another try (expired)
+        """
+        names = set(self.attempts) | set(self.exhausted) | set(self.expired)
+        return dict([(INSTRUCTION_NAMES.get(instruction, str(instruction)), {
+            'retries': self.attempts.get(instruction, 0),
+            'recovered': self.recovered.get(instruction, 0),
+            'exhausted': self.exhausted.get(instruction, 0),
+            'expired': self.expired.get(instruction, 0),
+        }) for instruction in sorted(names)])
@@ -0,0 +1,425 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Virtual Dynamixel bus (Protocol 1.0) over a pseudo-terminal
+
+    The simulator opens a pty pair and answers on the master side like MX-106 motors on an RS-485 bus.
+    DXLPacketGenP1 (or anything else using pyserial) opens the slave side by its name, so the driver code
+    runs unchanged, without hardware:
+
+        with VirtualDXLBus([1, 2, 3], baudrate=1000000) as bus:
+            dxl = DXLPacketGenP1(bus.port, 1000000)
+            dxl.ping(1)
+
+    Motors
+        - Control table of 74 bytes laid out from dxl_addr_table_p1, with MX-106 factory defaults
+        - PING, READ, WRITE, REG_WRITE, ACTION, RESET, REBOOT, SYNC_WRITE, BULK_READ
+        - Status Return Level (0: PING only, 1: PING and READ, 2: all) and broadcast rules
+        - Present Position follows Goal Position right away, so closed loop code sees its commands
+        - Motors are found by the ID in their control table: after a write of the ID or a factory reset,
+          bus.motor(new_id) is the same motor
+
+    Timing (timing=True)
+        - Every byte on the wire takes 10 bits / baudrate (instruction and status packets)
+        - Each motor waits its Return Delay Time (2 us per unit) before its Status Packet
+        - In a Bulk Read, each motor answers after the previous one, as on a real bus: a motor that does not
+          answer silences the motors after it
+        - The simulator thread sleeps through the delays (it never spins), so it does not hold the GIL of the
+          process it shares with the driver under test; a reply may come some tens of microseconds late
+
+    Faults (FaultInjector)
+        - Dropped bytes, broken checksums, no reply, and status error bits, at given probabilities
+
+
+"""
+
+import os
+import tty
+import time
+import random
+import select
+import threading
+from dxl_addr_table_p1 import *
+
+CONTROL_TABLE_SIZE = 74
+
+MX106_MODEL_NUMBER = 320
+MX106_FIRMWARE_VERSION = 41
+
+
+def status_packet(motor_id, error, params=b''):
+    """
+    0xFF 0xFF ID Length Error Param1 ... ParamN Checksum
+    """
+    packet = bytearray((0xFF, 0xFF, motor_id, len(params) + 2, error))
+    packet.extend(params)
+    packet.append(255 - (sum(packet[2:]) & 0xFF))
+    return packet
+
+
+def wait(seconds):
+    """
+    Sleep for the given time (nothing for a negative one)
+
+    The simulator shares the process, and the GIL, with the driver under test: it must not spin. sleep() wakes
+    up some tens of microseconds late, the delays of a reply are therefore summed up to absolute deadlines
+    (see VirtualDXLBus) so that the late wake ups do not add up within a Bulk Read.
+    """
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+class VirtualMotor(object):
+    """
+    One simulated MX-106 with its control table
+    """
+
+    def __init__(self, motor_id, model_number=MX106_MODEL_NUMBER, firmware_version=MX106_FIRMWARE_VERSION):
+        self.model_number = model_number
+        self.firmware_version = firmware_version
+        self.table = bytearray(CONTROL_TABLE_SIZE)
+        self.registered = None
+        self.factory_reset()
+        self.table[DXL_MOTOR_ID] = motor_id
+
+    @property
+    def motor_id(self):
+        return self.table[DXL_MOTOR_ID]
+
+    def set_word(self, address, value):
+        self.table[address] = value & 0xFF
+        self.table[address + 1] = (value >> 8) & 0xFF
+
+    def word(self, address):
+        return self.table[address] | (self.table[address + 1] << 8)
+
+    def factory_reset(self):
+        """
+        EEPROM and RAM back to factory defaults, ID 1 and 57600 bps as on a real motor
+        """
+        table = self.table
+        table[:] = bytes(CONTROL_TABLE_SIZE)
+        self.set_word(DXL_MODEL_NUMBER_L, self.model_number)
+        table[DXL_FIRMWARE_VERSION] = self.firmware_version
+        table[DXL_MOTOR_ID] = 1
+        table[DXL_BAUD_RATE] = 34
+        table[DXL_RETURN_DELAY_TIME] = 250
+        self.set_word(DXL_CW_ANGLE_LIMIT_L, 0)
+        self.set_word(DXL_CCW_ANGLE_LIMIT_L, 4095)
+        table[DXL_HIGH_LIMIT_TEMP] = 80
+        table[DXL_LOW_LIMIT_VOLTAGE] = 60
+        table[DXL_HIGH_LIMIT_VOLTAGE] = 160
+        self.set_word(DXL_MAX_TORQUE_L, 1023)
+        table[DXL_STATUS_RETURN_LEVEL] = 2
+        table[DXL_ALARM_LED] = 36
+        table[DXL_ALARM_SHUTDOWN] = 36
+        table[DXL_RESOLUTION_DIVIDER] = 1
+        self.reboot()
+
+    def reboot(self):
+        """
+        RAM back to its power on values, EEPROM is kept
+        """
+        table = self.table
+        table[DXL_TORQUE_ENABLE:] = bytes(CONTROL_TABLE_SIZE - DXL_TORQUE_ENABLE)
+        table[DXL_P_GAIN] = 32
+        self.set_word(DXL_PRESENT_POSITION_L, 2048)
+        self.set_word(DXL_GOAL_POSITION_L, 2048)
+        self.set_word(DXL_TORQUE_LIMIT_L, self.word(DXL_MAX_TORQUE_L))
+        table[DXL_PRESENT_VOLTAGE] = 120
+        table[DXL_PRESENT_TEMPERATURE] = 32
+        table[DXL_PUNCH_L] = 32
+        self.set_word(DXL_CURRENT_L, 2048)
+        self.registered = None
+
+    def read(self, address, length):
+        if address + length > CONTROL_TABLE_SIZE:
+            return None
+        return bytes(self.table[address:address + length])
+
+    def write(self, address, data):
+        """
+        :return: Error bits of the write
+        """
+        if address + len(data) > CONTROL_TABLE_SIZE:
+            return DXL_ERROR_RANGE
+        self.table[address:address + len(data)] = data
+        end = address + len(data)
+        if address <= DXL_GOAL_POSITION_H and end > DXL_GOAL_POSITION_L:
+            # Ideal servo: the motor is where it was told to be
+            self.table[DXL_PRESENT_POSITION_L:DXL_PRESENT_POSITION_H + 1] = \
+                self.table[DXL_GOAL_POSITION_L:DXL_GOAL_POSITION_H + 1]
+        return 0
+
+    def return_delay(self):
+        return self.table[DXL_RETURN_DELAY_TIME] * 2e-6
+
+    def replies_to(self, instruction):
+        level = self.table[DXL_STATUS_RETURN_LEVEL]
+        if instruction == DXL_PING:
+            return True
+        if instruction in (DXL_READ_DATA, DXL_BULK_READ):
+            return level >= 1
+        return level >= 2
+
+
+class FaultInjector(object):
+    """
+    Random faults applied to Status Packets
+
+    :param drop_byte: probability that one byte of a status packet is lost
+    :param bad_checksum: probability that the checksum of a status packet is wrong
+    :param no_reply: probability that a motor does not answer at all
+    :param error_bits: error bits set in every status packet (or {motor_id: bits})
+    :param seed: random seed, for repeatable runs
+    """
+
+    def __init__(self, drop_byte=0.0, bad_checksum=0.0, no_reply=0.0, error_bits=0, seed=None):
+        self.drop_byte = drop_byte
+        self.bad_checksum = bad_checksum
+        self.no_reply = no_reply
+        self.error_bits = error_bits
+        self.random = random.Random(seed)
+        self.injected = {'drop_byte': 0, 'bad_checksum': 0, 'no_reply': 0}
+
+    def error_for(self, motor_id):
+        if isinstance(self.error_bits, dict):
+            return self.error_bits.get(motor_id, 0)
+        return self.error_bits
+
+    def apply(self, packet):
+        """
+        :return: the (possibly broken) packet, or None if it is not sent
+        """
+        rnd = self.random.random
+        if self.no_reply and rnd() < self.no_reply:
+            self.injected['no_reply'] += 1
+            return None
+        if self.bad_checksum and rnd() < self.bad_checksum:
+            packet[-1] ^= 0x5A
+            self.injected['bad_checksum'] += 1
+        if self.drop_byte and rnd() < self.drop_byte:
+            del packet[self.random.randrange(len(packet))]
+            self.injected['drop_byte'] += 1
+        return packet
+
+
+class VirtualDXLBus(object):
+    """
+    Simulated Protocol 1.0 bus on a pseudo-terminal
+
+    :param motor_ids: IDs of the simulated motors
+    :param baudrate: Bus speed used for the byte timing
+    :param timing: Model transmission time and return delay time
+    :param faults: FaultInjector, or None
+    """
+
+    def __init__(self, motor_ids, baudrate=1000000, timing=True, faults=None):
+        self.all_motors = [VirtualMotor(motor_id) for motor_id in motor_ids]
+        self.motors = {}
+        self.refresh_ids()
+        self.baudrate = baudrate
+        self.timing = timing
+        self.faults = faults
+        self.instructions = 0
+        self.checksum_errors = 0
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name='dxl-simulator')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def motor(self, motor_id):
+        """
+        The motor which currently has the ID motor_id
+        """
+        return self.motors[motor_id]
+
+    def refresh_ids(self):
+        """
+        Key the motors by the ID in their control table, after writes of the ID, factory resets and reboots.
+        Two motors with the same ID (ex) both reset to ID 1) answer as one, the last one wins.
+        """
+        self.motors = dict([(motor.motor_id, motor) for motor in self.all_motors])
+
+    def byte_time(self, n_bytes):
+        return n_bytes * 10.0 / self.baudrate
+
+    def __run(self):
+        while self.running:
+            ready = select.select([self.master], [], [], 0.05)[0]
+            if not ready:
+                continue
+            try:
+                received = os.read(self.master, 4096)
+            except OSError:
+                break
+            self._buffer.extend(received)
+            arrival = time.monotonic()
+            for packet in self.__instruction_packets():
+                # Deadlines from the arrival of the bytes, a late wake up does not delay the next reply
+                deadline = arrival + self.byte_time(len(packet))
+                if self.timing:
+                    wait(deadline - time.monotonic())
+                with self.lock:
+                    replies = self.handle(packet)
+                for delay, reply in replies:
+                    deadline += delay + self.byte_time(len(reply))
+                    if self.timing:
+                        wait(deadline - time.monotonic())
+                    os.write(self.master, bytes(reply))
+                arrival = max(deadline, time.monotonic())
+
+    def __instruction_packets(self):
+        """
+        Cut complete instruction packets out of the receive buffer, resynchronizing on the header
+        """
+        buf = self._buffer
+        packets = []
+        while True:
+            idx = buf.find(b'\xff\xff')
+            if idx < 0:
+                del buf[:-1 if buf.endswith(b'\xff') else len(buf)]
+                return packets
+            del buf[:idx]
+            if len(buf) < 4:
+                return packets
+            if buf[2] == 0xFF:
+                del buf[:1]
+                continue
+            end = buf[3] + 4
+            if len(buf) < end:
+                return packets
+            packets.append(bytes(buf[:end]))
+            del buf[:end]
+
+    def handle(self, packet):
+        """
+        Execute one instruction packet
+
+        :return: [(delay before the reply, status packet), ...]
+        """
+        replies = self.__execute(packet)
+        # A write of the ID, a factory reset or a reboot moves the motor to another ID
+        self.refresh_ids()
+        return replies
+
+    def __execute(self, packet):
+        self.instructions += 1
+        motor_id, length, instruction = packet[2], packet[3], packet[4]
+        params = packet[5:-1]
+        broadcast = motor_id == DXL_BROADCAST_ID
+
+        if (sum(packet[2:]) & 0xFF) != 0xFF:
+            self.checksum_errors += 1
+            motor = self.motors.get(motor_id)
+            if motor is None or not motor.replies_to(instruction):
+                return []
+            return self.__reply(motor, DXL_ERROR_CHECKSUM, b'')
+
+        if instruction == DXL_BULK_READ:
+            return self.__bulk_read(params)
+        if instruction == DXL_SYNC_WRITE:
+            self.__sync_write(params)
+            return []
+
+        targets = list(self.motors.values()) if broadcast else [self.motors.get(motor_id)]
+        replies = []
+        for motor in targets:
+            if motor is None:
+                continue
+            error = 0
+            data = b''
+            if instruction == DXL_PING:
+                pass
+            elif instruction == DXL_READ_DATA and len(params) == 2:
+                data = motor.read(params[0], params[1])
+                if data is None:
+                    error, data = DXL_ERROR_RANGE, b''
+            elif instruction == DXL_WRITE_DATA and len(params) >= 2:
+                error = motor.write(params[0], params[1:])
+            elif instruction == DXL_REG_WRITE and len(params) >= 2:
+                motor.registered = (params[0], bytes(params[1:]))
+                motor.table[DXL_REGISTERED] = 1
+            elif instruction == DXL_ACTION:
+                if motor.registered is None:
+                    error = DXL_ERROR_INSTRUCTION
+                else:
+                    motor.write(*motor.registered)
+                    motor.registered = None
+                    motor.table[DXL_REGISTERED] = 0
+            elif instruction == DXL_RESET:
+                motor.factory_reset()
+            elif instruction == DXL_REBOOT:
+                motor.reboot()
+            else:
+                error = DXL_ERROR_INSTRUCTION
+
+            if not broadcast and motor.replies_to(instruction):
+                replies.extend(self.__reply(motor, error, data))
+        return replies
+
+    def __reply(self, motor, error, data):
+        if self.faults is not None:
+            error |= self.faults.error_for(motor.motor_id)
+        packet = status_packet(motor.motor_id, error, data)
+        if self.faults is not None:
+            packet = self.faults.apply(packet)
+            if packet is None:
+                return []
+        return [(motor.return_delay(), packet)]
+
+    def __sync_write(self, params):
+        if len(params) < 2:
+            return
+        address, data_length = params[0], params[1]
+        for idx in range(2, len(params) - data_length, data_length + 1):
+            motor = self.motors.get(params[idx])
+            if motor is not None:
+                motor.write(address, params[idx + 1:idx + 1 + data_length])
+
+    def __bulk_read(self, params):
+        replies = []
+        for idx in range(1, len(params) - 2, 3):
+            length, motor_id, address = params[idx], params[idx + 1], params[idx + 2]
+            motor = self.motors.get(motor_id)
+            if motor is None or not motor.replies_to(DXL_BULK_READ):
+                # The next motor waits for a packet which never comes, and so does every motor after it
+                break
+            data = motor.read(address, length)
+            reply = self.__reply(motor, DXL_ERROR_RANGE if data is None else 0, b'' if data is None else data)
+            if not reply:
+                break
+            replies.extend(reply)
+        return replies
@@ -0,0 +1,246 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Staged commit: register updates of several motors which take effect at the same moment
+
+    Individual WRITEs start the motors one after another, one round trip apart. Here the updates are staged:
+
+        MODE_ACTION     REG_WRITE to every motor, each one acknowledged by its Status Packet (or, for motors
+                        with Status Return Level 1, by reading back Registered Instruction), then one ACTION
+                        to DXL_BROADCAST_ID releases all of them with a single packet
+        MODE_AUTO       one SYNC_WRITE packet when every motor updates the same address and length and they fit
+                        in one packet (all motors take the same packet, nothing to stage, but no acknowledgement);
+                        MODE_ACTION otherwise
+
+    A motor holds one registered write, so the bytes staged for a motor must form one contiguous range.
+
+    If a staging is not acknowledged, nothing is released. The motors which did register their write, and the
+    ones whose Status Packet did not come (their REG_WRITE may have arrived), get a REG_WRITE of the current
+    values of the same range instead, so that a later broadcast ACTION (of the next commit) does not apply a
+    part of this one.
+
+    EX)
+        staged = StagedCommit(dxl)
+        for motor_id in arm_ids:
+            staged.stage(motor_id, DXL_GOAL_POSITION_L, GOAL_POSITION.encode(goal[motor_id]))
+        staged.stage(gripper_id, DXL_TORQUE_LIMIT_L, TORQUE_LIMIT.encode(512))
+        report = staged.commit()
+        if not report.committed:
+            print('not acknowledged:', report.failed)
+
+    CommitReport
+        staging_time        first REG_WRITE to the last acknowledgement
+        release_time        commit() start to the end of the release packet (ACTION or SYNC_WRITE)
+        sequential_skew     first to last acknowledgement: the start skew of the same updates sent as WRITEs
+
+
+"""
+
+import time
+from dxl_addr_table_p1 import *
+from dxl_control_table_p1 import MotorShadow, CONTROL_TABLE_SIZE, WRITE_REJECTED
+from dxl_packet_generator_p1 import sync_write_capacity
+from dxl_stats import Histogram
+
+MODE_ACTION = 'action'
+MODE_AUTO = 'auto'
+
+
+class CommitReport(object):
+    """
+    Result of one StagedCommit.commit()
+
+    mode: 'action' or 'sync_write'
+    acknowledged: {motor_id: True / False}, None per motor for SYNC_WRITE (no Status Packet)
+    failed: motors whose staging was not acknowledged
+    pending: motors which may still hold a registered write of an aborted commit
+    """
+    __slots__ = ('mode', 'committed', 'acknowledged', 'failed', 'pending', 'packets', 'staging_time',
+                 'release_time', 'sequential_skew')
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.committed = False
+        self.acknowledged = {}
+        self.failed = []
+        self.pending = []
+        self.packets = 0
+        self.staging_time = 0.0
+        self.release_time = None
+        self.sequential_skew = 0.0
+
+    def __repr__(self):
+        return 'CommitReport(mode=%s, committed=%s, motors=%d, failed=%s, packets=%d, staging=%.1fus, ' \
+               'sequential_skew=%.1fus)' % (self.mode, self.committed, len(self.acknowledged), self.failed,
+                                           self.packets, self.staging_time * 1e6, self.sequential_skew * 1e6)
+
+
+class StagedCommit(object):
+    """
+    :param dxl: DXLPacketGenP1
+    :param mode: MODE_AUTO or MODE_ACTION
+    :param clock: Time source of the report, in seconds
+
+    Statistics
+        commits, aborted: commit() calls released / not released
+        staging_time, sequential_skew: Histogram over the released commits
+    """
+
+    def __init__(self, dxl, mode=MODE_AUTO, clock=time.perf_counter):
+        if mode not in (MODE_AUTO, MODE_ACTION):
+            raise ValueError('mode must be MODE_AUTO or MODE_ACTION')
+        self.dxl = dxl
+        self.mode = mode
+        self.clock = clock
+        self.pending = {}
+        self.free = []
+
+        self.commits = 0
+        self.aborted = 0
+        self.staging_time = Histogram()
+        self.sequential_skew = Histogram()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def stage(self, motor_id, address, data):
+        """
+        Queue an update, same arguments as DXLPacketGenP1.write_data; a later update of the same byte replaces it
+        """
+        end = address + len(data)
+        if end > CONTROL_TABLE_SIZE:
+            raise ValueError('Write of %d bytes at address %d is outside the Control Table' % (len(data), address))
+        image = self.pending.get(motor_id)
+        if image is None:
+            image = self.pending[motor_id] = self.free.pop() if self.free else MotorShadow()
+        image.table[address:end] = data
+        image.dirty[address:end] = b'\x01' * len(data)
+
+    def ranges(self):
+        """
+        :return: {motor_id: (address, length)} of the staged updates
+        """
+        ranges = {}
+        for motor_id, image in self.pending.items():
+            dirty = image.dirty_ranges()
+            if len(dirty) != 1:
+                raise ValueError('Motor %d holds one registered write, its staged bytes must be contiguous: %s'
+                                 % (motor_id, dirty))
+            ranges[motor_id] = dirty[0]
+        return ranges
+
+    def commit(self):
+        """
+        Stage and release the queued updates
+
+        :return: CommitReport
+        """
+        ranges = self.ranges()
+        if not ranges:
+            return CommitReport(MODE_ACTION)
+        layouts = set(ranges.values())
+        if self.mode == MODE_AUTO and len(layouts) == 1:
+            address, length = next(iter(layouts))
+            if len(ranges) <= sync_write_capacity(length):
+                report = self.__sync_write(ranges, address, length)
+                self.clear()
+                return report
+        report = self.__action(ranges)
+        self.clear()
+        return report
+
+    def __sync_write(self, ranges, address, length):
+        report = CommitReport('sync_write')
+        start = self.clock()
+        end = address + length
+        total_data = tuple([(motor_id, ) + tuple(self.pending[motor_id].table[address:end]) for motor_id in ranges])
+        report.packets = self.dxl.sync_write(address, total_data)
+        report.release_time = self.clock() - start
+        report.acknowledged = dict.fromkeys(ranges)
+        report.committed = True
+        self.commits += 1
+        return report
+
+    def __action(self, ranges):
+        dxl = self.dxl
+        clock = self.clock
+        report = CommitReport(MODE_ACTION)
+        start = clock()
+        first_ack = last_ack = None
+        # Not acknowledged, but the REG_WRITE may have arrived
+        uncertain = []
+        for motor_id, (address, length) in ranges.items():
+            data = bytes(self.pending[motor_id].table[address:address + length])
+            status = dxl.reg_write(motor_id, address, data)
+            report.packets += 1
+            if status is not None:
+                ok = not status.error & WRITE_REJECTED
+            elif not dxl.reply_expected(motor_id, DXL_REG_WRITE) and dxl.reply_expected(motor_id, DXL_READ_DATA):
+                # Status Return Level 1: REG_WRITE is not answered, Registered Instruction tells if it arrived
+                registered = dxl.read_data(motor_id, DXL_REGISTERED, 1)
+                report.packets += 1
+                ok = registered is not None and len(registered.params) == 1 and registered.params[0] == 1
+                if registered is None:
+                    uncertain.append(motor_id)
+            else:
+                ok = False
+                uncertain.append(motor_id)
+            report.acknowledged[motor_id] = ok
+            if ok:
+                now = clock()
+                first_ack = now if first_ack is None else first_ack
+                last_ack = now
+            else:
+                report.failed.append(motor_id)
+        report.staging_time = clock() - start
+        if first_ack is not None:
+            report.sequential_skew = last_ack - first_ack
+
+        if report.failed:
+            self.aborted += 1
+            for motor_id, ok in report.acknowledged.items():
+                if (ok or motor_id in uncertain) and not self.__unstage(motor_id, ranges[motor_id], report):
+                    report.pending.append(motor_id)
+            return report
+        dxl.action(DXL_BROADCAST_ID)
+        report.packets += 1
+        report.release_time = clock() - start
+        report.committed = True
+        self.commits += 1
+        self.staging_time.record(report.staging_time)
+        self.sequential_skew.record(report.sequential_skew)
+        return report
+
+    def __unstage(self, motor_id, address_length, report):
+        """
+        Replace the registered write of an aborted commit by the current values of its range
+        """
+        address, length = address_length
+        current = self.dxl.read_data(motor_id, address, length)
+        report.packets += 1
+        if current is None or len(current.params) != length:
+            return False
+        status = self.dxl.reg_write(motor_id, address, current.params)
+        report.packets += 1
+        if status is None:
+            return not self.dxl.reply_expected(motor_id, DXL_REG_WRITE)
+        return not status.error & WRITE_REJECTED
+
+    def clear(self):
+        """
+        Drop the staged updates without sending them
+        """
+        for image in self.pending.values():
+            image.invalidate()
+            self.free.append(image)
+        self.pending.clear()
+
+    def statistics(self):
+        return {
+            'commits': self.commits,
+            'aborted': self.aborted,
+            'staging_time': self.staging_time.snapshot(),
+            'sequential_skew': self.sequential_skew.snapshot(),
+        }
@@ -0,0 +1,80 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Fixed bucket histograms for timing statistics
+
+    Recording a value is one bisect over the bucket edges and a few integer updates; no container grows,
+    only the int and float objects of the counters are replaced, so a histogram can stay enabled inside a
+    1 kHz control loop.
+
+    Values are in seconds. The default edges go from 1 us to 100 ms (1, 2, 5 steps);
+    the last bucket counts everything above the last edge.
+
+
+"""
+
+from bisect import bisect_left
+
+DEFAULT_EDGES = tuple([scale * step for scale in (1e-6, 1e-5, 1e-4, 1e-3, 1e-2) for step in (1, 2, 5)] + [0.1])
+
+
+class Histogram(object):
+    """
+    Histogram with fixed upper bucket edges
+
+    counts[i] is the number of values v with edges[i - 1] < v <= edges[i], counts[-1] the values above edges[-1]
+    """
+
+    def __init__(self, edges=DEFAULT_EDGES):
+        self.edges = tuple(edges)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        self.counts[bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent):
+        """
+        Upper edge of the bucket holding the given percentile (the maximum for the overflow bucket)
+        """
+        if not self.count:
+            return None
+        rank = self.count * percent / 100.0
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.edges[idx] if idx < len(self.edges) else self.max
+        return self.max
+
+    def snapshot(self):
+        """
+        Plain dictionary of the current values, for logging or JSON
+        """
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'edges': list(self.edges),
+            'counts': list(self.counts),
+        }
@@ -0,0 +1,200 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Streaming Status Packet parser for Protocol 1.0
+
+    - Status Packet Structure
+        Header 1    Header 2    ID  Length  Error   Param1  ...     ParamN  Checksum
+        0xFF        0xFF        ID  N + 2   Error   Param1  ...     ParamN  CHKSUM
+
+    Bytes from the serial port are fed into one receive buffer that is allocated once and reused.
+    The parser searches the header (0xFF 0xFF), checks the Length and the Checksum, and drops bytes
+    one at a time until a valid packet lines up again. Line noise therefore costs the packet it hits,
+    not every following packet.
+
+    Consumed bytes are released by moving the read index; the unread tail is moved to the front only
+    when the free space at the end runs out, so a packet is always contiguous in the buffer.
+
+
+"""
+
+from dxl_addr_table_p1 import DXL_ERROR_INPUT_VOLTAGE, DXL_ERROR_ANGLE_LIMIT, DXL_ERROR_OVERHEATING, DXL_ERROR_RANGE, \
+    DXL_ERROR_CHECKSUM, DXL_ERROR_OVERLOAD, DXL_ERROR_INSTRUCTION, DXL_ERROR_NAMES
+
+
+class StatusPacket(object):
+    """
+    Decoded Status Packet
+
+    motor_id: ID of the Dynamixel which sent the packet
+    error: Error byte, see dxl_addr_table_p1 (Bit6 Instruction ... Bit0 Input Voltage)
+    params: Param1 ... ParamN as bytes
+
+    The error bits are decoded on access (status.overload_error, status.errors ...), and byte() / word() /
+    view() read the parameters in place, without slicing a copy.
+    """
+    __slots__ = ('motor_id', 'error', 'params')
+
+    def __init__(self, motor_id, error, params):
+        self.motor_id = motor_id
+        self.error = error
+        self.params = params
+
+    def __repr__(self):
+        return 'StatusPacket(motor_id=%d, error=0x%02X, params=%s)' % (self.motor_id, self.error, list(self.params))
+
+    @property
+    def ok(self):
+        return not self.error
+
+    input_voltage_error = property(lambda self: bool(self.error & DXL_ERROR_INPUT_VOLTAGE))
+    angle_limit_error = property(lambda self: bool(self.error & DXL_ERROR_ANGLE_LIMIT))
+    overheating_error = property(lambda self: bool(self.error & DXL_ERROR_OVERHEATING))
+    range_error = property(lambda self: bool(self.error & DXL_ERROR_RANGE))
+    checksum_error = property(lambda self: bool(self.error & DXL_ERROR_CHECKSUM))
+    overload_error = property(lambda self: bool(self.error & DXL_ERROR_OVERLOAD))
+    instruction_error = property(lambda self: bool(self.error & DXL_ERROR_INSTRUCTION))
+
+    @property
+    def errors(self):
+        """
+        Names of the error bits which are set, ex) ('overheating', 'overload')
+        """
+        error = self.error
+        if not error:
+            return ()
+        return tuple([name for bit, name in enumerate(DXL_ERROR_NAMES) if error >> bit & 1])
+
+    def byte(self, offset=0):
+        return self.params[offset]
+
+    def word(self, offset=0):
+        """
+        Little endian 2 byte value at offset, ex) status.word() for a read of Present Position
+        """
+        params = self.params
+        return params[offset] | (params[offset + 1] << 8)
+
+    def view(self, start=0, end=None):
+        """
+        memoryview of the parameters, slicing it does not copy
+        """
+        return memoryview(self.params)[start:end]
+
+
+class StatusParser(object):
+    """
+    Resynchronizing Status Packet parser with a reusable receive buffer
+
+        parser.feed(ser.read(n))
+        packet = parser.next_packet()   # StatusPacket, or None when more bytes are needed
+
+    dropped_bytes: bytes discarded while searching for a valid header
+    checksum_errors: packets with a valid header whose checksum did not match
+    needed: after next_packet returned None, the number of bytes still missing for the pending packet
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+        self.needed = 6
+        self.dropped_bytes = 0
+        self.checksum_errors = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def reset(self):
+        """
+        Discard all buffered bytes, for example after a new instruction packet is sent
+        """
+        self.start = 0
+        self.end = 0
+        self.needed = 6
+
+    def feed(self, data):
+        """
+        Append received bytes to the receive buffer
+        """
+        n_data = len(data)
+        if n_data >= self.capacity:
+            # Only the newest bytes fit
+            self.dropped_bytes += self.end - self.start + n_data - self.capacity
+            data = data[n_data - self.capacity:]
+            n_data = self.capacity
+            self.start = 0
+            self.end = 0
+        elif self.end + n_data > self.capacity:
+            # Move the unread tail to the front, dropping the oldest bytes if it still does not fit
+            overflow = self.end - self.start + n_data - self.capacity
+            if overflow > 0:
+                self.dropped_bytes += overflow
+                self.start += overflow
+            unread = self.end - self.start
+            self.buffer[0:unread] = self.buffer[self.start:self.end]
+            self.start = 0
+            self.end = unread
+        self.buffer[self.end:self.end + n_data] = data
+        self.end += n_data
+
+    def next_packet(self):
+        """
+        Parse the next valid Status Packet from the receive buffer
+
+        :return: StatusPacket, or None when the buffer holds no complete packet
+        """
+        buf = self.buffer
+        start = self.start
+        end = self.end
+        while True:
+            idx = buf.find(b'\xff\xff', start, end)
+            if idx < 0:
+                # Keep a trailing 0xFF, it can be the first byte of the next header
+                keep = 1 if end > start and buf[end - 1] == 0xFF else 0
+                self.dropped_bytes += end - start - keep
+                self._release(end - keep, 6 - keep)
+                return None
+            self.dropped_bytes += idx - start
+            start = idx
+            if end - start < 4:
+                self._release(start, 6 - (end - start))
+                return None
+
+            motor_id = buf[start + 2]
+            length = buf[start + 3]
+            if motor_id == 0xFF or length < 2:
+                # 0xFF 0xFF 0xFF ... or an impossible Length, the header is one byte further
+                start += 1
+                self.dropped_bytes += 1
+                continue
+            packet_end = start + length + 4
+            if packet_end > end:
+                if packet_end - start > self.capacity:
+                    start += 1
+                    self.dropped_bytes += 1
+                    continue
+                self._release(start, packet_end - end)
+                return None
+
+            # ~(ID + Length + Error + Params) == Checksum  <=>  ID + Length + Error + Params + Checksum == 0xFF
+            if (sum(buf[start + 2:packet_end]) & 0xFF) != 0xFF:
+                self.checksum_errors += 1
+                start += 1
+                self.dropped_bytes += 1
+                continue
+
+            packet = StatusPacket(motor_id, buf[start + 4], bytes(buf[start + 5:packet_end - 1]))
+            self._release(packet_end, 6)
+            return packet
+
+    def _release(self, start, needed):
+        if start >= self.end:
+            self.start = 0
+            self.end = 0
+        else:
+            self.start = start
+        self.needed = needed
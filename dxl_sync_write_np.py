@@ -0,0 +1,111 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Vectorized Sync Write encoder for Protocol 1.0 (NumPy)
+
+    Header 1    Header 2    ID      Length          Instruction     Param1      Param2  Param3 ...
+    0xFF        0xFF        0xFE    N * (L + 1) + 4 0x83            Address     L       [ID  Data1 ... DataL] * N   CHKSUM
+
+    The N * (L + 1) parameter bytes are viewed as a packed record array, one record per Dynamixel:
+        [('id', u1), ('v0', <u2), ('v1', <u2), ...]
+    so assigning a whole value array to a field splits it into Low/High bytes, interleaves it with the IDs
+    and writes it into the packet in one C-level operation. The checksum is one sum over the packet.
+
+    EX) Goal Position and Moving Speed of 100 motors
+        encoder = SyncWriteEncoder(DXL_GOAL_POSITION_L, motor_ids, ('<u2', '<u2'))
+        packet = encoder.encode(goal_position, moving_speed)
+
+
+"""
+
+import numpy as np
+from dxl_addr_table_p1 import *
+
+
+# Longest instruction packet sent at once, see dxl_addr_table_p1
+MAX_PACKET_SIZE = DXL_MAX_PACKET_SIZE
+
+
+def column_dtype(values):
+    """
+    Little endian dtype of one value column: 1 and 2 byte integer arrays keep their type, anything else is sent
+    as uint16 (Protocol 1.0 registers are at most 2 bytes wide)
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is None or dtype.kind not in 'iu' or dtype.itemsize > 2:
+        return np.dtype('<u2')
+    return dtype.newbyteorder('<')
+
+
+class SyncWriteEncoder(object):
+    """
+    Preallocated Sync Write packets for N Dynamixels and a fixed register layout
+
+    When N * (L + 1) + 8 is larger than MAX_PACKET_SIZE, the Dynamixels are split over several Sync Write
+    packets, which are laid out back to back in one buffer and sent with a single write.
+
+    :param control_address: Start address, ex) DXL_GOAL_POSITION_L
+    :param motor_ids: IDs of the Dynamixels, in packet order
+    :param dtypes: dtype of each value column written from control_address on, ex) ('<u2', '<u2')
+                   for Goal Position and Moving Speed. Widths of all columns add up to the Data Length L.
+    """
+
+    def __init__(self, control_address, motor_ids, dtypes=('<u2', )):
+        motor_ids = np.asarray(motor_ids, dtype=np.uint8)
+        self.n_motors = len(motor_ids)
+        self.record = np.dtype([('id', 'u1')] + [('v%d' % idx, np.dtype(dtype).newbyteorder('<'))
+                                                 for idx, dtype in enumerate(dtypes)])
+        self.fields = self.record.names[1:]
+        data_length = self.record.itemsize - 1
+        per_packet = (MAX_PACKET_SIZE - 8) // self.record.itemsize
+
+        # Header, Length, Instruction, Address, L of every packet are written once
+        n_packets = max(1, -(-self.n_motors // per_packet))
+        self.buffer = np.zeros(8 * n_packets + self.n_motors * self.record.itemsize, dtype=np.uint8)
+        self.packets = []
+        offset = 0
+        for lo in range(0, max(self.n_motors, 1), per_packet):
+            hi = min(lo + per_packet, self.n_motors)
+            size = 8 + (hi - lo) * self.record.itemsize
+            packet = self.buffer[offset:offset + size]
+            packet[0:7] = (0xFF, 0xFF, DXL_BROADCAST_ID, (hi - lo) * (data_length + 1) + 4,
+                           DXL_SYNC_WRITE, control_address, data_length)
+            records = packet[7:-1].view(self.record)
+            records['id'] = motor_ids[lo:hi]
+            self.packets.append((lo, hi, packet, records))
+            offset += size
+
+    def set_ids(self, motor_ids):
+        for lo, hi, packet, records in self.packets:
+            records['id'] = motor_ids[lo:hi]
+
+    def encode(self, *columns):
+        """
+        Write the value columns into the packets and update the checksums
+
+        Float values are rounded; values out of range of the column dtype wrap around, as with ndarray.astype.
+
+        :param columns: One array of N values per dtype given to the constructor
+        :return: uint8 ndarray of all packets, owned by the encoder (write buffer.data to the port)
+        """
+        columns = [np.rint(values) if values.dtype.kind == 'f' else values
+                   for values in [np.asarray(values) for values in columns]]
+        fields = self.fields
+        for lo, hi, packet, records in self.packets:
+            for field, values in zip(fields, columns):
+                records[field] = values[lo:hi]
+            # Checksum = ~(ID + Length + Instruction + Params) & 0xFF
+            packet[-1] = 255 - (int(packet[2:-1].sum(dtype=np.uint32)) & 0xFF)
+        return self.buffer
+
+
+def encode_sync_write(control_address, motor_ids, *columns):
+    """
+    One-off Sync Write packets; the dtype of each column follows column_dtype
+
+    :return: uint8 ndarray of all packets
+    """
+    encoder = SyncWriteEncoder(control_address, motor_ids, [column_dtype(values) for values in columns])
+    return encoder.encode(*columns)
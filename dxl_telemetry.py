@@ -0,0 +1,248 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Joint state telemetry in a memory mapped ring file
+
+    The control loop writes one record per cycle straight into a file mapped with NumPy; other processes map
+    the same file read-only and see the samples as NumPy arrays, without pipes, pickling or Python objects
+    per sample. Nothing is allocated per record, so logging at 1 kHz does not feed the garbage collector.
+
+    File layout (little endian)
+        0       header: magic 'DXLTLM1', version, capacity, record size, schema size, count
+        64      schema: JSON {motor_ids, registers, address, length}
+        4096    capacity records, record i holds sample count - capacity + i ... (a ring)
+
+    Record
+        t           float64, time of the sample (time.monotonic() by default)
+        valid       uint8[N], 1 where the motor answered
+        <register>  one column per register of the block, raw values [N] (see int_byte_table for SI units)
+
+    count is written after the record, so a reader takes count first and copies the records up to count;
+    if count has moved more than capacity - n records meanwhile, the copy was overwritten and is read again.
+
+    EX) writer, in the control loop
+        recorder = TelemetryRecorder('/dev/shm/joints.tlm', motor_ids)
+        recorder.record_bulk(dxl.bulk_read(FEEDBACK_BLOCK.address, FEEDBACK_BLOCK.length, motor_ids))
+
+        reader, in another process
+        reader = TelemetryReader('/dev/shm/joints.tlm')
+        samples = reader.latest(1000)           # last second at 1 kHz
+        position = samples['PRESENT_POSITION']  # (1000, N) raw ticks
+        si = reader.to_si(samples)              # {'PRESENT_POSITION': rad, ...}
+
+
+"""
+
+import json
+import time
+import numpy as np
+from int_byte_table import RegisterBlock, FEEDBACK_BLOCK, register
+
+MAGIC = b'DXLTLM1'
+VERSION = 1
+SCHEMA_OFFSET = 64
+DATA_OFFSET = 4096
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('capacity', '<u4'),
+    ('record_size', '<u4'),
+    ('schema_size', '<u4'),
+    ('count', '<u8'),
+])
+
+
+def record_dtype(block, n_motors):
+    """
+    Record of one sample: timestamp, answer mask and one column of N raw values per register
+    """
+    fields = [('t', '<f8'), ('valid', 'u1', (n_motors, ))]
+    for reg in block.registers:
+        fields.append((reg.name, '<' + ('i' if reg.signed else 'u') + str(reg.size), (n_motors, )))
+    return np.dtype(fields)
+
+
+class TelemetryRecorder(object):
+    """
+    Writer of a telemetry ring file
+
+    :param path: File to create (overwritten), ex) on /dev/shm to keep it in memory
+    :param motor_ids: Motors in column order
+    :param block: RegisterBlock of the logged registers, by default Present Position ... Present Temperature
+    :param capacity: Number of records in the ring
+    """
+
+    def __init__(self, path, motor_ids, block=FEEDBACK_BLOCK, capacity=60000, clock=time.monotonic):
+        self.path = path
+        self.motor_ids = list(motor_ids)
+        self.block = block
+        self.capacity = capacity
+        self.clock = clock
+        self.columns = dict([(motor_id, idx) for idx, motor_id in enumerate(self.motor_ids)])
+        self.dtype = record_dtype(block, len(self.motor_ids))
+
+        schema = json.dumps({
+            'motor_ids': self.motor_ids,
+            'registers': list(block.names),
+            'address': block.address,
+            'length': block.length,
+        }).encode()
+        if SCHEMA_OFFSET + len(schema) > DATA_OFFSET:
+            raise ValueError('Telemetry schema does not fit in the file header')
+
+        with open(path, 'wb') as f:
+            f.truncate(DATA_OFFSET + capacity * self.dtype.itemsize)
+        self.file = np.memmap(path, dtype=np.uint8, mode='r+')
+        self.header = self.file[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        self.file[SCHEMA_OFFSET:SCHEMA_OFFSET + len(schema)] = np.frombuffer(schema, dtype=np.uint8)
+        self.records = self.file[DATA_OFFSET:].view(self.dtype)
+        self.header['magic'] = MAGIC
+        self.header['version'] = VERSION
+        self.header['capacity'] = capacity
+        self.header['record_size'] = self.dtype.itemsize
+        self.header['schema_size'] = len(schema)
+        self.header['count'] = 0
+        self.count = 0
+
+        # Scratch buffer of one sample in block layout, decoded into the columns with one record view
+        self.scratch = bytearray(block.length * len(self.motor_ids))
+        self.scratch_records = np.frombuffer(self.scratch, dtype=block.dtype)
+        self.valid = np.zeros(len(self.motor_ids), dtype=np.uint8)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def record(self, params, t=None):
+        """
+        Write one sample
+
+        :param params: Block data per motor in column order (bytes of block.length), None for a missing motor
+        :param t: Sample time, clock() by default
+        """
+        length = self.block.length
+        scratch = self.scratch
+        valid = self.valid
+        for idx, data in enumerate(params):
+            if data is None or len(data) != length:
+                valid[idx] = 0
+                scratch[idx * length:(idx + 1) * length] = bytes(length)
+            else:
+                valid[idx] = 1
+                scratch[idx * length:(idx + 1) * length] = data
+        self.__commit(t)
+
+    def record_bulk(self, result, t=None):
+        """
+        Write one sample from a bulk_read result {motor_id: StatusPacket or None} of the block
+        """
+        length = self.block.length
+        scratch = self.scratch
+        valid = self.valid
+        valid[:] = 0
+        for motor_id, status in result.items():
+            idx = self.columns.get(motor_id)
+            if idx is None or status is None or len(status.params) != length:
+                continue
+            valid[idx] = 1
+            scratch[idx * length:(idx + 1) * length] = status.params
+        self.__commit(t)
+
+    def __commit(self, t):
+        record = self.records[self.count % self.capacity]
+        record['t'] = self.clock() if t is None else t
+        record['valid'] = self.valid
+        scratch_records = self.scratch_records
+        for name in self.block.names:
+            record[name] = scratch_records[name]
+        self.count += 1
+        # Published after the record is complete
+        self.header['count'] = self.count
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+        del self.records, self.header, self.file
+
+
+class TelemetryReader(object):
+    """
+    Read-only view of a telemetry ring file, can be opened while the recorder writes
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = np.memmap(path, dtype=np.uint8, mode='r')
+        self.header = self.file[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        if bytes(self.header['magic'][0]) != MAGIC:
+            raise ValueError('%s is not a telemetry file' % path)
+        if int(self.header['version'][0]) != VERSION:
+            raise ValueError('Unsupported telemetry file version %d' % int(self.header['version'][0]))
+        schema_size = int(self.header['schema_size'][0])
+        self.schema = json.loads(bytes(self.file[SCHEMA_OFFSET:SCHEMA_OFFSET + schema_size]).decode())
+        self.motor_ids = self.schema['motor_ids']
+        self.block = RegisterBlock(self.schema['registers'])
+        self.capacity = int(self.header['capacity'][0])
+        self.dtype = record_dtype(self.block, len(self.motor_ids))
+        if self.dtype.itemsize != int(self.header['record_size'][0]):
+            raise ValueError('Telemetry record layout does not match its schema')
+        # The whole ring, in slot order (no copy)
+        self.records = self.file[DATA_OFFSET:DATA_OFFSET + self.capacity * self.dtype.itemsize].view(self.dtype)
+
+    @property
+    def count(self):
+        return int(self.header['count'][0])
+
+    def latest(self, n=None):
+        """
+        The last n samples (all samples in the ring by default), oldest first
+
+        A view into the file when they do not wrap around the end of the ring, a copy otherwise.
+        A view is only stable while the recorder has not written capacity - n more records.
+        """
+        while True:
+            count = self.count
+            n = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+            samples = self.__ring(count, n)
+            if samples is not None:
+                return samples
+
+    def since(self, count):
+        """
+        Samples recorded after the given count, ex) the count of the previous call for a live plot
+
+        :return: (samples, new count); the samples end at the new count, even if the recorder went on meanwhile
+        """
+        while True:
+            now = self.count
+            samples = self.__ring(now, min(now - count, self.capacity))
+            if samples is not None:
+                return samples, now
+
+    def __ring(self, end, n):
+        """
+        Samples end - n ... end - 1 of the ring, or None if the recorder overwrote them while copying
+        """
+        first = (end - n) % self.capacity
+        if first + n <= self.capacity:
+            return self.records[first:first + n]
+        samples = np.concatenate((self.records[first:], self.records[:first + n - self.capacity]))
+        # Overwritten while copying: the recorder went past the oldest copied record
+        if self.count - end <= self.capacity - n:
+            return samples
+        return None
+
+    def to_si(self, samples):
+        """
+        :return: Dictionary {register name: float array (n, N)} and 't'
+        """
+        si = dict([(name, register(name).to_si(samples[name].astype(np.int64))) for name in self.block.names])
+        si['t'] = samples['t']
+        return si
+
+    def close(self):
+        del self.records, self.header, self.file
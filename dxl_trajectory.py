@@ -0,0 +1,207 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Precomputed multi-joint trajectories, streamed as Sync Write packets
+
+    The whole motion is interpolated with NumPy before it starts (minimum jerk or trapezoidal velocity
+    profiles between waypoints), and the Sync Write packets of every tick are encoded ahead of time into one
+    contiguous buffer: one row per tick, laid out like SyncWriteEncoder (several packets back to back when
+    the motors do not fit in one). Encoding is vectorized over all ticks at once, checksums included.
+
+    During playback a tick is one write of its row: no interpolation, no encoding, no allocation.
+    TrajectoryPlayer is the step of a ControlLoop, so ticks follow absolute deadlines; a tick whose
+    deadline was missed is skipped (OVERRUN_SKIP) and the motion stays on its time line.
+
+        Profile         s(u), u = t / T in [0, 1]
+        minimum jerk    10u^3 - 15u^4 + 6u^5 (zero velocity and acceleration at both ends)
+        trapezoidal     constant acceleration for ramp * T, constant velocity, constant deceleration for ramp * T
+
+    EX) Two joints through three waypoints at 500 Hz, raw Goal Position values
+        positions = through_waypoints([[2048, 2048], [3072, 1024], [2048, 2048]], [1.0, 1.5], 500)
+        trajectory = Trajectory(DXL_GOAL_POSITION_L, [1, 2], [positions], 500)
+        play(dxl, trajectory)
+
+
+"""
+
+import numpy as np
+from dxl_addr_table_p1 import *
+from dxl_sync_write_np import SyncWriteEncoder
+from dxl_control_loop import ControlLoop, OVERRUN_SKIP
+
+
+def minimum_jerk(start, end, duration, rate):
+    """
+    Minimum jerk motion from start to end
+
+    :param start: Positions of N joints at t = 0
+    :param end: Positions at t = duration
+    :param rate: Ticks per second
+    :return: float array (ticks, N), the first row is start and the last one end
+    """
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    u = np.linspace(0.0, 1.0, max(int(round(duration * rate)), 1) + 1)[:, np.newaxis]
+    s = u * u * u * (10.0 - 15.0 * u + 6.0 * u * u)
+    return start + (end - start) * s
+
+
+def trapezoidal(start, end, duration, rate, ramp=0.25):
+    """
+    Trapezoidal velocity profile from start to end, all joints start and stop together
+
+    :param ramp: Fraction of the duration spent accelerating (and again decelerating), 0 < ramp <= 0.5
+    :return: float array (ticks, N)
+    """
+    if not 0.0 < ramp <= 0.5:
+        raise ValueError('ramp must be in (0, 0.5]')
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    u = np.linspace(0.0, 1.0, max(int(round(duration * rate)), 1) + 1)[:, np.newaxis]
+    # Normalized peak velocity, the area under the trapezoid is 1
+    v = 1.0 / (1.0 - ramp)
+    s = np.where(u < ramp, 0.5 * v / ramp * u * u,
+                 np.where(u <= 1.0 - ramp, v * (u - 0.5 * ramp),
+                          1.0 - 0.5 * v / ramp * (1.0 - u) * (1.0 - u)))
+    return start + (end - start) * s
+
+
+def through_waypoints(waypoints, durations, rate, profile=minimum_jerk):
+    """
+    Motion through several waypoints, one profile per segment (the joints stop at every waypoint)
+
+    :param waypoints: (M, N) positions
+    :param durations: M - 1 segment durations in seconds
+    :param profile: minimum_jerk, trapezoidal, or a callable(start, end, duration, rate) of the same kind
+    :return: float array (ticks, N)
+    """
+    waypoints = np.asarray(waypoints, dtype=np.float64)
+    if len(durations) != len(waypoints) - 1:
+        raise ValueError('One duration per segment is needed')
+    segments = [profile(waypoints[idx], waypoints[idx + 1], duration, rate)
+                for idx, duration in enumerate(durations)]
+    # The last row of a segment is the first row of the next one
+    return np.concatenate([segment[:-1] for segment in segments[:-1]] + segments[-1:])
+
+
+class Trajectory(object):
+    """
+    Sync Write packets of every tick of a motion, in one buffer
+
+    :param control_address: Start address, ex) DXL_GOAL_POSITION_L
+    :param motor_ids: IDs of the Dynamixels, in column order
+    :param columns: One (ticks, N) array per register written from control_address on, raw values,
+                    ex) [positions] or [positions, moving_speeds]. Floats are rounded; a value out of the
+                    range of its dtype raises ValueError (it would wrap around in the packet).
+    :param rate: Ticks per second
+    :param dtypes: dtype per column, '<u2' (Protocol 1.0 word registers) by default
+
+    buffer[k] holds the packets of tick k; buffer[k].data can be written to the port as it is.
+    """
+
+    def __init__(self, control_address, motor_ids, columns, rate, dtypes=None):
+        columns = [np.asarray(values) for values in columns]
+        if dtypes is None:
+            dtypes = ('<u2', ) * len(columns)
+        ticks = len(columns[0])
+        for idx, (values, dtype) in enumerate(zip(columns, dtypes)):
+            if values.shape != (ticks, len(motor_ids)):
+                raise ValueError('Every column must have the shape (ticks, No. of Dynamixels)')
+            if values.dtype.kind == 'f':
+                if not np.isfinite(values).all():
+                    raise ValueError('Column %d is not finite' % idx)
+                values = columns[idx] = np.rint(values)
+            limits = np.iinfo(np.dtype(dtype))
+            if values.size and (values.min() < limits.min or values.max() > limits.max):
+                raise ValueError('Column %d holds %s ~ %s, outside of %s (%d ~ %d)'
+                                 % (idx, values.min(), values.max(), np.dtype(dtype), limits.min, limits.max))
+        self.control_address = control_address
+        self.motor_ids = list(motor_ids)
+        self.rate = rate
+        self.columns = columns
+
+        # Layout of one tick, with IDs, headers and lengths already in place
+        encoder = SyncWriteEncoder(control_address, self.motor_ids, dtypes)
+        self.buffer = np.tile(encoder.buffer, (ticks, 1))
+
+        # Every packet of every tick: the data of all ticks at once, then the checksums
+        offset = 0
+        for lo, hi, packet, records in encoder.packets:
+            size = len(packet)
+            data = self.buffer[:, offset + 7:offset + size - 1].view(encoder.record)
+            for field, values in zip(encoder.fields, columns):
+                data[field] = values[:, lo:hi].astype(data.dtype[field])
+            checksum = self.buffer[:, offset + 2:offset + size - 1].sum(axis=1, dtype=np.uint32)
+            self.buffer[:, offset + size - 1] = 255 - (checksum & 0xFF)
+            offset += size
+
+    def __len__(self):
+        return len(self.buffer)
+
+    @property
+    def duration(self):
+        return len(self.buffer) / float(self.rate)
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
+
+    def tick(self, k):
+        """
+        Packets of tick k (a view into the buffer)
+        """
+        return self.buffer[k]
+
+
+class TrajectoryPlayer(object):
+    """
+    ControlLoop step which writes one tick of a Trajectory per cycle
+
+    :param dxl: DXLPacketGenP1
+    :param trajectory: Trajectory, its rate should be the rate of the loop
+    :param loop: ControlLoop to stop after the last tick (optional)
+
+    written counts the ticks sent. A cycle past the end only sends the last tick if an overrun skipped it,
+    the motion always ends on its final positions.
+    """
+
+    def __init__(self, dxl, trajectory, loop=None):
+        self.dxl = dxl
+        self.trajectory = trajectory
+        self.loop = loop
+        self.written = 0
+        self.last_tick = None
+
+    def __call__(self, cycle, t):
+        ticks = self.trajectory.buffer
+        if cycle >= len(ticks):
+            if self.last_tick != len(ticks) - 1:
+                self.__write(len(ticks) - 1)
+            if self.loop is not None:
+                self.loop.stop()
+            return
+        self.__write(cycle)
+        if cycle == len(ticks) - 1 and self.loop is not None:
+            self.loop.stop()
+
+    def __write(self, cycle):
+        self.dxl.sync_write_packets(self.trajectory.buffer[cycle].data)
+        self.written += 1
+        self.last_tick = cycle
+
+
+def play(dxl, trajectory, **kwargs):
+    """
+    Play a trajectory on its own rate, with deadline timing
+
+    :param kwargs: ControlLoop arguments, ex) spin_threshold
+    :return: (TrajectoryPlayer, ControlLoop) for their statistics
+    """
+    kwargs.setdefault('overrun', OVERRUN_SKIP)
+    player = TrajectoryPlayer(dxl, trajectory)
+    loop = ControlLoop(trajectory.rate, player, **kwargs)
+    player.loop = loop
+    loop.run(cycles=len(trajectory))
+    return player, loop
@@ -0,0 +1,71 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Latency settings of USB-serial adapters (Linux)
+
+    An FTDI adapter (U2D2, USB2Dynamixel) holds received bytes for up to its latency timer (16 ms by default)
+    before it sends them to the host, so a 1 Mbps Status Packet of a few bytes can arrive milliseconds late.
+    Two settings remove most of this:
+
+        - latency timer: /sys/bus/usb-serial/devices/ttyUSB0/latency_timer, 1 ms
+        - low_latency flag of the tty (ASYNC_LOW_LATENCY, setserial /dev/ttyUSB0 low_latency)
+
+    Writing the latency timer needs write access to sysfs (root or a udev rule). sysfs_root can point
+    somewhere else, ex) a temporary directory with the same layout, to try the settings without hardware.
+
+
+"""
+
+import os
+
+SYSFS_ROOT = '/sys'
+
+
+def latency_timer_path(port, sysfs_root=SYSFS_ROOT):
+    """
+    :param port: Serial port, ex) '/dev/ttyUSB0' or a symlink to it such as '/dev/serial/by-id/...'
+    :return: Path of the latency_timer attribute of the adapter
+    """
+    name = os.path.basename(os.path.realpath(port))
+    return os.path.join(sysfs_root, 'bus', 'usb-serial', 'devices', name, 'latency_timer')
+
+
+def get_latency_timer(port, sysfs_root=SYSFS_ROOT):
+    """
+    :return: Latency timer in ms, or None when the port has none (not a USB-serial adapter)
+    """
+    try:
+        with open(latency_timer_path(port, sysfs_root)) as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def set_latency_timer(port, milliseconds=1, sysfs_root=SYSFS_ROOT):
+    """
+    :return: Previous latency timer in ms, or None when the port has none or it cannot be written
+    """
+    previous = get_latency_timer(port, sysfs_root)
+    if previous is None:
+        return None
+    try:
+        with open(latency_timer_path(port, sysfs_root), 'w') as f:
+            f.write('%d\n' % milliseconds)
+    except (IOError, OSError):
+        return None
+    return previous
+
+
+def set_low_latency_mode(ser, enable=True):
+    """
+    Set the low_latency flag of an open pyserial port
+
+    :return: True on success, False when the driver does not support it (ex. a pty, or not on Linux)
+    """
+    try:
+        ser.set_low_latency_mode(enable)
+    except (AttributeError, NotImplementedError, ValueError, IOError, OSError):
+        return False
+    return True
@@ -0,0 +1,205 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Write coalescing for Protocol 1.0
+
+    Register writes of one control cycle are collected with write() and sent together with commit():
+
+        1. Per motor, the written bytes are laid into a Control Table image. Ranges which touch merge,
+           and ranges up to max_gap bytes apart merge too when the bytes in between are writable and
+           known from a ControlTableShadow (their current value is written back unchanged).
+           Goal Position (30), Moving Speed (32) and Torque Limit (34) written separately -> one WRITE 30 ~ 35
+        2. A range with the same address and length on several motors becomes one SYNC_WRITE
+           (split by DXLPacketGenP1.sync_write when the motors do not fit in one packet)
+        3. Everything else is one WRITE per range
+
+    A later write to the same byte in the same cycle replaces the earlier one. A WRITE whose Status Packet
+    did not come stays queued, the next commit() sends it again (unless a write() of that cycle replaced it),
+    up to max_retries times in a row; then it is dropped.
+
+    EX)
+        batch = WriteBatch(dxl)
+        for motor_id in motor_ids:
+            batch.write(motor_id, DXL_GOAL_POSITION_L, goal[motor_id])
+            batch.write(motor_id, DXL_MOVING_SPEED_L, speed[motor_id])
+        batch.commit()      # one SYNC_WRITE of 4 bytes per motor instead of 2 x N WRITE
+        print(batch.statistics())
+
+
+"""
+
+from dxl_addr_table_p1 import DXL_WRITE_DATA
+from dxl_control_table_p1 import MotorShadow, CONTROL_TABLE_SIZE, WRITABLE, WRITE_REJECTED
+
+
+class WriteBatch(object):
+    """
+    :param dxl: DXLPacketGenP1
+    :param shadow: optional ControlTableShadow, fills gaps between ranges and is updated with what was written
+    :param max_gap: largest gap in bytes filled to merge two ranges of one motor
+    :param min_sync: smallest number of motors sharing a range to use SYNC_WRITE
+    :param max_retries: commits in a row a WRITE without Status Packet is sent again before it is dropped
+
+    Statistics
+        requested: write() calls and WRITEs queued again, the number of WRITE transactions without coalescing
+        packets: instruction packets sent by commit()
+        saved: requested - packets
+        failed: WRITEs rejected by the motor or without their Status Packet
+        retried: WRITEs without Status Packet queued again for the next commit()
+        dropped: WRITEs without Status Packet given up after max_retries
+        last_cycle: requested, packets and saved for the last commit()
+    """
+
+    def __init__(self, dxl, shadow=None, max_gap=2, min_sync=2, max_retries=3):
+        self.dxl = dxl
+        self.shadow = shadow
+        self.max_gap = max_gap
+        self.min_sync = min_sync
+        self.max_retries = max_retries
+        self.pending = {}
+        self.free = []
+        self.cycle_requests = 0
+        # {motor_id: commits in a row whose WRITE to the motor got no Status Packet}
+        self.tries = {}
+
+        self.requested = 0
+        self.packets = 0
+        self.sync_writes = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.last_cycle = {'requested': 0, 'packets': 0, 'saved': 0}
+
+    def __len__(self):
+        return self.cycle_requests
+
+    def write(self, motor_id, address, data):
+        """
+        Queue a write, same arguments as DXLPacketGenP1.write_data
+        """
+        end = address + len(data)
+        if end > CONTROL_TABLE_SIZE:
+            raise ValueError('Write of %d bytes at address %d is outside the Control Table' % (len(data), address))
+        self.__queue(motor_id, address, data)
+        self.cycle_requests += 1
+
+    def __queue(self, motor_id, address, data):
+        end = address + len(data)
+        image = self.pending.get(motor_id)
+        if image is None:
+            image = self.pending[motor_id] = self.free.pop() if self.free else MotorShadow()
+        image.table[address:end] = data
+        image.dirty[address:end] = b'\x01' * len(data)
+
+    def ranges(self, motor_id, image):
+        """
+        Dirty ranges of one motor, merged across small gaps of writable bytes known from the shadow
+
+        :return: [(address, length), ...], the gap bytes are copied into the image
+        """
+        ranges = image.dirty_ranges()
+        known = self.shadow.motors.get(motor_id) if self.shadow is not None else None
+        if known is None or len(ranges) < 2:
+            return ranges
+
+        merged = [ranges[0]]
+        for address, length in ranges[1:]:
+            last_address, last_length = merged[-1]
+            gap_start = last_address + last_length
+            if address - gap_start <= self.max_gap and \
+                    all(known.valid[gap_start:address]) and all(WRITABLE[gap_start:address]):
+                image.table[gap_start:address] = known.known[gap_start:address]
+                merged[-1] = (last_address, address + length - last_address)
+            else:
+                merged.append((address, length))
+        return merged
+
+    def commit(self):
+        """
+        Send the queued writes of this cycle
+
+        :return: {motor_id: StatusPacket or None} of the motors written with WRITE
+        """
+        # Ranges of every motor, grouped by (address, length) for SYNC_WRITE
+        groups = {}
+        for motor_id, image in self.pending.items():
+            for address, length in self.ranges(motor_id, image):
+                groups.setdefault((address, length), []).append(motor_id)
+
+        dxl = self.dxl
+        results = {}
+        lost = []
+        packets = 0
+        for (address, length), motor_ids in groups.items():
+            end = address + length
+            if len(motor_ids) >= self.min_sync:
+                total_data = tuple([(motor_id, ) + tuple(self.pending[motor_id].table[address:end])
+                                    for motor_id in motor_ids])
+                sent = dxl.sync_write(address, total_data)
+                packets += sent
+                self.sync_writes += sent
+                if self.shadow is not None:
+                    # SYNC_WRITE has no Status Packet, the write is assumed to be applied
+                    for motor_id in motor_ids:
+                        self.shadow.motor(motor_id).store(address, self.pending[motor_id].table[address:end])
+            else:
+                for motor_id in motor_ids:
+                    data = bytes(self.pending[motor_id].table[address:end])
+                    status = dxl.write_data(motor_id, address, data)
+                    packets += 1
+                    results[motor_id] = status
+                    if status is None and dxl.reply_expected(motor_id, DXL_WRITE_DATA):
+                        # Applied or not, unknown: sent again by the next commit()
+                        self.failed += 1
+                        lost.append((motor_id, address, data))
+                    elif status is not None and status.error & WRITE_REJECTED:
+                        self.failed += 1
+                    elif self.shadow is not None:
+                        self.shadow.motor(motor_id).store(address, data)
+
+        requested = self.cycle_requests
+        self.requested += requested
+        self.packets += packets
+        self.last_cycle = {'requested': requested, 'packets': packets, 'saved': requested - packets}
+        self.clear()
+        tries = {}
+        for motor_id, address, data in lost:
+            count = tries[motor_id] = self.tries.get(motor_id, 0) + 1
+            if count > self.max_retries:
+                self.dropped += 1
+                continue
+            # Sent again by the next commit(), counted as one more request
+            self.__queue(motor_id, address, data)
+            self.cycle_requests += 1
+            self.retried += 1
+        self.tries = tries
+        return results
+
+    def clear(self):
+        """
+        Drop the queued writes without sending them
+        """
+        for image in self.pending.values():
+            image.invalidate()
+            self.free.append(image)
+        self.pending.clear()
+        self.cycle_requests = 0
+
+    @property
+    def saved(self):
+        return self.requested - self.packets
+
+    def statistics(self):
+        return {
+            'requested': self.requested,
+            'packets': self.packets,
+            'saved': self.saved,
+            'sync_writes': self.sync_writes,
+            'failed': self.failed,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'pending': self.cycle_requests,
+            'last_cycle': dict(self.last_cycle),
+        }
@@ -0,0 +1,297 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+"""
+
+Typed registers of the Protocol 1.0 (MX-106) Control Table
+
+    dxl_addr_table_p1 gives the address of every byte (DXL_GOAL_POSITION_L, DXL_GOAL_POSITION_H, ...).
+    Here every register is described once, with its width, signedness, access and unit, so values do not
+    have to be split into Low/High bytes by hand:
+
+        GOAL_POSITION.encode(2048)          -> b'\\x00\\x08'
+        PRESENT_SPEED.decode(status.params) -> 1124
+        PRESENT_SPEED.to_si(1124)           -> -1.19 rad/s (CW)
+
+    Each register packs and unpacks with a precompiled little endian struct.Struct ('<B', '<H', '<h').
+    A RegisterBlock covers several registers of one contiguous READ / WRITE (gaps are pad bytes) with one
+    struct.Struct for a single motor, and one NumPy record dtype for many motors at once:
+
+        block = RegisterBlock(['PRESENT_POSITION', 'PRESENT_SPEED', 'PRESENT_LOAD'])
+        records = block.records([status.params for status in bulk.values()])   # no per byte Python code
+        si = block.to_si(records)   # {'PRESENT_POSITION': rad array, 'PRESENT_SPEED': rad/s array, ...}
+
+    SI conversion
+        si = (raw - offset) * scale, on a Python int or a whole NumPy array
+        Speed, load and goal torque are sign and magnitude values: bit 10 set is the CW direction,
+        which is negative here (CCW positive)
+
+        Position    0.088 deg per tick, 2048 is 0 rad       -> rad
+        Speed       0.114 rpm per unit                      -> rad/s
+        Load        0.1 % per unit                          -> %
+        Torque      1023 is the maximum torque              -> %
+        Voltage     0.1 V per unit                          -> V
+        Current     4.5 mA per unit, 2048 is 0 A            -> A
+        Return Delay Time   2 us per unit                   -> s
+
+
+"""
+
+import math
+import struct
+from dxl_addr_table_p1 import *
+
+READ = 'R'
+READ_WRITE = 'RW'
+
+TICK = 2.0 * math.pi / 4096.0
+RPM = 0.114 * 2.0 * math.pi / 60.0
+
+
+class Register(object):
+    """
+    One register of the Control Table
+
+    :param name: Name of the register, ex) 'GOAL_POSITION'
+    :param address: First (Low) byte address from dxl_addr_table_p1
+    :param size: 1, 2 or 4 bytes (4 byte registers are Protocol 2.0 only)
+    :param access: READ or READ_WRITE
+    :param unit: SI unit of to_si()
+    :param scale: SI value of one raw unit
+    :param offset: Raw value of SI 0
+    :param signed: Two's complement value
+    :param direction_bit: Bit holding the direction of a sign and magnitude value, or None
+    :param eeprom: Register in the EEPROM area, by default below Torque Enable of the Protocol 1.0 table
+    """
+    __slots__ = ('name', 'address', 'size', 'access', 'unit', 'scale', 'offset', 'signed', 'direction_bit',
+                 'codec', 'eeprom')
+
+    def __init__(self, name, address, size=1, access=READ_WRITE, unit='', scale=1.0, offset=0, signed=False,
+                 direction_bit=None, eeprom=None):
+        self.name = name
+        self.address = address
+        self.size = size
+        self.access = access
+        self.unit = unit
+        self.scale = scale
+        self.offset = offset
+        self.signed = signed
+        self.direction_bit = direction_bit
+        self.codec = struct.Struct('<' + self.format)
+        self.eeprom = address < DXL_TORQUE_ENABLE if eeprom is None else eeprom
+
+    def __repr__(self):
+        return 'Register(%s, address=%d, size=%d, %s)' % (self.name, self.address, self.size, self.access)
+
+    @property
+    def format(self):
+        code = {1: 'B', 2: 'H', 4: 'I'}[self.size]
+        return code.lower() if self.signed else code
+
+    @property
+    def writable(self):
+        return self.access == READ_WRITE
+
+    def encode(self, raw):
+        """
+        :return: Data bytes for write_data, Low byte first
+        """
+        return self.codec.pack(raw)
+
+    def decode(self, data, offset=0):
+        """
+        :param data: Status Packet params (bytes, bytearray or memoryview)
+        :param offset: Position of the register in data
+        """
+        return self.codec.unpack_from(data, offset)[0]
+
+    def to_si(self, raw):
+        """
+        Raw value (int or integer NumPy array) to its SI value
+        """
+        if self.direction_bit is not None:
+            # (1 - 2 * direction) is +1 for CCW and -1 for CW, on ints and arrays alike
+            direction = (raw >> self.direction_bit) & 1
+            return (raw & ((1 << self.direction_bit) - 1)) * (1 - 2 * direction) * self.scale
+        return (raw - self.offset) * self.scale
+
+    def from_si(self, value):
+        """
+        SI value (float or NumPy array) to its raw value, rounded to the nearest unit
+        """
+        if hasattr(value, 'dtype'):
+            import numpy as np
+            if self.direction_bit is not None:
+                magnitude = np.rint(np.abs(value) / self.scale).astype(np.int64)
+                return magnitude | ((value < 0).astype(np.int64) << self.direction_bit)
+            return (np.rint(value / self.scale) + self.offset).astype(np.int64)
+        if self.direction_bit is not None:
+            magnitude = int(round(abs(value) / self.scale))
+            return magnitude | ((value < 0) << self.direction_bit)
+        return int(round(value / self.scale)) + self.offset
+
+
+# Control Table registers, module level names ex) GOAL_POSITION
+# EEPROM
+MODEL_NUMBER = Register('MODEL_NUMBER', DXL_MODEL_NUMBER_L, 2, READ)
+FIRMWARE_VERSION = Register('FIRMWARE_VERSION', DXL_FIRMWARE_VERSION, 1, READ)
+MOTOR_ID = Register('MOTOR_ID', DXL_MOTOR_ID)
+BAUD_RATE = Register('BAUD_RATE', DXL_BAUD_RATE)
+RETURN_DELAY_TIME = Register('RETURN_DELAY_TIME', DXL_RETURN_DELAY_TIME, unit='s', scale=2e-6)
+CW_ANGLE_LIMIT = Register('CW_ANGLE_LIMIT', DXL_CW_ANGLE_LIMIT_L, 2, unit='rad', scale=TICK, offset=2048)
+CCW_ANGLE_LIMIT = Register('CCW_ANGLE_LIMIT', DXL_CCW_ANGLE_LIMIT_L, 2, unit='rad', scale=TICK, offset=2048)
+DRIVE_MODE = Register('DRIVE_MODE', DXL_DRIVE_MODE)
+HIGH_LIMIT_TEMP = Register('HIGH_LIMIT_TEMP', DXL_HIGH_LIMIT_TEMP, unit='degC')
+LOW_LIMIT_VOLTAGE = Register('LOW_LIMIT_VOLTAGE', DXL_LOW_LIMIT_VOLTAGE, unit='V', scale=0.1)
+HIGH_LIMIT_VOLTAGE = Register('HIGH_LIMIT_VOLTAGE', DXL_HIGH_LIMIT_VOLTAGE, unit='V', scale=0.1)
+MAX_TORQUE = Register('MAX_TORQUE', DXL_MAX_TORQUE_L, 2, unit='%', scale=100.0 / 1023)
+STATUS_RETURN_LEVEL = Register('STATUS_RETURN_LEVEL', DXL_STATUS_RETURN_LEVEL)
+ALARM_LED = Register('ALARM_LED', DXL_ALARM_LED)
+ALARM_SHUTDOWN = Register('ALARM_SHUTDOWN', DXL_ALARM_SHUTDOWN)
+MULTI_TURN_OFFSET = Register('MULTI_TURN_OFFSET', DXL_MULTI_TURN_OFFSET_L, 2, unit='rad', scale=TICK, signed=True)
+RESOLUTION_DIVIDER = Register('RESOLUTION_DIVIDER', DXL_RESOLUTION_DIVIDER)
+# RAM
+TORQUE_ENABLE = Register('TORQUE_ENABLE', DXL_TORQUE_ENABLE)
+LED = Register('LED', DXL_LED)
+D_GAIN = Register('D_GAIN', DXL_D_GAIN)
+I_GAIN = Register('I_GAIN', DXL_I_GAIN)
+P_GAIN = Register('P_GAIN', DXL_P_GAIN)
+GOAL_POSITION = Register('GOAL_POSITION', DXL_GOAL_POSITION_L, 2, unit='rad', scale=TICK, offset=2048)
+MOVING_SPEED = Register('MOVING_SPEED', DXL_MOVING_SPEED_L, 2, unit='rad/s', scale=RPM, direction_bit=10)
+TORQUE_LIMIT = Register('TORQUE_LIMIT', DXL_TORQUE_LIMIT_L, 2, unit='%', scale=100.0 / 1023)
+PRESENT_POSITION = Register('PRESENT_POSITION', DXL_PRESENT_POSITION_L, 2, READ, unit='rad', scale=TICK, offset=2048)
+PRESENT_SPEED = Register('PRESENT_SPEED', DXL_PRESENT_SPEED_L, 2, READ, unit='rad/s', scale=RPM, direction_bit=10)
+PRESENT_LOAD = Register('PRESENT_LOAD', DXL_PRESENT_LOAD_L, 2, READ, unit='%', scale=0.1, direction_bit=10)
+PRESENT_VOLTAGE = Register('PRESENT_VOLTAGE', DXL_PRESENT_VOLTAGE, 1, READ, unit='V', scale=0.1)
+PRESENT_TEMPERATURE = Register('PRESENT_TEMPERATURE', DXL_PRESENT_TEMPERATURE, 1, READ, unit='degC')
+REGISTERED = Register('REGISTERED', DXL_REGISTERED, 1, READ)
+MOVING = Register('MOVING', DXL_MOVING, 1, READ)
+LOCK = Register('LOCK', DXL_LOCK)
+PUNCH = Register('PUNCH', DXL_PUNCH_L, 2)
+CURRENT = Register('CURRENT', DXL_CURRENT_L, 2, READ, unit='A', scale=0.0045, offset=2048)
+TORQUE_CONTROL_MODE_ENABLE = Register('TORQUE_CONTROL_MODE_ENABLE', DXL_TORQUE_CONTROL_MODE_ENABLE)
+GOAL_TORQUE = Register('GOAL_TORQUE', DXL_GOAL_TORQUE_L, 2, unit='A', scale=0.0045, direction_bit=10)
+GOAL_ACCELERATION = Register('GOAL_ACCELERATION', DXL_GOAL_ACCELERATION, unit='rad/s^2', scale=math.radians(8.583))
+
+REGISTERS = dict([(register.name, register) for register in (
+    MODEL_NUMBER, FIRMWARE_VERSION, MOTOR_ID, BAUD_RATE, RETURN_DELAY_TIME, CW_ANGLE_LIMIT, CCW_ANGLE_LIMIT,
+    DRIVE_MODE, HIGH_LIMIT_TEMP, LOW_LIMIT_VOLTAGE, HIGH_LIMIT_VOLTAGE, MAX_TORQUE, STATUS_RETURN_LEVEL, ALARM_LED,
+    ALARM_SHUTDOWN, MULTI_TURN_OFFSET, RESOLUTION_DIVIDER, TORQUE_ENABLE, LED, D_GAIN, I_GAIN, P_GAIN, GOAL_POSITION,
+    MOVING_SPEED, TORQUE_LIMIT, PRESENT_POSITION, PRESENT_SPEED, PRESENT_LOAD, PRESENT_VOLTAGE, PRESENT_TEMPERATURE,
+    REGISTERED, MOVING, LOCK, PUNCH, CURRENT, TORQUE_CONTROL_MODE_ENABLE, GOAL_TORQUE, GOAL_ACCELERATION,
+)])
+
+REGISTERS_BY_ADDRESS = dict([(register.address, register) for register in REGISTERS.values()])
+
+
+def register(key):
+    """
+    :param key: Register, its name ('GOAL_POSITION') or its first address (DXL_GOAL_POSITION_L)
+    """
+    if isinstance(key, Register):
+        return key
+    if isinstance(key, int):
+        return REGISTERS_BY_ADDRESS[key]
+    return REGISTERS[key]
+
+
+class RegisterBlock(object):
+    """
+    Several registers read or written with one contiguous access
+
+    :param registers: Registers, names or addresses, in any order
+
+    address, length: the access, from the first byte of the lowest register to the last byte of the highest
+    codec: struct.Struct of the whole block for one motor, bytes between the registers are pad bytes
+    """
+
+    def __init__(self, registers):
+        self.registers = sorted([register(key) for key in registers], key=lambda reg: reg.address)
+        if not self.registers:
+            raise ValueError('A register block needs at least one register')
+        self.address = self.registers[0].address
+        last = self.registers[-1]
+        self.length = last.address + last.size - self.address
+        self.names = tuple([reg.name for reg in self.registers])
+
+        fmt = '<'
+        position = self.address
+        for reg in self.registers:
+            if reg.address < position:
+                raise ValueError('Register %s overlaps the previous register' % reg.name)
+            fmt += 'x' * (reg.address - position) + reg.format
+            position = reg.address + reg.size
+        self.codec = struct.Struct(fmt)
+        self._dtype = None
+
+    def unpack(self, data, offset=0):
+        """
+        :return: Tuple of raw values, in address order
+        """
+        return self.codec.unpack_from(data, offset)
+
+    def pack(self, *raw):
+        """
+        :return: Data bytes for write_data / sync_write from the start address, pad bytes are 0
+        """
+        return self.codec.pack(*raw)
+
+    def decode(self, data, offset=0):
+        """
+        :return: Dictionary {name: SI value} of one motor
+        """
+        return dict([(reg.name, reg.to_si(raw)) for reg, raw in zip(self.registers, self.codec.unpack_from(data, offset))])
+
+    @property
+    def dtype(self):
+        """
+        NumPy record dtype of one motor's block, little endian, with the registers at their byte offsets
+        """
+        if self._dtype is None:
+            import numpy as np
+            self._dtype = np.dtype({
+                'names': list(self.names),
+                'formats': ['<' + ('i' if reg.signed else 'u') + str(reg.size) for reg in self.registers],
+                'offsets': [reg.address - self.address for reg in self.registers],
+                'itemsize': self.length,
+            })
+        return self._dtype
+
+    def records(self, data):
+        """
+        Raw values of many motors as one NumPy record array (a view, nothing is decoded per byte)
+
+        :param data: bytes-like of N * length bytes, or a list of N params of length bytes each
+        """
+        import numpy as np
+        if isinstance(data, (list, tuple)):
+            data = b''.join(data)
+        return np.frombuffer(data, dtype=self.dtype)
+
+    def to_si(self, records):
+        """
+        :param records: Record array from records()
+        :return: Dictionary {name: float array}
+        """
+        import numpy as np
+        return dict([(reg.name, reg.to_si(records[reg.name].astype(np.int64))) for reg in self.registers])
+
+    def from_si(self, **values):
+        """
+        Record array from SI value arrays, ex) block.from_si(GOAL_POSITION=q, MOVING_SPEED=qd)
+
+        :return: Record array, block.from_si(...).tobytes() is the data of N motors back to back
+        """
+        import numpy as np
+        registers = dict(zip(self.names, self.registers))
+        count = len(next(iter(values.values())))
+        records = np.zeros(count, dtype=self.dtype)
+        for name, value in values.items():
+            records[name] = registers[name].from_si(np.asarray(value, dtype=np.float64))
+        return records
+
+
+# Blocks polled or commanded every control cycle
+COMMAND_BLOCK = RegisterBlock(['GOAL_POSITION', 'MOVING_SPEED', 'TORQUE_LIMIT'])
+FEEDBACK_BLOCK = RegisterBlock(['PRESENT_POSITION', 'PRESENT_SPEED', 'PRESENT_LOAD', 'PRESENT_VOLTAGE',
+                                'PRESENT_TEMPERATURE'])
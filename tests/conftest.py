@@ -0,0 +1,8 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import os
+import sys
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
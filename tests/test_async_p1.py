@@ -0,0 +1,60 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import asyncio
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_async_p1 import AsyncDXLPacketGenP1
+from dxl_simulator_p1 import VirtualDXLBus
+
+
+def test_transactions_on_a_pty():
+    async def main(port):
+        async with AsyncDXLPacketGenP1(port, 1000000, timeout=0.02) as dxl:
+            assert (await dxl.ping(1)).motor_id == 1
+            assert await dxl.ping(9) is None
+            await dxl.write_data(2, DXL_GOAL_POSITION_L, [0x00, 0x03])
+            result = await dxl.bulk_read(DXL_GOAL_POSITION_L, 2, [1, 2])
+            return result[2].word()
+
+    with VirtualDXLBus([1, 2]) as bus:
+        assert asyncio.run(main(bus.port)) == 0x300
+
+
+def test_sync_write_splits_a_long_batch():
+    motor_ids = list(range(100))
+
+    async def main(port):
+        async with AsyncDXLPacketGenP1(port, 1000000, timeout=0.02) as dxl:
+            await dxl.sync_write(DXL_GOAL_POSITION_L,
+                                 tuple([(motor_id, motor_id, 0x01, 0x80, 0x00) for motor_id in motor_ids]))
+            # The next transaction goes out after the Sync Write packets
+            assert await dxl.ping(1) is not None
+
+    with VirtualDXLBus(motor_ids) as bus:
+        asyncio.run(main(bus.port))
+        assert [bus.motor(motor_id).word(DXL_GOAL_POSITION_L) for motor_id in motor_ids] == \
+               [0x100 + motor_id for motor_id in motor_ids]
+        assert bus.checksum_errors == 0
+
+
+def test_port_error_fails_every_request():
+    bus = VirtualDXLBus([1])
+    bus.start()
+
+    async def main():
+        async with AsyncDXLPacketGenP1(bus.port, 1000000, timeout=0.02) as dxl:
+            assert await dxl.ping(1) is not None
+            # The adapter goes away: writes and reads of the port fail with EIO
+            bus.stop()
+            futures = [dxl.ping(1) for _ in range(3)]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            assert all(isinstance(result, OSError) for result in results)
+            assert isinstance(dxl.failure, OSError)
+            with pytest.raises(RuntimeError):
+                dxl.ping(1)
+
+    try:
+        asyncio.run(asyncio.wait_for(main(), 5.0))
+    finally:
+        bus.stop()
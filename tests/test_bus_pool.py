@@ -0,0 +1,39 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import pytest
+import serial
+import dxl_bus_pool
+from dxl_addr_table_p1 import *
+from dxl_bus_pool import DXLBusPool
+from dxl_simulator_p1 import VirtualDXLBus
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+def test_failed_open_closes_the_opened_ports(monkeypatch):
+    opened = []
+
+    class RecordingDXL(dxl_bus_pool.DXLPacketGenP1):
+        def __init__(self, port, baudrate):
+            super(RecordingDXL, self).__init__(port, baudrate)
+            opened.append(self)
+
+    monkeypatch.setattr(dxl_bus_pool, 'DXLPacketGenP1', RecordingDXL)
+    with VirtualDXLBus([1]) as bus:
+        with pytest.raises(serial.SerialException):
+            DXLBusPool.open({'a': (bus.port, 1000000), 'b': ('/dev/nonexistent-dxl', 1000000)})
+    assert len(opened) == 1
+    assert not opened[0].ser.is_open
+
+
+def test_open_and_ping_every_bus():
+    with VirtualDXLBus([1]) as bus_a, VirtualDXLBus([11]) as bus_b:
+        pool = DXLBusPool.open({'a': (bus_a.port, 1000000), 'b': (bus_b.port, 1000000)})
+        for dxl in pool.buses.values():
+            dxl.reply_margin = REPLY_MARGIN
+        try:
+            assert pool.submit('a', 'ping', 1).result() is not None
+            assert pool.submit('b', 'ping', 11).result() is not None
+        finally:
+            pool.close()
@@ -0,0 +1,44 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import os
+import time
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_bus_process import BusServer
+from dxl_simulator_p1 import VirtualDXLBus
+
+
+@pytest.fixture
+def server():
+    with VirtualDXLBus([1, 2, 3]) as bus:
+        path = '/dev/shm/dxl_bus_test_%d' % os.getpid()
+        with BusServer(bus.port, 1000000, [1, 2, 3], rate=50, path=path,
+                       dxl_kwargs={'reply_margin': 0.02}) as server:
+            server.bus = bus
+            yield server
+
+
+def test_goals_of_one_cycle_all_reach_the_bus(server):
+    client = server.client()
+    seq, state = client.read_state()
+    client.write_goals([1], GOAL_POSITION=[0x101])
+    client.write_goals([2], GOAL_POSITION=[0x202])
+    last = client.write_goals([3], GOAL_POSITION=[0x303])
+    deadline = time.monotonic() + 2.0
+    while client.applied_goals() < last:
+        assert time.monotonic() < deadline
+        seq, state = client.wait_state(seq, timeout=1.0)
+    bus = server.bus
+    assert [bus.motor(motor_id).word(DXL_GOAL_POSITION_L) for motor_id in (1, 2, 3)] == [0x101, 0x202, 0x303]
+    # Written once: a new goal only asks for its own motor
+    client.write_goals([1], GOAL_POSITION=[0x111])
+    assert list(client.goal['mask']) == [1, 0, 0]
+
+
+def test_no_start_without_the_command_registers_of_every_motor():
+    with VirtualDXLBus([1, 2]) as bus:
+        path = '/dev/shm/dxl_bus_test_%d' % os.getpid()
+        with pytest.raises(RuntimeError, match=r'motors \[3\]'):
+            BusServer(bus.port, 1000000, [1, 2, 3], rate=50, path=path, dxl_kwargs={'reply_margin': 0.02})
+    assert not os.path.exists(path)
@@ -0,0 +1,38 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import time
+import pytest
+from dxl_bus_worker import BusWorker, PRIORITY_REALTIME, PRIORITY_BACKGROUND
+
+
+class FakeBus(object):
+    def read_data(self, motor_id, address, length):
+        return motor_id, address, length
+
+
+def test_calls_run_on_the_worker():
+    with BusWorker(FakeBus()) as worker:
+        assert worker.call('read_data', 1, 36, 2) == (1, 36, 2)
+        assert worker.call(lambda dxl, value: value * 2, 21, priority=PRIORITY_REALTIME) == 42
+
+
+def test_unknown_priority_is_refused():
+    with BusWorker(FakeBus()) as worker:
+        with pytest.raises(ValueError):
+            worker.submit('read_data', 1, 36, 2, priority=3)
+        assert worker.statistics()['classes']['background']['queued'] == 0
+
+
+def test_deferred_counts_calls_not_wakeups():
+    with BusWorker(FakeBus(), default_duration=0.005) as worker:
+        start = time.monotonic()
+        worker.reserve(start + 0.003)
+        future = worker.submit('read_data', 1, 36, 2, priority=PRIORITY_BACKGROUND)
+        # Wakeups of the worker while the call waits for the slot to pass
+        for idx in range(5):
+            time.sleep(0.0005)
+            worker.reserve(start + 0.003 + 0.0005 * idx)
+        worker.release()
+        assert future.result(1.0) == (1, 36, 2)
+        assert worker.deferred == 1
@@ -0,0 +1,64 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+from dxl_addr_table_p1 import *
+from dxl_capture import Capture, CaptureLog, ReplayBus, replay, DIR_TX, DIR_RX, MAX_FRAME
+from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_LOW_LATENCY, PacketTemplateCache
+from dxl_simulator_p1 import VirtualDXLBus, status_packet
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+
+def test_long_write_is_one_frame(tmp_path):
+    path = str(tmp_path / 'long.dxlcap')
+    data = bytes(range(256)) * 300
+    with Capture(path, baudrate=1000000) as capture:
+        capture.tx(data)
+        capture.rx(b'\x01\x02')
+    log = CaptureLog(path)
+    assert len(data) > MAX_FRAME
+    assert [(frame.direction, frame.data) for frame in log.frames] == [(DIR_TX, data), (DIR_RX, b'\x01\x02')]
+    assert len(log.transactions) == 1
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / 'session.dxlcap')
+    with VirtualDXLBus([1, 2]) as bus:
+        with Capture(path, baudrate=1000000) as capture:
+            dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY, reply_margin=REPLY_MARGIN,
+                                 capture=capture)
+            try:
+                dxl.ping(1)
+                dxl.write_data(2, DXL_GOAL_POSITION_L, (0x00, 0x02))
+                dxl.bulk_read(DXL_PRESENT_POSITION_L, 2, [1, 2])
+            finally:
+                dxl.close()
+
+    with ReplayBus(path) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY, reply_margin=REPLY_MARGIN)
+        try:
+            result = replay(dxl, bus)
+        finally:
+            dxl.close()
+    assert result['transactions'] == 3 and result['timeouts'] == 0
+    assert result['mismatches'] == 0 and result['skipped'] == 0 and result['empty'] == 0
+
+
+def test_tx_frame_without_packet_is_not_replayed(tmp_path):
+    path = str(tmp_path / 'noise.dxlcap')
+    with Capture(path, baudrate=1000000) as capture:
+        capture.tx(b'\xff\xff\x01')
+        capture.rx(b'\x00\x00')
+        capture.tx(bytes(PacketTemplateCache().packet(1, DXL_PING)))
+        capture.rx(status_packet(1, 0, b''))
+
+    with ReplayBus(path) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY, reply_margin=REPLY_MARGIN)
+        try:
+            result = replay(dxl, bus)
+        finally:
+            dxl.close()
+    assert result['empty'] == 1
+    assert result['transactions'] == 1 and result['calls'] == {'ping': 1}
+    assert result['timeouts'] == 0 and result['mismatches'] == 0
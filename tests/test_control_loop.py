@@ -0,0 +1,94 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import pytest
+from dxl_control_loop import ControlLoop, OVERRUN_SKIP, OVERRUN_CATCH_UP
+
+# 4 Hz, a period and step durations which are exact in binary floating point
+RATE = 4
+PERIOD = 0.25
+
+
+class FakeClock(object):
+    """
+    Time source of a ControlLoop which only moves when a step takes time or the loop waits
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def wait_until(self, deadline):
+        self.now = max(self.now, deadline)
+
+
+def run_loop(durations, cycles, **kwargs):
+    """
+    :param durations: {cycle: seconds spent in step()}, 1/16 s by default
+    :return: (ControlLoop, [(cycle, deadline, start time of the step), ...])
+    """
+    clock = FakeClock()
+    calls = []
+
+    def step(cycle, t):
+        calls.append((cycle, t, clock.now))
+        clock.now += durations.get(cycle, 0.0625)
+
+    loop = ControlLoop(RATE, step, clock=clock, **kwargs)
+    loop.wait_until = clock.wait_until
+    assert loop.run(cycles=cycles) == cycles
+    return loop, calls
+
+
+def test_skip_drops_the_missed_deadlines():
+    # Cycle 1 runs 2.5 periods: it ends after the deadlines of cycles 2 and 3
+    loop, calls = run_loop({1: 0.625}, 5, overrun=OVERRUN_SKIP)
+    assert [cycle for cycle, t, start in calls] == [0, 1, 4, 5, 6]
+    assert all(start == t == cycle * PERIOD for cycle, t, start in calls)
+    assert (loop.overruns, loop.skipped) == (1, 2)
+    jitter = loop.statistics()['jitter']
+    assert jitter['count'] == 5 and jitter['max'] == 0.0
+
+
+def test_catch_up_runs_the_missed_cycles_back_to_back():
+    loop, calls = run_loop({1: 0.625}, 5, overrun=OVERRUN_CATCH_UP)
+    assert [cycle for cycle, t, start in calls] == [0, 1, 2, 3, 4]
+    # Cycles 2 and 3 start late, right after the previous one, cycle 4 is on time again
+    assert [start - t for cycle, t, start in calls] == [0.0, 0.0, 0.375, 0.1875, 0.0]
+    assert (loop.overruns, loop.skipped) == (1, 0)
+    stats = loop.statistics()
+    assert stats['jitter']['max'] == 0.375
+    assert stats['jitter']['mean'] == pytest.approx((0.375 + 0.1875) / 5)
+    assert stats['period']['count'] == 4 and stats['period']['min'] == 0.0625
+
+
+def test_catch_up_is_bounded_by_max_catch_up():
+    loop, calls = run_loop({1: 0.625}, 5, overrun=OVERRUN_CATCH_UP, max_catch_up=1)
+    assert [cycle for cycle, t, start in calls] == [0, 1, 3, 4, 5]
+    assert (loop.overruns, loop.skipped) == (1, 1)
+
+
+def test_on_time_loop_has_no_jitter_and_an_exact_period():
+    loop, calls = run_loop({}, 8)
+    stats = loop.statistics()
+    assert (stats['overruns'], stats['skipped'], stats['cycles']) == (0, 0, 8)
+    assert stats['period']['min'] == stats['period']['max'] == PERIOD
+    assert stats['cycle_time']['mean'] == 0.0625
+
+
+def test_duration_and_stop():
+    clock = FakeClock()
+    loop = ControlLoop(RATE, lambda cycle, t: None, clock=clock)
+    loop.wait_until = clock.wait_until
+    assert loop.run(duration=1.0) == 4
+
+    def step(cycle, t):
+        if cycle == 2:
+            loop.stop()
+
+    loop = ControlLoop(RATE, step, clock=clock)
+    loop.wait_until = clock.wait_until
+    assert loop.run(cycles=10) == 3
+    assert not loop.running
@@ -0,0 +1,58 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_control_table_p1 import ControlTableShadow
+from dxl_packet_generator_p1 import DXLPacketGenP1
+from dxl_simulator_p1 import VirtualDXLBus
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+
+@pytest.fixture
+def bus():
+    with VirtualDXLBus([1, 2]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+        bus.shadow = ControlTableShadow(dxl)
+        yield bus
+        dxl.close()
+
+
+def test_same_value_twice_costs_nothing(bus):
+    shadow = bus.shadow
+    assert shadow.write(1, DXL_GOAL_POSITION_L, (0x00, 0x02))
+    assert shadow.set(1, DXL_GOAL_POSITION_L, (0x00, 0x02)) == 0
+    assert shadow.flush() == 0
+    assert shadow.value(1, DXL_GOAL_POSITION_L, 2) == 0x200
+    assert shadow.misses == 0
+
+
+def test_staged_back_to_the_known_value_is_clean(bus):
+    shadow = bus.shadow
+    shadow.write(1, DXL_GOAL_POSITION_L, (0x00, 0x02))
+    shadow.set(1, DXL_GOAL_POSITION_L, (0x00, 0x03))
+    shadow.set(1, DXL_GOAL_POSITION_L, (0x00, 0x02))
+    assert shadow.motor(1).dirty_ranges() == []
+    assert shadow.flush() == 0
+
+
+def test_shutdown_registers_always_go_to_the_bus(bus):
+    shadow = bus.shadow
+    assert shadow.write(1, DXL_TORQUE_ENABLE, (1, ))
+    # Alarm shutdown: the motor turns the torque off by itself
+    bus.motor(1).table[DXL_TORQUE_ENABLE] = 0
+    assert shadow.value(1, DXL_TORQUE_ENABLE) == 0
+    assert shadow.set(1, DXL_TORQUE_ENABLE, (1, )) == 1
+    assert shadow.flush() == 1
+    assert bus.motor(1).table[DXL_TORQUE_ENABLE] == 1
+
+
+def test_id_write_goes_after_the_other_ranges(bus):
+    shadow = bus.shadow
+    shadow.set(2, DXL_MOTOR_ID, (5, ))
+    shadow.set(2, DXL_GOAL_POSITION_L, (0x00, 0x01))
+    assert shadow.flush() == 2
+    assert 2 not in shadow.motors
+    assert bus.motor(5).word(DXL_GOAL_POSITION_L) == 0x100
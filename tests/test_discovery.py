@@ -0,0 +1,27 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import time
+from dxl_discovery import scan_p1
+from dxl_simulator_p1 import VirtualDXLBus
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+# A missing ID cost the fixed 4 ms timeout of the driver before, the pty has no latency timer
+MAX_SECONDS_PER_ID = 0.0025
+
+
+def test_scan_finds_the_motors():
+    with VirtualDXLBus([1, 7, 30]) as bus:
+        found = scan_p1(bus.port, 1000000, range(0, 40), reply_margin=REPLY_MARGIN)
+    assert [motor.motor_id for motor in found] == [1, 7, 30]
+    assert all(motor.model_number is not None for motor in found)
+
+
+def test_missing_ids_cost_one_reply_timeout():
+    with VirtualDXLBus([1]) as bus:
+        start = time.perf_counter()
+        found = scan_p1(bus.port, 1000000, range(2, 102))
+        per_id = (time.perf_counter() - start) / 100
+    assert found == []
+    assert per_id < MAX_SECONDS_PER_ID
@@ -0,0 +1,67 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+from dxl_addr_table_p1 import *
+from dxl_instrumentation import Instrumentation
+from dxl_packet_generator_p1 import DXLPacketGenP1
+from dxl_simulator_p1 import VirtualDXLBus, FaultInjector
+from dxl_status_parser_p1 import StatusPacket
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+
+def test_counters_of_one_instruction():
+    instrumentation = Instrumentation()
+    instrumentation.record(DXL_READ_DATA, 1, 1e-6, 2e-5, 3e-4, 8, [StatusPacket(1, 0, b'\x00\x02')], True)
+    instrumentation.record(DXL_READ_DATA, 2, 1e-6, 2e-5, 4e-3, 8, [None], False)
+    instrumentation.record_retry(DXL_READ_DATA)
+    stats = instrumentation.snapshot()['READ']
+    assert (stats['count'], stats['tx_bytes'], stats['rx_bytes']) == (2, 16, 8)
+    assert (stats['timeouts'], stats['failures'], stats['retries']) == (1, 1, 1)
+    assert stats['wait']['count'] == 2 and stats['wait']['max'] == 4e-3
+    assert list(instrumentation.snapshot()) == ['READ']
+    instrumentation.reset()
+    stats = instrumentation.snapshot()['READ']
+    assert (stats['count'], stats['timeouts'], stats['retries'], stats['wait']['count']) == (0, 0, 0, 0)
+
+
+def test_error_bits_are_counted_apart():
+    instrumentation = Instrumentation()
+    replies = [StatusPacket(1, DXL_ERROR_OVERLOAD | DXL_ERROR_OVERHEATING, b''),
+               StatusPacket(2, DXL_ERROR_OVERLOAD, b''),
+               StatusPacket(3, 0, b'')]
+    instrumentation.record(DXL_BULK_READ, DXL_BROADCAST_ID, 0.0, 0.0, 0.0, 20, replies, True)
+    errors = instrumentation.snapshot()['BULK_READ']['errors']
+    assert errors['overload'] == 2 and errors['overheating'] == 1
+    assert sum(errors.values()) == 3
+
+
+def test_callbacks_get_one_event_per_transaction():
+    instrumentation = Instrumentation()
+    events = []
+    instrumentation.subscribe(events.append)
+    replies = [StatusPacket(1, DXL_ERROR_RANGE, b'\x00\x02'), None]
+    instrumentation.record(DXL_BULK_READ, DXL_BROADCAST_ID, 0.0, 0.0, 0.0, 14, replies, False)
+    event, = events
+    assert (event.name, event.motor_id, event.tx_bytes, event.rx_bytes) == ('BULK_READ', DXL_BROADCAST_ID, 14, 8)
+    assert (event.timeouts, event.ok, event.error) == (1, False, DXL_ERROR_RANGE)
+    instrumentation.unsubscribe(events.append)
+    instrumentation.record(DXL_PING, 1, 0.0, 0.0, 0.0, 6, [StatusPacket(1, 0, b'')], True)
+    assert len(events) == 1
+
+
+def test_transactions_of_a_driver_are_recorded():
+    instrumentation = Instrumentation()
+    with VirtualDXLBus([1, 2], faults=FaultInjector(error_bits={2: DXL_ERROR_OVERLOAD})) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN, instrumentation=instrumentation)
+        try:
+            assert dxl.read_data(1, DXL_PRESENT_POSITION_L, 2) is not None
+            assert dxl.read_data(2, DXL_PRESENT_POSITION_L, 2) is not None
+            assert dxl.ping(9) is None
+        finally:
+            dxl.close()
+    snapshot = instrumentation.snapshot()
+    assert snapshot['READ']['count'] == 2 and snapshot['READ']['rx_bytes'] == 16
+    assert snapshot['READ']['errors']['overload'] == 1
+    assert snapshot['PING']['timeouts'] == 1 and snapshot['PING']['failures'] == 1
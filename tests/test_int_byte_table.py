@@ -0,0 +1,70 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import math
+import numpy as np
+import pytest
+from dxl_addr_table_p1 import *
+from int_byte_table import Register, RegisterBlock, register, REGISTERS, COMMAND_BLOCK, FEEDBACK_BLOCK, TICK, RPM, \
+    GOAL_POSITION, PRESENT_SPEED, PRESENT_LOAD, MULTI_TURN_OFFSET, TORQUE_LIMIT
+
+
+def test_module_names_are_the_registers():
+    assert register('GOAL_POSITION') is GOAL_POSITION is REGISTERS['GOAL_POSITION']
+    assert register(DXL_PRESENT_SPEED_L) is PRESENT_SPEED
+    assert GOAL_POSITION.encode(2048) == b'\x00\x08' and GOAL_POSITION.decode(b'\x00\x00\x08', 1) == 2048
+
+
+def test_offset_register_to_and_from_si():
+    assert GOAL_POSITION.to_si(2048) == 0.0
+    assert GOAL_POSITION.to_si(3072) == pytest.approx(math.pi / 2)
+    assert GOAL_POSITION.from_si(-math.pi / 2) == 1024
+    raw = np.array([0, 2048, 4095])
+    assert np.array_equal(GOAL_POSITION.from_si(GOAL_POSITION.to_si(raw)), raw)
+
+
+def test_direction_bit_register_is_negative_clockwise():
+    # Bit 10 set: CW, negative
+    assert PRESENT_SPEED.to_si(100) == pytest.approx(100 * RPM)
+    assert PRESENT_SPEED.to_si(1024 + 100) == pytest.approx(-100 * RPM)
+    assert PRESENT_SPEED.from_si(-100 * RPM) == 1024 + 100
+    assert PRESENT_LOAD.to_si(1024 + 500) == pytest.approx(-50.0)
+    raw = np.array([0, 100, 1024 + 100, 2047])
+    assert np.array_equal(PRESENT_SPEED.from_si(PRESENT_SPEED.to_si(raw)), [0, 100, 1124, 2047])
+
+
+def test_signed_register():
+    assert MULTI_TURN_OFFSET.encode(-1) == b'\xff\xff'
+    assert MULTI_TURN_OFFSET.decode(b'\x00\xfc') == -1024
+    assert MULTI_TURN_OFFSET.to_si(-1024) == pytest.approx(-1024 * TICK)
+    assert MULTI_TURN_OFFSET.from_si(-1024 * TICK) == -1024
+
+
+def test_block_pack_and_unpack():
+    assert (COMMAND_BLOCK.address, COMMAND_BLOCK.length) == (DXL_GOAL_POSITION_L, 6)
+    data = COMMAND_BLOCK.pack(2048, 1024 + 100, 1023)
+    assert data == b'\x00\x08\x64\x04\xff\x03'
+    assert COMMAND_BLOCK.unpack(b'\xaa' + data, 1) == (2048, 1124, 1023)
+    si = COMMAND_BLOCK.decode(data)
+    assert si['GOAL_POSITION'] == 0.0 and si['MOVING_SPEED'] == pytest.approx(-100 * RPM)
+
+
+def test_block_gaps_are_pad_bytes():
+    block = RegisterBlock([TORQUE_LIMIT, 'GOAL_POSITION'])
+    assert block.names == ('GOAL_POSITION', 'TORQUE_LIMIT') and block.length == 6
+    assert block.pack(2048, 1023) == b'\x00\x08\x00\x00\xff\x03'
+    assert block.unpack(b'\x00\x08\x12\x34\xff\x03') == (2048, 1023)
+    with pytest.raises(ValueError):
+        RegisterBlock([GOAL_POSITION, Register('OVERLAP', DXL_GOAL_POSITION_H, 2)])
+    with pytest.raises(ValueError):
+        RegisterBlock([])
+
+
+def test_block_records_of_many_motors():
+    params = [FEEDBACK_BLOCK.codec.pack(2048 + idx, idx, 1024 + idx, 120, 40) for idx in range(3)]
+    records = FEEDBACK_BLOCK.records(params)
+    assert list(records['PRESENT_POSITION']) == [2048, 2049, 2050]
+    si = FEEDBACK_BLOCK.to_si(records)
+    assert np.allclose(si['PRESENT_LOAD'], [0.0, -0.1, -0.2]) and np.allclose(si['PRESENT_VOLTAGE'], 12.0)
+    command = COMMAND_BLOCK.from_si(GOAL_POSITION=[0.0, math.pi / 2], MOVING_SPEED=[-100 * RPM, 0.0])
+    assert command.tobytes() == COMMAND_BLOCK.pack(2048, 1124, 0) + COMMAND_BLOCK.pack(3072, 0, 0)
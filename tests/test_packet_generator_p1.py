@@ -0,0 +1,123 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import os
+import time
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_discovery import scan_p1
+from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY, REPLY_MARGIN
+from dxl_simulator_p1 import VirtualDXLBus
+from dxl_usb_serial import latency_timer_path
+
+# Room for the stalls of a loaded test machine
+TEST_REPLY_MARGIN = 0.02
+
+
+def fake_adapter(port, sysfs_root):
+    """
+    latency_timer of an FTDI adapter at its default (16 ms) for the port, under sysfs_root
+    """
+    path = latency_timer_path(port, sysfs_root)
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write('16\n')
+    return path
+
+
+def test_sync_write_splits_a_long_batch():
+    motor_ids = list(range(100))
+    with VirtualDXLBus(motor_ids, timing=False) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000)
+        try:
+            dxl.sync_write(DXL_GOAL_POSITION_L,
+                           tuple([(motor_id, motor_id, 0x01, 0x80, 0x00) for motor_id in motor_ids]))
+            assert dxl.transactions == 1
+            time.sleep(0.05)
+        finally:
+            dxl.close()
+        assert [bus.motor(motor_id).word(DXL_GOAL_POSITION_L) for motor_id in motor_ids] == \
+               [0x100 + motor_id for motor_id in motor_ids]
+        assert bus.checksum_errors == 0
+
+
+def test_sync_write_too_long_for_one_motor():
+    with VirtualDXLBus([1], timing=False) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000)
+        try:
+            with pytest.raises(ValueError):
+                dxl.sync_write(DXL_GOAL_POSITION_L, ((1, ) + (0, ) * 250, ))
+        finally:
+            dxl.close()
+
+
+def test_close_after_the_port_is_gone():
+    bus = VirtualDXLBus([1])
+    bus.start()
+    dxl = DXLPacketGenP1(bus.port, 1000000)
+    bus.stop()
+    dxl.close()
+    assert not dxl.ser.is_open
+
+
+def test_close_restores_the_latency_timer(tmp_path):
+    with VirtualDXLBus([1]) as bus:
+        path = fake_adapter(bus.port, str(tmp_path))
+        dxl = DXLPacketGenP1(bus.port, 1000000, latency_timer=1, sysfs_root=str(tmp_path))
+        try:
+            assert open(path).read().strip() == '1'
+            assert dxl.previous_latency_timer == 16
+            assert dxl.reply_margin == REPLY_MARGIN + 0.001
+        finally:
+            dxl.close()
+        assert open(path).read().strip() == '16'
+        # A second close leaves the adapter alone
+        with open(path, 'w') as f:
+            f.write('4\n')
+        dxl.close()
+        assert open(path).read().strip() == '4'
+
+
+def test_scan_leaves_the_latency_timer_as_it_was(tmp_path):
+    with VirtualDXLBus([1]) as bus:
+        path = fake_adapter(bus.port, str(tmp_path))
+        found = scan_p1(bus.port, 1000000, [1], reply_margin=TEST_REPLY_MARGIN, sysfs_root=str(tmp_path))
+    assert [motor.motor_id for motor in found] == [1]
+    assert open(path).read().strip() == '16'
+
+
+def test_transport_profiles_count_their_syscalls():
+    with VirtualDXLBus([1]) as bus:
+        per_transaction = {}
+        for transport in (TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY):
+            dxl = DXLPacketGenP1(bus.port, 1000000, transport=transport, reply_margin=TEST_REPLY_MARGIN)
+            try:
+                dxl.ping(1)
+                dxl.reset_transport_statistics()
+                for _ in range(10):
+                    assert dxl.ping(1) is not None
+                stats = dxl.transport_statistics()
+            finally:
+                dxl.close()
+            assert stats['transport'] == transport and stats['transactions'] == 10
+            assert stats['resets'] == 0 and stats['errors'] == 0
+            assert stats['transaction_time']['count'] == 10
+            per_transaction[transport] = stats['syscalls_per_transaction']
+    # Reset, reset, drain, write and read against one write, one select and one read
+    assert per_transaction[TRANSPORT_SAFE] == 5
+    assert 3 <= per_transaction[TRANSPORT_LOW_LATENCY] < per_transaction[TRANSPORT_SAFE]
+
+
+def test_low_latency_resets_the_buffers_only_after_an_error():
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY, reply_margin=TEST_REPLY_MARGIN)
+        try:
+            dxl.ping(1)
+            dxl.reset_transport_statistics()
+            assert dxl.ping(9) is None
+            assert dxl.ping(1) is not None
+            assert dxl.ping(1) is not None
+            stats = dxl.transport_statistics()
+        finally:
+            dxl.close()
+    assert (stats['transactions'], stats['errors'], stats['resets']) == (3, 1, 1)
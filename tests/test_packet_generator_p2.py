@@ -0,0 +1,66 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+from dxl_addr_table_p2 import *
+from dxl_packet_generator_p2 import DXLPacketGenP2, StatusParserP2, packet_generator, crc16, stuff, unstuff, \
+    split_fast_read, HEADER_CRC
+
+
+def parse(data):
+    parser = StatusParserP2()
+    parser.feed(bytes(data))
+    return parser, parser.next_packet()
+
+
+def test_ping_packet_and_its_crc():
+    packet = packet_generator(1, DXL_PING)
+    assert packet.hex() == 'fffffd0001030001194e'
+    assert crc16(packet, 4, len(packet) - 2, HEADER_CRC) == 0x4E19
+
+
+def test_status_packet_of_the_manual():
+    parser, status = parse(bytes.fromhex('fffffd000107005500060426655d'))
+    assert (status.motor_id, status.error, status.params) == (1, 0, b'\x06\x04\x26')
+    assert parser.checksum_errors == 0
+
+
+def test_bad_crc_is_dropped():
+    packet = bytearray.fromhex('fffffd000107005500060426655d')
+    packet[-1] ^= 0x01
+    parser, status = parse(packet)
+    assert status is None and parser.checksum_errors == 1
+
+
+def test_byte_stuffing_round_trip():
+    params = b'\x01\xff\xff\xfd\x02'
+    assert stuff(params) == b'\x01\xff\xff\xfd\xfd\x02'
+    assert unstuff(stuff(params)) == params
+    assert stuff(b'\xff\xff\x00') == b'\xff\xff\x00'
+    # Length counts the stuffed bytes, the parser gives back the original parameters
+    packet = packet_generator(2, DXL_STATUS, b'\x00' + params)
+    assert packet[5] | (packet[6] << 8) == len(params) + 1 + 1 + 3
+    parser, status = parse(packet)
+    assert (status.motor_id, status.params) == (2, params)
+
+
+def test_fast_sync_read_is_split_per_motor():
+    # [Error1 ID1 Data1 CRC1] [Error2 ID2 Data2 CRC2], CRC of the whole packet at the end
+    segments = b'\x00\x01\x10\x00\xaa\xbb' + b'\x20\x02\x30\x00'
+    parser, status = parse(packet_generator(DXL_BROADCAST_ID, DXL_STATUS, segments))
+    assert status.motor_id == DXL_BROADCAST_ID
+    result = split_fast_read(status, [(1, 2), (2, 2)])
+    assert (result[1].error, result[1].params) == (0x00, b'\x10\x00')
+    assert (result[2].error, result[2].params) == (0x20, b'\x30\x00')
+
+
+def test_fast_sync_read_with_a_missing_motor():
+    parser, status = parse(packet_generator(DXL_BROADCAST_ID, DXL_STATUS, b'\x00\x01\x10\x00'))
+    result = split_fast_read(status, [(1, 2), (2, 2)])
+    assert result[1].params == b'\x10\x00' and result[2] is None
+    assert split_fast_read(None, [(1, 2)]) == {1: None}
+
+
+def test_close_of_a_driver_whose_port_did_not_open():
+    dxl = DXLPacketGenP2.__new__(DXLPacketGenP2)
+    dxl.close()
+    dxl.__del__()
@@ -0,0 +1,47 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import math
+import pytest
+from dxl_addr_table_p2 import *
+from dxl_register_map_p2 import IndirectMapping, register_map
+
+FEEDBACK = ['PRESENT_CURRENT', 'PRESENT_VELOCITY', 'PRESENT_POSITION', 'PRESENT_INPUT_VOLTAGE',
+            'PRESENT_TEMPERATURE', 'HARDWARE_ERROR_STATUS']
+
+
+def test_addresses_of_the_feedback_set():
+    mapping = IndirectMapping(register_map(XH430_W350), FEEDBACK)
+    assert mapping.length == 14
+    assert mapping.addresses() == list(range(126, 136)) + [144, 145, 146, 70]
+    assert (mapping.address_base, mapping.address) == (X_INDIRECT_ADDRESS_1, X_INDIRECT_DATA_1)
+    assert mapping.address_data()[:4] == b'\x7e\x00\x7f\x00'
+    assert not mapping.writable
+
+
+def test_second_region_and_its_overflow():
+    registers = register_map(XH430_W350)
+    mapping = IndirectMapping(registers, FEEDBACK, slot=43)
+    assert (mapping.address_base, mapping.address) == (X_INDIRECT_ADDRESS_29 + 28, X_INDIRECT_DATA_29 + 14)
+    # 14 bytes from slot 16 would end in slot 29, the first one of the other region
+    with pytest.raises(ValueError):
+        IndirectMapping(registers, FEEDBACK, slot=16)
+    with pytest.raises(ValueError):
+        IndirectMapping(registers, FEEDBACK, slot=44)
+    with pytest.raises(ValueError):
+        IndirectMapping(registers, FEEDBACK, slot=0)
+    assert IndirectMapping(registers, FEEDBACK, slot=15).length == 14
+
+
+def test_decode_and_to_si():
+    mapping = IndirectMapping(register_map(XH430_W350), FEEDBACK)
+    params = mapping.block.pack(-100, 10, 3072, 120, 40, 0x04)
+    assert len(params) == mapping.length
+    raw = mapping.decode(params)
+    assert raw == {'PRESENT_CURRENT': -100, 'PRESENT_VELOCITY': 10, 'PRESENT_POSITION': 3072,
+                   'PRESENT_INPUT_VOLTAGE': 120, 'PRESENT_TEMPERATURE': 40, 'HARDWARE_ERROR_STATUS': 0x04}
+    si = mapping.to_si(params)
+    assert si['PRESENT_CURRENT'] == pytest.approx(-0.269)
+    assert si['PRESENT_POSITION'] == pytest.approx(math.pi / 2)
+    assert si['PRESENT_INPUT_VOLTAGE'] == pytest.approx(12.0)
+    assert si['PRESENT_TEMPERATURE'] == 40
@@ -0,0 +1,69 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import time
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY, REPLY_MARGIN, \
+    USB_FRAME
+from dxl_simulator_p1 import VirtualDXLBus
+
+# Scheduling jitter of a loaded test machine, on top of the default margin
+HOST_JITTER = 0.003
+
+@pytest.mark.parametrize('baudrate', [57600, 1000000])
+@pytest.mark.parametrize('transport', [TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY])
+def test_no_timeouts_on_a_clean_bus(baudrate, transport):
+    with VirtualDXLBus([1], baudrate=baudrate) as bus:
+        dxl = DXLPacketGenP1(bus.port, baudrate, transport=transport, reply_margin=REPLY_MARGIN + HOST_JITTER)
+        try:
+            timeouts = sum([dxl.read_data(1, DXL_PRESENT_POSITION_L, 8) is None for _ in range(200)])
+        finally:
+            dxl.close()
+    # A stall of the host longer than the margin is still possible on a loaded machine
+    assert timeouts <= 2
+
+
+def test_default_margin_is_one_usb_frame_without_latency_timer():
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, sysfs_root='/nonexistent')
+        try:
+            assert dxl.reply_margin == REPLY_MARGIN == USB_FRAME
+        finally:
+            dxl.close()
+
+
+def test_missing_ids_cost_one_timeout_each():
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY)
+        try:
+            start = time.perf_counter()
+            for motor_id in range(10, 30):
+                assert dxl.ping(motor_id) is None
+            per_id = (time.perf_counter() - start) / 20
+            assert per_id < dxl.reply_timeout(10) + HOST_JITTER
+        finally:
+            dxl.close()
+
+
+def test_repeated_missing_id_costs_one_timeout_each():
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY)
+        try:
+            start = time.perf_counter()
+            for _ in range(20):
+                assert dxl.read_data(9, DXL_PRESENT_POSITION_L, 2) is None
+            assert (time.perf_counter() - start) / 20 < dxl.reply_timeout(9, 2) + HOST_JITTER
+        finally:
+            dxl.close()
+
+
+def test_answer_after_a_timeout():
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY,
+                             reply_margin=REPLY_MARGIN + HOST_JITTER)
+        try:
+            assert dxl.ping(9) is None
+            assert dxl.ping(1) is not None
+        finally:
+            dxl.close()
@@ -0,0 +1,113 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+from dxl_addr_table_p1 import *
+from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_LOW_LATENCY
+from dxl_retry import RetryPolicy
+from dxl_simulator_p1 import VirtualDXLBus, FaultInjector
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+
+class DropFirstReply(object):
+    """
+    Fault injector: the first Status Packet of one motor is lost, its instruction is executed
+    """
+
+    def __init__(self, motor_id):
+        self.motor_id = motor_id
+        self.dropped = False
+
+    def error_for(self, motor_id):
+        return 0
+
+    def apply(self, packet):
+        if packet[2] == self.motor_id and not self.dropped:
+            self.dropped = True
+            return None
+        return packet
+
+
+def test_default_policy_has_room_for_a_retry_of_a_timeout():
+    policy = RetryPolicy()
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, sysfs_root='/nonexistent')
+        try:
+            reply_timeout = dxl.reply_timeout(1, 2)
+        finally:
+            dxl.close()
+    # Lost reply of the first try, then the retry
+    assert policy.retry(DXL_READ_DATA, None, 0, reply_timeout, reply_timeout)
+    assert policy.retry(DXL_READ_DATA, None, 1, 2 * reply_timeout, reply_timeout)
+
+
+def test_lost_reply_is_recovered():
+    policy = RetryPolicy(deadline=1.0)
+    with VirtualDXLBus([1], faults=DropFirstReply(1)) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=TRANSPORT_LOW_LATENCY, reply_margin=REPLY_MARGIN,
+                             retry_policy=policy)
+        try:
+            status = dxl.read_data(1, DXL_PRESENT_POSITION_L, 2)
+        finally:
+            dxl.close()
+    assert status is not None and len(status.params) == 2
+    assert policy.statistics()['READ'] == {'retries': 1, 'recovered': 1, 'exhausted': 0, 'expired': 0}
+
+
+def test_missing_id_uses_the_whole_budget():
+    policy = RetryPolicy(retries=2, deadline=1.0)
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN, retry_policy=policy)
+        try:
+            assert dxl.read_data(9, DXL_PRESENT_POSITION_L, 2) is None
+        finally:
+            dxl.close()
+        assert bus.instructions == 3
+    assert policy.statistics()['READ'] == {'retries': 2, 'recovered': 0, 'exhausted': 1, 'expired': 0}
+
+
+def test_checksum_error_is_retried_other_errors_are_not():
+    policy = RetryPolicy(retries=1, deadline=1.0)
+    with VirtualDXLBus([1, 2], faults=FaultInjector(error_bits={1: DXL_ERROR_CHECKSUM,
+                                                                  2: DXL_ERROR_OVERLOAD})) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN, retry_policy=policy)
+        try:
+            status = dxl.read_data(1, DXL_PRESENT_POSITION_L, 2)
+            assert status is not None and status.error & DXL_ERROR_CHECKSUM
+            assert bus.instructions == 2
+            status = dxl.read_data(2, DXL_PRESENT_POSITION_L, 2)
+            assert status is not None and status.error & DXL_ERROR_OVERLOAD
+            assert bus.instructions == 3
+        finally:
+            dxl.close()
+    assert policy.statistics()['READ']['exhausted'] == 1
+
+
+def test_action_and_reset_are_never_retried():
+    policy = RetryPolicy(retries=3, deadline=1.0)
+    with VirtualDXLBus([1]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN, retry_policy=policy)
+        try:
+            assert dxl.action(9) is None
+            assert dxl.factory_reset(9) is None
+        finally:
+            dxl.close()
+        assert bus.instructions == 2
+    assert policy.statistics() == {}
+    for instruction in (DXL_ACTION, DXL_RESET, DXL_REBOOT, DXL_SYNC_WRITE):
+        assert not policy.retry(instruction, None, 0, 0.0, 0.0)
+
+
+def test_budget_and_deadline_are_counted_apart():
+    policy = RetryPolicy(retries=1, deadline=0.01, budgets={DXL_WRITE_DATA: 0}, deadlines={DXL_PING: 0.1})
+    assert policy.retry(DXL_READ_DATA, None, 0, 0.0, 0.004)
+    assert not policy.retry(DXL_READ_DATA, None, 1, 0.004, 0.004)     # budget used
+    assert not policy.retry(DXL_READ_DATA, None, 0, 0.007, 0.004)     # would end after the deadline
+    assert not policy.retry(DXL_WRITE_DATA, None, 0, 0.0, 0.004)      # own budget
+    assert policy.retry(DXL_PING, None, 0, 0.05, 0.004)               # own deadline
+    policy.finished(DXL_READ_DATA, True, 1)
+    stats = policy.statistics()
+    assert stats['READ'] == {'retries': 1, 'recovered': 1, 'exhausted': 1, 'expired': 1}
+    assert stats['WRITE'] == {'retries': 0, 'recovered': 0, 'exhausted': 1, 'expired': 0}
+    assert stats['PING']['retries'] == 1
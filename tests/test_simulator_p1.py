@@ -0,0 +1,119 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import time
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_packet_generator_p1 import DXLPacketGenP1, TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY
+from dxl_simulator_p1 import VirtualDXLBus, FaultInjector
+
+# Functional tests: room for the stalls of a loaded test machine, see test_reply_timeouts for the timing
+REPLY_MARGIN = 0.02
+
+
+@pytest.fixture(params=[TRANSPORT_SAFE, TRANSPORT_LOW_LATENCY])
+def bus(request):
+    with VirtualDXLBus([1, 2, 3]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, transport=request.param, reply_margin=REPLY_MARGIN)
+        bus.dxl = dxl
+        yield bus
+        dxl.close()
+
+
+def test_ping_and_missing_motor(bus):
+    status = bus.dxl.ping(1)
+    assert status is not None and status.motor_id == 1 and status.error == 0
+    assert bus.dxl.ping(9) is None
+
+
+def test_write_then_read(bus):
+    bus.dxl.write_data(2, DXL_GOAL_POSITION_L, [0x00, 0x04])
+    assert bus.motor(2).word(DXL_GOAL_POSITION_L) == 0x400
+    status = bus.dxl.read_data(2, DXL_PRESENT_POSITION_L, 2)
+    assert status.word() == 0x400
+
+
+def test_range_error(bus):
+    status = bus.dxl.read_data(1, 70, 10)
+    assert status.error & DXL_ERROR_RANGE
+
+
+def test_sync_write_and_bulk_read(bus):
+    bus.dxl.sync_write(DXL_GOAL_POSITION_L, ((1, 0x10, 0x01), (2, 0x20, 0x02), (3, 0x30, 0x03)))
+    # TRANSPORT_SAFE clears the output buffer before the next packet, give the simulator the Sync Write first
+    time.sleep(0.01)
+    result = bus.dxl.bulk_read(DXL_PRESENT_POSITION_L, 2, [1, 2, 3])
+    assert [result[motor_id].word() for motor_id in (1, 2, 3)] == [0x110, 0x220, 0x330]
+
+
+def test_bulk_read_stops_at_a_silent_motor(bus):
+    result = bus.dxl.bulk_read(DXL_PRESENT_POSITION_L, 2, [1, 9, 2])
+    assert result[1] is not None
+    assert result[9] is None and result[2] is None
+
+
+def test_reg_write_and_action(bus):
+    bus.dxl.reg_write(1, DXL_GOAL_POSITION_L, [0x00, 0x02])
+    assert bus.motor(1).table[DXL_REGISTERED] == 1
+    assert bus.motor(1).word(DXL_GOAL_POSITION_L) == 2048
+    bus.dxl.action(DXL_BROADCAST_ID)
+    time.sleep(0.01)
+    assert bus.motor(1).word(DXL_GOAL_POSITION_L) == 0x200
+    assert bus.motor(1).table[DXL_REGISTERED] == 0
+
+
+def test_id_write_moves_the_motor(bus):
+    motor = bus.motor(3)
+    bus.dxl.write_data(3, DXL_MOTOR_ID, [7])
+    assert bus.motor(7) is motor
+    assert bus.dxl.ping(7) is not None
+    assert bus.dxl.ping(3) is None
+
+
+def test_factory_reset_moves_the_motor_to_id_1():
+    with VirtualDXLBus([5]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+        try:
+            dxl.factory_reset(5)
+            time.sleep(0.01)
+            assert 5 not in bus.motors
+            assert bus.motor(1).table[DXL_BAUD_RATE] == 34
+        finally:
+            dxl.close()
+
+
+def test_status_return_level(bus):
+    bus.dxl.write_data(1, DXL_STATUS_RETURN_LEVEL, [1])
+    assert bus.dxl.write_data(1, DXL_LED, [1]) is None
+    # Nothing to wait for: the write returns as soon as the packet is out
+    time.sleep(0.01)
+    assert bus.motor(1).table[DXL_LED] == 1
+    assert bus.dxl.read_data(1, DXL_LED, 1).byte() == 1
+
+
+def test_injected_error_bits():
+    with VirtualDXLBus([1], faults=FaultInjector(error_bits=DXL_ERROR_OVERHEATING)) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+        try:
+            assert dxl.ping(1).overheating_error
+        finally:
+            dxl.close()
+
+
+def test_reply_timing_follows_the_baud_rate():
+    # 6 + 8 bytes at 57600 baud take 2.4 ms on the wire, at 1 Mbps 0.14 ms
+    durations = {}
+    for baudrate in (57600, 1000000):
+        with VirtualDXLBus([1], baudrate=baudrate) as bus:
+            bus.motor(1).table[DXL_RETURN_DELAY_TIME] = 0
+            dxl = DXLPacketGenP1(bus.port, baudrate, transport=TRANSPORT_LOW_LATENCY, reply_margin=REPLY_MARGIN)
+            try:
+                dxl.read_data(1, DXL_PRESENT_POSITION_L, 8)
+                start = time.perf_counter()
+                for _ in range(20):
+                    assert dxl.read_data(1, DXL_PRESENT_POSITION_L, 2) is not None
+                durations[baudrate] = (time.perf_counter() - start) / 20
+            finally:
+                dxl.close()
+    assert durations[57600] > 0.0022
+    assert durations[1000000] < durations[57600]
@@ -0,0 +1,87 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import time
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_packet_generator_p1 import DXLPacketGenP1
+from dxl_simulator_p1 import VirtualDXLBus
+from dxl_staged_commit_p1 import StagedCommit, MODE_ACTION, MODE_AUTO
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+
+class DropFirstReply(object):
+    """
+    Fault injector: the first Status Packet of one motor is lost, its instruction is executed
+    """
+
+    def __init__(self, motor_id):
+        self.motor_id = motor_id
+        self.dropped = False
+
+    def error_for(self, motor_id):
+        return 0
+
+    def apply(self, packet):
+        if packet[2] == self.motor_id and not self.dropped:
+            self.dropped = True
+            return None
+        return packet
+
+
+def commit_goals(bus, goals):
+    dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+    try:
+        staged = StagedCommit(dxl, mode=MODE_ACTION)
+        for motor_id, goal in goals.items():
+            staged.stage(motor_id, DXL_GOAL_POSITION_L, goal.to_bytes(2, 'little'))
+        report = staged.commit()
+        # A later ACTION must not release any part of an aborted commit
+        dxl.action(DXL_BROADCAST_ID)
+        time.sleep(0.01)
+    finally:
+        dxl.close()
+    return report
+
+
+def test_commit_releases_every_motor():
+    with VirtualDXLBus([1, 2]) as bus:
+        report = commit_goals(bus, {1: 0x100, 2: 0x200})
+        assert report.committed and report.failed == []
+        assert bus.motor(1).word(DXL_GOAL_POSITION_L) == 0x100
+        assert bus.motor(2).word(DXL_GOAL_POSITION_L) == 0x200
+
+
+def test_lost_status_is_unstaged():
+    with VirtualDXLBus([1, 2], faults=DropFirstReply(2)) as bus:
+        before = bus.motor(2).word(DXL_GOAL_POSITION_L)
+        report = commit_goals(bus, {1: 0x100, 2: 0x200})
+        assert not report.committed
+        assert report.failed == [2] and report.pending == []
+        assert bus.motor(1).word(DXL_GOAL_POSITION_L) != 0x100
+        assert bus.motor(2).word(DXL_GOAL_POSITION_L) == before
+
+
+def test_unreachable_motor_stays_pending():
+    with VirtualDXLBus([1]) as bus:
+        report = commit_goals(bus, {1: 0x100, 9: 0x200})
+        assert report.failed == [9] and report.pending == [9]
+        assert bus.motor(1).word(DXL_GOAL_POSITION_L) != 0x100
+
+
+@pytest.mark.parametrize('n_motors, mode, packets', [(80, 'sync_write', 1), (81, MODE_ACTION, 81 + 1)])
+def test_sync_write_only_when_the_motors_fit_in_one_packet(n_motors, mode, packets):
+    motor_ids = list(range(1, n_motors + 1))
+    with VirtualDXLBus(motor_ids) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+        try:
+            staged = StagedCommit(dxl, mode=MODE_AUTO)
+            for motor_id in motor_ids:
+                staged.stage(motor_id, DXL_GOAL_POSITION_L, (motor_id, 0x01))
+            report = staged.commit()
+        finally:
+            dxl.close()
+    # L = 2: 80 motors fit in one packet of DXL_MAX_PACKET_SIZE
+    assert report.committed and report.mode == mode and report.packets == packets
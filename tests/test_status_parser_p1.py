@@ -0,0 +1,54 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+from dxl_addr_table_p1 import *
+from dxl_simulator_p1 import status_packet
+from dxl_status_parser_p1 import StatusParser
+
+PACKET = bytes(status_packet(1, 0, b'\x00\x02'))
+
+
+def test_leading_garbage_is_dropped():
+    parser = StatusParser()
+    parser.feed(b'\x00\x12\xfe' + PACKET)
+    status = parser.next_packet()
+    assert (status.motor_id, status.error, status.params) == (1, 0, b'\x00\x02')
+    assert parser.dropped_bytes == 3
+    assert parser.next_packet() is None and len(parser) == 0
+
+
+def test_header_split_between_two_reads():
+    parser = StatusParser()
+    parser.feed(b'\x00' + PACKET[:1])
+    assert parser.next_packet() is None
+    parser.feed(PACKET[1:])
+    assert parser.next_packet().word() == 0x200
+    assert parser.dropped_bytes == 1
+
+
+def test_bad_checksum_costs_only_its_packet():
+    broken = bytearray(status_packet(2, 0, b'\x10\x00'))
+    broken[-1] ^= 0x5A
+    parser = StatusParser()
+    parser.feed(bytes(broken) + PACKET)
+    status = parser.next_packet()
+    assert status.motor_id == 1
+    assert parser.checksum_errors == 1
+
+
+def test_truncated_packet_waits_for_its_bytes():
+    parser = StatusParser()
+    parser.feed(PACKET[:-2])
+    assert parser.next_packet() is None
+    assert parser.needed == 2
+    parser.feed(PACKET[-2:])
+    assert parser.next_packet().params == b'\x00\x02'
+    assert parser.dropped_bytes == 0
+
+
+def test_error_bits_are_decoded():
+    parser = StatusParser()
+    parser.feed(bytes(status_packet(3, DXL_ERROR_OVERLOAD | DXL_ERROR_OVERHEATING)))
+    status = parser.next_packet()
+    assert status.overload_error and status.overheating_error and not status.ok
+    assert status.errors == ('overheating', 'overload')
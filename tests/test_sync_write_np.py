@@ -0,0 +1,43 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import numpy as np
+from dxl_addr_table_p1 import *
+from dxl_capture import Capture, CaptureLog, DIR_TX
+from dxl_packet_generator_p1 import DXLPacketGenP1
+from dxl_simulator_p1 import VirtualDXLBus
+from dxl_sync_write_np import SyncWriteEncoder, encode_sync_write
+
+
+def test_encoder_matches_sync_write_byte_for_byte(tmp_path):
+    # 60 motors with L = 4 do not fit in one packet
+    motor_ids = np.arange(1, 61, dtype=np.uint8)
+    position = np.arange(60, dtype=np.uint16) * 17
+    speed = np.full(60, 0x3FF, dtype=np.uint16)
+    total_data = tuple([(int(motor_id), p & 0xFF, p >> 8, s & 0xFF, s >> 8)
+                        for motor_id, p, s in zip(motor_ids, position.tolist(), speed.tolist())])
+    path = str(tmp_path / 'sync_write.dxlcap')
+    with VirtualDXLBus([1], timing=False) as bus:
+        with Capture(path, baudrate=1000000) as capture:
+            dxl = DXLPacketGenP1(bus.port, 1000000, capture=capture)
+            try:
+                assert dxl.sync_write(DXL_GOAL_POSITION_L, total_data) == 2
+                dxl.sync_write_array(DXL_GOAL_POSITION_L, motor_ids, position, speed)
+            finally:
+                dxl.close()
+    sent = [frame.data for frame in CaptureLog(path).frames if frame.direction == DIR_TX]
+    encoded = SyncWriteEncoder(DXL_GOAL_POSITION_L, motor_ids, ('<u2', '<u2')).encode(position, speed)
+    assert sent == [bytes(encoded), bytes(encoded)]
+    assert bytes(encode_sync_write(DXL_GOAL_POSITION_L, motor_ids, position, speed)) == bytes(encoded)
+
+
+def test_sync_write_array_tracks_the_reply_settings():
+    with VirtualDXLBus([1, 2], timing=False) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000)
+        try:
+            dxl.sync_write_array(DXL_RETURN_DELAY_TIME, [1, 2], np.array([0, 10], dtype=np.uint8))
+            dxl.sync_write_array(DXL_STATUS_RETURN_LEVEL, [2], np.array([1], dtype=np.uint8))
+        finally:
+            dxl.close()
+    assert dxl.return_delay == {1: 0.0, 2: 10 * 2e-6}
+    assert dxl.reply_expected(1, DXL_WRITE_DATA) and not dxl.reply_expected(2, DXL_WRITE_DATA)
@@ -0,0 +1,57 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import pytest
+from dxl_telemetry import TelemetryRecorder, TelemetryReader
+
+
+class RacingReader(TelemetryReader):
+    """
+    Reader whose first look at count is followed by one more sample of the recorder
+    """
+    recorder = None
+
+    @property
+    def count(self):
+        count = int(self.header['count'][0])
+        if self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            record(recorder, recorder.count)
+        return count
+
+
+def record(recorder, t):
+    recorder.record([None] * len(recorder.motor_ids), t=float(t))
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = TelemetryRecorder(str(tmp_path / 'telemetry'), [1, 2], capacity=8)
+    yield recorder
+    recorder.close()
+
+
+def test_since_follows_the_ring(recorder):
+    reader = TelemetryReader(recorder.path)
+    count = 0
+    for end in (3, 8, 13):
+        while recorder.count < end:
+            record(recorder, recorder.count)
+        samples, count = reader.since(count)
+        assert list(samples['t'])[-1] == end - 1 and count == end
+    assert len(reader.latest()) == 8
+    reader.close()
+
+
+def test_since_ends_at_its_count_snapshot(recorder):
+    for t in range(5):
+        record(recorder, t)
+    reader = RacingReader(recorder.path)
+    reader.recorder = recorder
+    samples, count = reader.since(2)
+    assert count == 5
+    assert list(samples['t']) == [2.0, 3.0, 4.0]
+    # The sample recorded meanwhile comes with the next call
+    samples, count = reader.since(count)
+    assert list(samples['t']) == [5.0] and count == 6
+    reader.close()
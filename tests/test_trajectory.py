@@ -0,0 +1,57 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import numpy as np
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_sync_write_np import SyncWriteEncoder
+from dxl_trajectory import Trajectory, minimum_jerk, trapezoidal, through_waypoints
+
+
+@pytest.mark.parametrize('profile', [minimum_jerk, trapezoidal])
+def test_profile_ends_on_its_waypoints_and_is_monotonic(profile):
+    positions = profile([1000, 3000], [3000, 1000], 0.5, 200)
+    assert positions.shape == (101, 2)
+    assert np.array_equal(positions[0], [1000, 3000]) and np.allclose(positions[-1], [3000, 1000])
+    steps = np.diff(positions, axis=0)
+    assert (steps[:, 0] >= 0).all() and (steps[:, 1] <= 0).all()
+    # Slow at both ends, fastest in the middle
+    assert abs(steps[0, 0]) < abs(steps[50, 0]) and abs(steps[-1, 0]) < abs(steps[50, 0])
+
+
+def test_trapezoidal_ramp_is_checked():
+    with pytest.raises(ValueError):
+        trapezoidal([0], [1], 1.0, 100, ramp=0.6)
+
+
+def test_through_waypoints_stops_on_every_waypoint():
+    positions = through_waypoints([[2048], [3072], [1024]], [1.0, 0.5], 100)
+    assert len(positions) == 100 + 50 + 1
+    assert [positions[0, 0], positions[100, 0], positions[-1, 0]] == pytest.approx([2048, 3072, 1024])
+    with pytest.raises(ValueError):
+        through_waypoints([[0], [1]], [1.0, 1.0], 100)
+
+
+@pytest.mark.parametrize('n_motors', [3, 60])
+def test_ticks_match_the_sync_write_encoder(n_motors):
+    motor_ids = list(range(1, n_motors + 1))
+    positions = minimum_jerk([1000] * n_motors, [3000] * n_motors, 0.1, 100)
+    speeds = np.full(positions.shape, 200)
+    trajectory = Trajectory(DXL_GOAL_POSITION_L, motor_ids, [positions, speeds], 100)
+    encoder = SyncWriteEncoder(DXL_GOAL_POSITION_L, motor_ids, ('<u2', '<u2'))
+    assert len(trajectory) == len(positions)
+    for k in range(len(trajectory)):
+        assert bytes(trajectory.tick(k)) == bytes(encoder.encode(positions[k], speeds[k]))
+
+
+@pytest.mark.parametrize('value', [-1, 65536, 70000.0, np.nan])
+def test_values_out_of_range_are_refused(value):
+    positions = np.full((10, 2), 2048.0)
+    positions[5, 1] = value
+    with pytest.raises(ValueError):
+        Trajectory(DXL_GOAL_POSITION_L, [1, 2], [positions], 100)
+
+
+def test_rounding_to_the_range_limit_is_accepted():
+    trajectory = Trajectory(DXL_GOAL_POSITION_L, [1], [np.array([[65535.4], [-0.4]])], 100)
+    assert bytes(trajectory.tick(0))[8:10] == b'\xff\xff'
@@ -0,0 +1,75 @@
+__author__ = "Sungjin Park"
+__email__ = "jinparksj@gmail.com"
+
+import pytest
+from dxl_addr_table_p1 import *
+from dxl_control_table_p1 import ControlTableShadow
+from dxl_packet_generator_p1 import DXLPacketGenP1
+from dxl_simulator_p1 import VirtualDXLBus
+from dxl_write_batch_p1 import WriteBatch
+
+# Room for the stalls of a loaded test machine
+REPLY_MARGIN = 0.02
+
+
+@pytest.fixture
+def bus():
+    with VirtualDXLBus([1, 2]) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+        bus.shadow = ControlTableShadow(dxl)
+        bus.batch = WriteBatch(dxl, bus.shadow)
+        yield bus
+        dxl.close()
+
+
+def test_ranges_merge_into_one_write(bus):
+    batch = bus.batch
+    batch.write(1, DXL_GOAL_POSITION_L, (0x00, 0x02))
+    batch.write(1, DXL_MOVING_SPEED_L, (0x80, 0x00))
+    results = batch.commit()
+    assert results[1] is not None and results[1].error == 0
+    assert batch.last_cycle == {'requested': 2, 'packets': 1, 'saved': 1}
+    assert bus.motor(1).word(DXL_MOVING_SPEED_L) == 0x80
+    assert bus.shadow.motor(1).cached(DXL_GOAL_POSITION_L, 4)
+
+
+def test_write_without_status_stays_queued(bus):
+    batch = bus.batch
+    batch.write(9, DXL_GOAL_POSITION_L, (0x00, 0x02))
+    assert batch.commit()[9] is None
+    assert batch.failed == 1
+    assert not bus.shadow.motor(9).cached(DXL_GOAL_POSITION_L, 2)
+    assert batch.pending[9].dirty_ranges() == [(DXL_GOAL_POSITION_L, 2)]
+    # Sent again by the next cycle, as one more request
+    assert len(batch) == 1
+    batch.commit()
+    assert batch.packets == 2
+    assert batch.saved == 0
+
+
+def test_write_without_status_is_dropped_after_max_retries(bus):
+    batch = bus.batch
+    batch.max_retries = 2
+    batch.write(9, DXL_GOAL_POSITION_L, (0x00, 0x02))
+    for _ in range(3):
+        batch.commit()
+    assert len(batch) == 0 and not batch.pending
+    stats = batch.statistics()
+    assert (stats['requested'], stats['packets'], stats['failed']) == (3, 3, 3)
+    assert (stats['retried'], stats['dropped'], stats['pending']) == (2, 1, 0)
+
+
+def test_sync_write_packets_are_counted_as_sent():
+    motor_ids = list(range(1, 61))
+    with VirtualDXLBus(motor_ids) as bus:
+        dxl = DXLPacketGenP1(bus.port, 1000000, reply_margin=REPLY_MARGIN)
+        try:
+            batch = WriteBatch(dxl)
+            for motor_id in motor_ids:
+                batch.write(motor_id, DXL_GOAL_POSITION_L, (motor_id, 0x01, 0x00, 0x01))
+            batch.commit()
+        finally:
+            dxl.close()
+    # L = 4: 48 motors fit in one packet of DXL_MAX_PACKET_SIZE
+    assert batch.last_cycle == {'requested': 60, 'packets': 2, 'saved': 58}
+    assert batch.sync_writes == 2